@@ -1,3 +1,16 @@
+// Batched OLED, buzzer and control actions; GET advertises the endpoint
+httpd_uri_t command_get_uri = {
+    .uri = "/command",
+    .method = HTTP_GET,
+    .handler = command_info_handler,
+    .user_ctx = NULL};
+
+httpd_uri_t command_post_uri = {
+    .uri = "/command",
+    .method = HTTP_POST,
+    .handler = command_handler,
+    .user_ctx = NULL};
+
 // Add RFID endpoint for managing cards
 httpd_uri_t rfid_uri = {
     .uri = "/rfid",
@@ -33,6 +46,8 @@ if (httpd_start(&camera_httpd, &config) == ESP_OK)
     httpd_register_uri_handler(camera_httpd, &oled_get_uri);
     httpd_register_uri_handler(camera_httpd, &oled_post_uri);
     httpd_register_uri_handler(camera_httpd, &buzzer_uri);
+    httpd_register_uri_handler(camera_httpd, &command_get_uri);
+    httpd_register_uri_handler(camera_httpd, &command_post_uri);
     httpd_register_uri_handler(camera_httpd, &rfid_uri);
     httpd_register_uri_handler(camera_httpd, &rfid_scan_uri);
     httpd_register_uri_handler(camera_httpd, &rfid_list_uri);
@@ -44,6 +59,8 @@ if (httpd_start(&camera_httpd, &config) == ESP_OK)
     Serial.println("GET /oled - Test OLED endpoint");
     Serial.println("POST /oled - Update OLED display");
     Serial.println("POST /buzzer - Activate buzzer for status");
+    Serial.println("GET /command - List batched command actions");
+    Serial.println("POST /command - Run OLED, buzzer and control actions in one request");
     Serial.println("POST /rfid - Manage RFID cards");
     Serial.println("GET /rfid/scan - Scan RFID card");
     Serial.println("GET /rfid/list - List registered RFID cards");
@@ -22,6 +22,9 @@ volatile bool rfid_scan_in_progress = false;
 struct RfidCard;
 struct RfidCard *findCardByUid(byte *uid, byte uidLength);
 bool addNewCard(byte *uid, byte uidLength, const char *name);
+bool storeCard(byte *uid, byte uidLength, const char *name);
+bool deactivateCard(byte *uid, byte uidLength);
+int freeCardSlots();
 bool handleRfidAttendance();
 
 // Stream related constants
@@ -133,6 +136,33 @@ int numKnownCards = 0;
 // Flag to track if RFID has been properly initialized
 bool rfid_initialized = false;
 
+// The RFID reader's SPI lines are the OLED's I2C pins, and loop() reads cards while the HTTP
+// handlers draw on the OLED from another task, so whoever uses the pins holds this mutex
+SemaphoreHandle_t busMutex = NULL;
+
+struct BusLock
+{
+    BusLock() { xSemaphoreTakeRecursive(busMutex, portMAX_DELAY); }
+    ~BusLock() { xSemaphoreGiveRecursive(busMutex); }
+};
+
+// Cards read in the background by loop(), kept for GET /rfid/taps
+#define TAP_QUEUE_SIZE 8
+#define RFID_POLL_INTERVAL 250    // ms between background checks for a card
+#define RFID_RETRY_INTERVAL 30000 // ms before initializing a reader that failed again
+
+struct RfidTap
+{
+    uint32_t seq;          // Increases with every tap since boot
+    byte uid[10];          // UID of the card
+    byte uidLength;        // UID bytes used
+    unsigned long readAt;  // millis() when the card was read
+};
+
+struct RfidTap tapQueue[TAP_QUEUE_SIZE];
+uint32_t lastTapSeq = 0;
+portMUX_TYPE tapMux = portMUX_INITIALIZER_UNLOCKED;
+
 // Function to save RFID cards to EEPROM
 bool saveRfidCardsToEEPROM()
 {
@@ -391,18 +421,12 @@ struct RfidCard *findCardByUid(byte *uid, byte uidLength)
     return NULL;
 }
 
-// Update addNewCard function to save to EEPROM
-bool addNewCard(byte *uid, byte uidLength, const char *name)
+// Store a card in a free or deactivated slot without saving to EEPROM
+bool storeCard(byte *uid, byte uidLength, const char *name)
 {
     if (!uid || uidLength == 0 || !name)
     {
-        Serial.println("Invalid parameters in addNewCard");
-        return false;
-    }
-
-    if (numKnownCards >= MAX_CARDS)
-    {
-        Serial.println("Cannot add more cards, array is full");
+        Serial.println("Invalid parameters in storeCard");
         return false;
     }
 
@@ -413,15 +437,34 @@ bool addNewCard(byte *uid, byte uidLength, const char *name)
         return false;
     }
 
-    // Add new card
+    // Reuse the slot of a removed card before growing the list
+    int slot = -1;
+    for (int i = 0; i < numKnownCards; i++)
+    {
+        if (!knownCards[i].active)
+        {
+            slot = i;
+            break;
+        }
+    }
+    if (slot < 0)
+    {
+        if (numKnownCards >= MAX_CARDS)
+        {
+            Serial.println("Cannot add more cards, array is full");
+            return false;
+        }
+        slot = numKnownCards++;
+    }
+
+    memset(knownCards[slot].uid, 0, sizeof(knownCards[slot].uid));
     for (byte i = 0; i < uidLength && i < 4; i++)
     {
-        knownCards[numKnownCards].uid[i] = uid[i];
+        knownCards[slot].uid[i] = uid[i];
     }
-    strncpy(knownCards[numKnownCards].name, name, 31);
-    knownCards[numKnownCards].name[31] = '\0'; // Ensure null termination
-    knownCards[numKnownCards].active = true;
-    numKnownCards++;
+    memset(knownCards[slot].name, 0, sizeof(knownCards[slot].name));
+    strncpy(knownCards[slot].name, name, 31);
+    knownCards[slot].active = true;
 
     Serial.print("Added new card for: ");
     Serial.println(name);
@@ -432,11 +475,47 @@ bool addNewCard(byte *uid, byte uidLength, const char *name)
         Serial.print(uid[i], HEX);
     }
     Serial.println();
+    return true;
+}
+
+// Update addNewCard function to save to EEPROM
+bool addNewCard(byte *uid, byte uidLength, const char *name)
+{
+    if (!storeCard(uid, uidLength, name))
+    {
+        return false;
+    }
 
     // Save to EEPROM
     return saveRfidCardsToEEPROM();
 }
 
+// Deactivate a card without saving to EEPROM; its slot can be reused
+bool deactivateCard(byte *uid, byte uidLength)
+{
+    struct RfidCard *card = findCardByUid(uid, uidLength);
+    if (!card)
+    {
+        return false;
+    }
+    card->active = false;
+    return true;
+}
+
+// Number of cards that can still be added
+int freeCardSlots()
+{
+    int used = 0;
+    for (int i = 0; i < numKnownCards; i++)
+    {
+        if (knownCards[i].active)
+        {
+            used++;
+        }
+    }
+    return MAX_CARDS - used;
+}
+
 // Improved buzzer implementation with direct pin control and louder sound
 void tone(int pin, int frequency, int duration)
 {
@@ -506,13 +585,68 @@ void testBuzzer()
     Serial.println("Buzzer test complete");
 }
 
+// Frame sizes that /capture?size=WxH can switch to (up to the size the camera was initialised with)
+struct CaptureSize
+{
+    const char *name;
+    framesize_t size;
+    uint16_t width;
+};
+static const CaptureSize captureSizes[] = {
+    {"160x120", FRAMESIZE_QQVGA, 160},
+    {"320x240", FRAMESIZE_QVGA, 320},
+    {"400x296", FRAMESIZE_CIF, 400},
+    {"640x480", FRAMESIZE_VGA, 640},
+    {"800x600", FRAMESIZE_SVGA, 800},
+    {"1024x768", FRAMESIZE_XGA, 1024},
+    {"1280x1024", FRAMESIZE_SXGA, 1280},
+    {"1600x1200", FRAMESIZE_UXGA, 1600}};
+static framesize_t maxCaptureSize = FRAMESIZE_SVGA;
+
+// Switch the sensor to the size in ?size=WxH; returns the expected frame width, or 0 if unchanged
+static uint16_t selectCaptureSize(httpd_req_t *req)
+{
+    char query[32];
+    char value[12];
+    if (httpd_req_get_url_query_str(req, query, sizeof(query)) != ESP_OK ||
+        httpd_query_key_value(query, "size", value, sizeof(value)) != ESP_OK)
+    {
+        return 0;
+    }
+    sensor_t *s = esp_camera_sensor_get();
+    if (s == NULL || s->pixformat != PIXFORMAT_JPEG)
+    {
+        return 0;
+    }
+    for (size_t i = 0; i < sizeof(captureSizes) / sizeof(captureSizes[0]); i++)
+    {
+        const CaptureSize &entry = captureSizes[i];
+        if (strcmp(value, entry.name) == 0 && entry.size <= maxCaptureSize)
+        {
+            if (s->status.framesize == entry.size || s->set_framesize(s, entry.size) != 0)
+            {
+                return 0;
+            }
+            return entry.width;
+        }
+    }
+    return 0;
+}
+
 static esp_err_t capture_handler(httpd_req_t *req)
 {
     camera_fb_t *fb = NULL;
     esp_err_t res = ESP_OK;
     int64_t fr_start = esp_timer_get_time();
 
+    // After a size change the frame buffers can still hold frames of the old size
+    uint16_t width = selectCaptureSize(req);
     fb = esp_camera_fb_get();
+    for (int stale = 0; fb && width && fb->width != width && stale < 3; stale++)
+    {
+        esp_camera_fb_return(fb);
+        fb = esp_camera_fb_get();
+    }
     if (!fb)
     {
         Serial.println("Camera capture failed");
@@ -625,6 +759,107 @@ static esp_err_t stream_handler(httpd_req_t *req)
     return res;
 }
 
+// Play the buzzer pattern for an attendance status; returns false for an unknown status
+bool playBuzzerStatus(const char *status)
+{
+    if (status == NULL)
+    {
+        return false;
+    }
+    if (strcmp(status, "present") == 0)
+    {
+        playPresentSound();
+    }
+    else if (strcmp(status, "late") == 0)
+    {
+        playLateSound();
+    }
+    else if (strcmp(status, "absent") == 0)
+    {
+        playAbsentSound();
+    }
+    else if (strcmp(status, "test") == 0)
+    {
+        // For testing - test all patterns
+        Serial.println("Testing all buzzer patterns");
+        testBuzzer();
+    }
+    else
+    {
+        return false;
+    }
+    return true;
+}
+
+// Draw up to 6 lines of text, or clear the display; returns false if there is nothing to show
+bool showOledLines(JsonVariant payload)
+{
+    BusLock lock;
+    bool clearDisplay = payload["clear"] | false;
+    if (clearDisplay)
+    {
+        display.clearDisplay();
+        display.display();
+        return true;
+    }
+
+    JsonArray lines = payload["lines"];
+    if (lines.size() == 0)
+    {
+        return false;
+    }
+
+    display.clearDisplay();
+    int lineHeight = 10; // Approximate height for text size 1
+    int y = 0;
+    for (size_t i = 0; i < lines.size() && i < 6; i++)
+    {
+        display.setCursor(0, y);
+        display.println(lines[i].as<String>());
+        y += lineHeight;
+    }
+    display.display();
+    return true;
+}
+
+// Apply one camera setting, using the same names as the stock CameraWebServer /control endpoint
+bool applyCameraSetting(const char *var, int val)
+{
+    sensor_t *s = esp_camera_sensor_get();
+    if (s == NULL || var == NULL)
+    {
+        return false;
+    }
+
+    int res = -1;
+    if (strcmp(var, "framesize") == 0)
+    {
+        if (s->pixformat == PIXFORMAT_JPEG)
+        {
+            res = s->set_framesize(s, (framesize_t)val);
+        }
+    }
+    else if (strcmp(var, "quality") == 0)
+        res = s->set_quality(s, val);
+    else if (strcmp(var, "brightness") == 0)
+        res = s->set_brightness(s, val);
+    else if (strcmp(var, "contrast") == 0)
+        res = s->set_contrast(s, val);
+    else if (strcmp(var, "saturation") == 0)
+        res = s->set_saturation(s, val);
+    else if (strcmp(var, "special_effect") == 0)
+        res = s->set_special_effect(s, val);
+    else if (strcmp(var, "wb_mode") == 0)
+        res = s->set_wb_mode(s, val);
+    else if (strcmp(var, "awb") == 0)
+        res = s->set_whitebal(s, val);
+    else if (strcmp(var, "awb_gain") == 0)
+        res = s->set_awb_gain(s, val);
+    else if (strcmp(var, "gainceiling") == 0)
+        res = s->set_gainceiling(s, (gainceiling_t)val);
+    return res == 0;
+}
+
 // Buzzer endpoint handler
 static esp_err_t buzzer_handler(httpd_req_t *req)
 {
@@ -654,27 +889,9 @@ static esp_err_t buzzer_handler(httpd_req_t *req)
 
     // Get status
     const char *status = doc["status"];
-    Serial.printf("Buzzer status received: %s\n", status);
+    Serial.printf("Buzzer status received: %s\n", status ? status : "(none)");
 
-    if (strcmp(status, "present") == 0)
-    {
-        playPresentSound();
-    }
-    else if (strcmp(status, "late") == 0)
-    {
-        playLateSound();
-    }
-    else if (strcmp(status, "absent") == 0)
-    {
-        playAbsentSound();
-    }
-    else if (strcmp(status, "test") == 0)
-    {
-        // For testing - test all patterns
-        Serial.println("Testing all buzzer patterns");
-        testBuzzer();
-    }
-    else
+    if (!playBuzzerStatus(status))
     {
         // Unknown status
         Serial.println("Unknown status received");
@@ -686,6 +903,48 @@ static esp_err_t buzzer_handler(httpd_req_t *req)
     return ESP_OK;
 }
 
+// Remember a card read in the background; the oldest tap is overwritten when the queue is full
+void queueTap(byte *uid, byte uidLength)
+{
+    portENTER_CRITICAL(&tapMux);
+    lastTapSeq++;
+    struct RfidTap &tap = tapQueue[lastTapSeq % TAP_QUEUE_SIZE];
+    tap.seq = lastTapSeq;
+    tap.uidLength = uidLength > 10 ? 10 : uidLength;
+    memcpy(tap.uid, uid, tap.uidLength);
+    tap.readAt = millis();
+    portEXIT_CRITICAL(&tapMux);
+
+    Serial.print("Card tap queued, UID:");
+    for (byte i = 0; i < uidLength; i++)
+    {
+        Serial.print(uid[i] < 0x10 ? " 0" : " ");
+        Serial.print(uid[i], HEX);
+    }
+    Serial.println();
+}
+
+// Check the reader once and queue a card put on it; the caller holds busMutex
+void pollRfidCard()
+{
+    // Switch the shared pins from I2C to SPI for the reader, and back for the OLED
+    Wire.end();
+    SPI.begin(RFID_SCK_PIN, RFID_MISO_PIN, RFID_MOSI_PIN, RFID_SS_PIN);
+    SPI.setFrequency(50000);
+    SPI.setDataMode(SPI_MODE0);
+
+    if (rfid.PICC_IsNewCardPresent() && rfid.PICC_ReadCardSerial())
+    {
+        queueTap(rfid.uid.uidByte, rfid.uid.size);
+        // A halted card is not read again until it is taken away and put back
+        rfid.PICC_HaltA();
+        rfid.PCD_StopCrypto1();
+    }
+
+    SPI.end();
+    Wire.begin(I2C_SDA, I2C_SCL);
+}
+
 // Handle RFID card detection for attendance
 bool handleRfidAttendance()
 {
@@ -780,8 +1039,9 @@ static esp_err_t rfid_handler(httpd_req_t *req)
     Serial.print("RFID management request received: ");
     Serial.println(buf);
 
-    // Parse JSON
-    DynamicJsonDocument doc(1024);
+    // Parse JSON; a batch of 8 changes takes 66 slots of 16 bytes (root 2, changes 8, 8 x (3 members + 4 UID bytes)),
+    // more than 1024 bytes, so the document is sized for it
+    DynamicJsonDocument doc(2048);
     DeserializationError error = deserializeJson(doc, buf);
 
     if (error)
@@ -850,10 +1110,10 @@ static esp_err_t rfid_handler(httpd_req_t *req)
             uid[i] = uidArray[i];
         }
 
-        struct RfidCard *card = findCardByUid(uid, min((size_t)4, uidArray.size()));
-        if (card)
+        if (deactivateCard(uid, min((size_t)4, uidArray.size())))
         {
-            card->active = false;
+            // Persist the removal so the card does not come back after a restart
+            saveRfidCardsToEEPROM();
             httpd_resp_send(req, "Card deactivated", HTTPD_RESP_USE_STRLEN);
             return ESP_OK;
         }
@@ -892,6 +1152,7 @@ static esp_err_t rfid_handler(httpd_req_t *req)
     else if (strcmp(action, "scan") == 0)
     {
         // Request to read current card from reader
+        BusLock lock;
         if (!rfid.PICC_IsNewCardPresent() || !rfid.PICC_ReadCardSerial())
         {
             httpd_resp_send_err(req, HTTPD_404_NOT_FOUND, "No card present");
@@ -914,6 +1175,69 @@ static esp_err_t rfid_handler(httpd_req_t *req)
         rfid.PCD_StopCrypto1();
         return ESP_OK;
     }
+    else if (strcmp(action, "batch") == 0)
+    {
+        // Several add/remove changes in one request, saved to EEPROM once:
+        // {"action": "batch", "changes": [{"action": "add", "uid": [...], "name": "..."}, {"action": "remove", "uid": [...]}]}
+        JsonArray changes = doc["changes"];
+        DynamicJsonDocument response(1024);
+        JsonArray results = response.createNestedArray("results");
+        bool changed = false;
+
+        for (JsonObject change : changes)
+        {
+            const char *changeAction = change["action"] | "";
+            JsonArray uidArray = change["uid"];
+            byte uidLength = min((size_t)4, uidArray.size());
+            byte uid[4] = {0, 0, 0, 0};
+            for (byte i = 0; i < uidLength; i++)
+            {
+                uid[i] = uidArray[i];
+            }
+
+            JsonObject result = results.createNestedObject();
+            bool ok = false;
+            if (uidLength == 0)
+            {
+                result["error"] = "Missing UID";
+            }
+            else if (strcmp(changeAction, "add") == 0)
+            {
+                const char *name = change["name"];
+                ok = name && storeCard(uid, uidLength, name);
+                if (!ok)
+                {
+                    result["error"] = !name ? "Missing name" : (findCardByUid(uid, uidLength) ? "Card already exists" : "No free slot");
+                }
+            }
+            else if (strcmp(changeAction, "remove") == 0)
+            {
+                ok = deactivateCard(uid, uidLength);
+                if (!ok)
+                {
+                    result["error"] = "Card not found";
+                }
+            }
+            else
+            {
+                result["error"] = "Unknown action";
+            }
+            result["ok"] = ok;
+            changed = changed || ok;
+        }
+
+        if (changed)
+        {
+            saveRfidCardsToEEPROM();
+        }
+        response["free"] = freeCardSlots();
+
+        String responseStr;
+        serializeJson(response, responseStr);
+        httpd_resp_set_type(req, "application/json");
+        httpd_resp_send(req, responseStr.c_str(), responseStr.length());
+        return ESP_OK;
+    }
     else
     {
         Serial.println("Unknown action");
@@ -927,6 +1251,9 @@ static esp_err_t rfid_attendance_handler(httpd_req_t *req)
 {
     Serial.println("RFID attendance request received");
 
+    // The background reader waits until the scan is over
+    BusLock lock;
+
     // Set scan in progress flag to pause camera
     rfid_scan_in_progress = true;
 
@@ -1091,6 +1418,9 @@ static esp_err_t rfid_scan_handler(httpd_req_t *req)
 {
     Serial.println("RFID scan request received");
 
+    // The background reader waits until the scan is over
+    BusLock lock;
+
     // Set scan in progress flag to pause camera
     rfid_scan_in_progress = true;
 
@@ -1291,6 +1621,7 @@ static esp_err_t rfid_scan_handler(httpd_req_t *req)
 static esp_err_t handleOledGetRequest(httpd_req_t *req)
 {
     Serial.println("OLED GET request received");
+    BusLock lock;
 
     // Send a simple test message to the OLED
     display.clearDisplay();
@@ -1340,6 +1671,8 @@ static esp_err_t handleOledRequest(httpd_req_t *req)
         return ESP_FAIL;
     }
 
+    BusLock lock;
+
     // Clear display if requested
     bool clearDisplay = doc["clear"] | false;
     if (clearDisplay)
@@ -1382,6 +1715,155 @@ static esp_err_t handleOledRequest(httpd_req_t *req)
     return ESP_OK;
 }
 
+// GET /command - advertise the batched command endpoint and the actions it accepts
+static esp_err_t command_info_handler(httpd_req_t *req)
+{
+    httpd_resp_set_type(req, "application/json");
+    httpd_resp_send(req, "{\"version\":1,\"actions\":[\"oled\",\"buzzer\",\"control\"]}", HTTPD_RESP_USE_STRLEN);
+    return ESP_OK;
+}
+
+// POST /command - run an ordered list of OLED, buzzer and control actions in one request
+// Body: {"actions": [{"type": "buzzer", "status": "present"}, {"type": "oled", "lines": [...]},
+//                    {"type": "control", "var": "quality", "val": 12}]}
+// Reply: {"results": [{"ok": true}, ...]} with one entry per action
+static esp_err_t command_handler(httpd_req_t *req)
+{
+    size_t buf_len = req->content_len;
+    if (buf_len == 0 || buf_len > 2047)
+    {
+        Serial.println("Command body missing or too large");
+        httpd_resp_send_err(req, HTTPD_400_BAD_REQUEST, "Request body missing or too large");
+        return ESP_FAIL;
+    }
+
+    // The body is kept on the heap: the httpd task's stack also holds the JSON documents
+    char *buf = (char *)malloc(buf_len + 1);
+    if (buf == NULL)
+    {
+        Serial.println("Out of memory for command body");
+        httpd_resp_send_err(req, HTTPD_500_INTERNAL_SERVER_ERROR, "Out of memory");
+        return ESP_FAIL;
+    }
+    size_t received = 0;
+    while (received < buf_len)
+    {
+        int ret = httpd_req_recv(req, buf + received, buf_len - received);
+        if (ret <= 0)
+        {
+            free(buf);
+            Serial.println("Error receiving command body");
+            httpd_resp_send_err(req, HTTPD_400_BAD_REQUEST, "Error receiving request body");
+            return ESP_FAIL;
+        }
+        received += ret;
+    }
+    buf[received] = '\0';
+
+    // The document points into buf, which is freed once the actions have run
+    DynamicJsonDocument doc(3072);
+    DeserializationError error = deserializeJson(doc, buf);
+    if (error || !doc["actions"].is<JsonArray>())
+    {
+        free(buf);
+        Serial.println("Error parsing command JSON");
+        httpd_resp_send_err(req, HTTPD_400_BAD_REQUEST, "Invalid JSON format");
+        return ESP_FAIL;
+    }
+
+    DynamicJsonDocument response(1024);
+    JsonArray results = response.createNestedArray("results");
+
+    for (JsonObject action : doc["actions"].as<JsonArray>())
+    {
+        const char *type = action["type"] | "";
+        bool ok = false;
+        if (strcmp(type, "oled") == 0)
+        {
+            ok = showOledLines(action);
+        }
+        else if (strcmp(type, "buzzer") == 0)
+        {
+            ok = playBuzzerStatus(action["status"].as<const char *>());
+        }
+        else if (strcmp(type, "control") == 0)
+        {
+            ok = applyCameraSetting(action["var"].as<const char *>(), action["val"] | 0);
+        }
+        Serial.printf("Command %s: %s\n", type, ok ? "ok" : "failed");
+
+        JsonObject result = results.createNestedObject();
+        result["ok"] = ok;
+        if (!ok)
+        {
+            result["error"] = "Action failed";
+        }
+    }
+    free(buf);
+
+    String responseStr;
+    serializeJson(response, responseStr);
+    httpd_resp_set_type(req, "application/json");
+    httpd_resp_send(req, responseStr.c_str(), responseStr.length());
+    return ESP_OK;
+}
+
+// GET /rfid/taps?after=N - cards read in the background after tap N; answers at once instead of waiting for a card
+// Reply: {"last": 12, "reader": true, "taps": [{"seq": 12, "uid": [222, 173, 190, 239], "age_ms": 340}]}
+// Only the last TAP_QUEUE_SIZE taps are kept; an "after" above "last" means the device restarted
+static esp_err_t rfid_taps_handler(httpd_req_t *req)
+{
+    uint32_t after = 0;
+    char query[32];
+    char value[12];
+    if (httpd_req_get_url_query_str(req, query, sizeof(query)) == ESP_OK &&
+        httpd_query_key_value(query, "after", value, sizeof(value)) == ESP_OK)
+    {
+        after = strtoul(value, NULL, 10);
+    }
+
+    struct RfidTap taps[TAP_QUEUE_SIZE];
+    portENTER_CRITICAL(&tapMux);
+    uint32_t last = lastTapSeq;
+    memcpy(taps, tapQueue, sizeof(taps));
+    portEXIT_CRITICAL(&tapMux);
+
+    if (after > last)
+    {
+        after = 0;
+    }
+    uint32_t first = last > TAP_QUEUE_SIZE ? last - TAP_QUEUE_SIZE + 1 : 1;
+    if (after + 1 > first)
+    {
+        first = after + 1;
+    }
+
+    // 8 taps of up to 10 UID bytes take 115 slots of 16 bytes
+    DynamicJsonDocument response(2048);
+    response["last"] = last;
+    response["reader"] = rfid_initialized;
+    JsonArray list = response.createNestedArray("taps");
+    unsigned long now = millis();
+    for (uint32_t seq = first; seq <= last; seq++)
+    {
+        struct RfidTap &tap = taps[seq % TAP_QUEUE_SIZE];
+        JsonObject entry = list.createNestedObject();
+        entry["seq"] = seq;
+        JsonArray uid = entry.createNestedArray("uid");
+        for (byte i = 0; i < tap.uidLength; i++)
+        {
+            uid.add(tap.uid[i]);
+        }
+        entry["age_ms"] = now - tap.readAt;
+    }
+
+    String responseStr;
+    serializeJson(response, responseStr);
+    httpd_resp_set_type(req, "application/json");
+    httpd_resp_send(req, responseStr.c_str(), responseStr.length());
+    return ESP_OK;
+}
+
 // Add RFID list handler - GET request to list all registered cards
 static esp_err_t rfid_list_handler(httpd_req_t *req)
 {
@@ -1391,8 +1873,9 @@ static esp_err_t rfid_list_handler(httpd_req_t *req)
     httpd_resp_set_type(req, "application/json");
     httpd_resp_set_hdr(req, "Access-Control-Allow-Origin", "*");
 
-    // Create JSON response with all active cards
+    // Create JSON response with all active cards and the room for more
     DynamicJsonDocument response(2048);
+    response["capacity"] = MAX_CARDS;
     JsonArray cards = response.createNestedArray("cards");
 
     for (int i = 0; i < numKnownCards; i++)
@@ -1422,6 +1905,10 @@ void startCameraServer()
 {
     httpd_config_t config = HTTPD_DEFAULT_CONFIG();
     config.server_port = 80;
+    // The default of 8 handlers is too few for all the endpoints below
+    config.max_uri_handlers = 16;
+    // Handlers keep 1 KB request buffers on the stack next to their JSON documents; the 4 KB default is too tight
+    config.stack_size = 8192;
 
     httpd_uri_t capture_uri = {
         .uri = "/capture",
@@ -1456,6 +1943,19 @@ void startCameraServer()
         .handler = buzzer_handler,
         .user_ctx = NULL};
 
+    // Batched OLED, buzzer and control actions; GET advertises the endpoint
+    httpd_uri_t command_get_uri = {
+        .uri = "/command",
+        .method = HTTP_GET,
+        .handler = command_info_handler,
+        .user_ctx = NULL};
+
+    httpd_uri_t command_post_uri = {
+        .uri = "/command",
+        .method = HTTP_POST,
+        .handler = command_handler,
+        .user_ctx = NULL};
+
     // Add RFID endpoint for managing cards
     httpd_uri_t rfid_uri = {
         .uri = "/rfid",
@@ -1477,6 +1977,13 @@ void startCameraServer()
         .handler = rfid_list_handler,
         .user_ctx = NULL};
 
+    // Cards read in the background
+    httpd_uri_t rfid_taps_uri = {
+        .uri = "/rfid/taps",
+        .method = HTTP_GET,
+        .handler = rfid_taps_handler,
+        .user_ctx = NULL};
+
     // Add RFID attendance endpoint
     httpd_uri_t rfid_attendance_uri = {
         .uri = "/rfid/attendance",
@@ -1491,20 +1998,26 @@ void startCameraServer()
         httpd_register_uri_handler(camera_httpd, &oled_get_uri);
         httpd_register_uri_handler(camera_httpd, &oled_post_uri);
         httpd_register_uri_handler(camera_httpd, &buzzer_uri);
+        httpd_register_uri_handler(camera_httpd, &command_get_uri);
+        httpd_register_uri_handler(camera_httpd, &command_post_uri);
         httpd_register_uri_handler(camera_httpd, &rfid_uri);
         httpd_register_uri_handler(camera_httpd, &rfid_scan_uri);
         httpd_register_uri_handler(camera_httpd, &rfid_list_uri);
+        httpd_register_uri_handler(camera_httpd, &rfid_taps_uri);
         httpd_register_uri_handler(camera_httpd, &rfid_attendance_uri);
         Serial.println("HTTP server started with all endpoints");
         Serial.println("Available endpoints:");
-        Serial.println("GET /capture - Get single image");
+        Serial.println("GET /capture - Get single image (?size=320x240 ... 1600x1200 switches resolution)");
         Serial.println("GET /stream - Get video stream");
         Serial.println("GET /oled - Test OLED endpoint");
         Serial.println("POST /oled - Update OLED display");
         Serial.println("POST /buzzer - Activate buzzer for status");
-        Serial.println("POST /rfid - Manage RFID cards");
+        Serial.println("GET /command - List batched command actions");
+        Serial.println("POST /command - Run OLED, buzzer and control actions in one request");
+        Serial.println("POST /rfid - Manage RFID cards (add, remove, list, scan, batch)");
         Serial.println("GET /rfid/scan - Scan RFID card");
         Serial.println("GET /rfid/list - List registered RFID cards");
+        Serial.println("GET /rfid/taps - Cards read in the background (?after=N)");
         Serial.println("POST /rfid/attendance - Mark attendance with RFID");
     }
     else
@@ -1522,6 +2035,8 @@ void setup()
     Serial.println();
     Serial.println("Starting " DEVICE_NAME);
 
+    busMutex = xSemaphoreCreateRecursiveMutex();
+
     // Initialize EEPROM
     EEPROM.begin(EEPROM_SIZE);
     Serial.println("EEPROM initialized");
@@ -1659,6 +2174,7 @@ void setup()
         config.frame_size = FRAMESIZE_SVGA;
         config.fb_location = CAMERA_FB_IN_DRAM;
     }
+    maxCaptureSize = config.frame_size;
 
     // Initialize the camera
     esp_err_t err = esp_camera_init(&config);
@@ -1835,6 +2351,7 @@ void loop()
         Serial.println(ESP.getFreeHeap());
 
         // Update OLED with system status
+        BusLock lock;
         display.clearDisplay();
         display.setCursor(0, 0);
         display.println("System Status:");
@@ -1851,31 +2368,25 @@ void loop()
 
     server.handleClient();
 
-    // Check for RFID cards but ONLY if they have been explicitly initialized
+    // Read cards in the background for GET /rfid/taps, unless a scan request is waiting for one
     static unsigned long lastRfidCheck = 0;
-
-    // Only check RFID every 200ms and only if properly initialized
-    if (currentMillis - lastRfidCheck >= 200 && rfid_initialized)
+    static unsigned long lastRfidInit = 0;
+    static bool rfidInitFailed = false;
+    if (currentMillis - lastRfidCheck >= RFID_POLL_INTERVAL && !rfid_scan_in_progress &&
+        xSemaphoreTakeRecursive(busMutex, 0) == pdTRUE)
     {
         lastRfidCheck = currentMillis;
-
-        // Handle RFID card detection with very basic approach
-        if (rfid.PICC_IsNewCardPresent() && rfid.PICC_ReadCardSerial())
+        // The scan handlers power the reader down when they are done
+        if (!rfid_initialized && (!rfidInitFailed || currentMillis - lastRfidInit >= RFID_RETRY_INTERVAL))
         {
-            // Simple card detection - less error prone
-            byte uidLength = rfid.uid.size;
-            Serial.print("Card detected in loop! UID: ");
-            for (byte i = 0; i < uidLength; i++)
-            {
-                Serial.print(rfid.uid.uidByte[i] < 0x10 ? " 0" : " ");
-                Serial.print(rfid.uid.uidByte[i], HEX);
-            }
-            Serial.println();
-
-            // Halt the card
-            rfid.PICC_HaltA();
-            rfid.PCD_StopCrypto1();
+            lastRfidInit = currentMillis;
+            rfidInitFailed = !initRFID();
+        }
+        if (rfid_initialized)
+        {
+            pollRfidCard();
         }
+        xSemaphoreGiveRecursive(busMutex);
     }
 
     // Small delay to prevent CPU hogging
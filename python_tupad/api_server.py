@@ -0,0 +1,247 @@
+import os
+import re
+import sys
+import json
+import queue
+import hashlib
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote, quote
+
+import db_utils
+from db_utils import fetch_students, fetch_attendance, fetch_student_history, fetch_attendance_summary
+
+# Defaults for the local query service
+HOST = '127.0.0.1'
+PORT = 8080
+POOL_SIZE = 4
+CACHE_SIZE = 256
+
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+class APIError(Exception):
+    """Raised by a route to send an error status with a JSON message"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def enable_wal(path):
+    """Switch the database to WAL so readers never block the attendance writer"""
+    try:
+        conn = sqlite3.connect(path, timeout=10)
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        conn.close()
+        return mode
+    except sqlite3.Error as e:
+        print(f"Could not enable WAL mode: {e}")
+        return None
+
+class ReadOnlyPool:
+    """Fixed-size pool of read-only connections shared by the request threads"""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(self.open())
+
+    def open(self):
+        return sqlite3.connect(self.uri, uri=True, check_same_thread=False, timeout=10)
+
+    @contextmanager
+    def connection(self):
+        conn = self.connections.get()
+        try:
+            yield conn
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
+
+class ResponseCache:
+    """LRU cache of encoded responses, each tagged with the data version it was built from"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, etag, body):
+        with self.lock:
+            self.entries[key] = (version, etag, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+class AttendanceAPI:
+    """
+    Answers the JSON routes from a read-only connection pool.
+
+    PRAGMA data_version is read on a dedicated connection that never writes,
+    so its value changes exactly when another connection commits. It is part
+    of every cache entry and ETag: while nothing has been written, repeated
+    requests are served from memory (or answered 304) without touching SQLite.
+    """
+
+    def __init__(self, path, pool_size=POOL_SIZE, cache_size=CACHE_SIZE):
+        self.pool = ReadOnlyPool(path, pool_size)
+        self.cache = ResponseCache(cache_size)
+        self.version_conn = self.pool.open()
+        self.version_lock = threading.Lock()
+
+    def data_version(self):
+        with self.version_lock:
+            return self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        self.version_conn.close()
+        self.pool.close()
+
+    def respond(self, target, if_none_match=None):
+        """Return (status, etag, body) for a request target such as /attendance/2025-05-17"""
+        version = self.data_version()
+        # Routes without a date default to today, so the same target means other data after midnight
+        today = datetime.now().date()
+        key = (today, target)
+        cached = self.cache.get(key, version)
+        if cached:
+            etag, body = cached
+        else:
+            parts = urlsplit(target)
+            data = self.route(unquote(parts.path), parse_qs(parts.query), today)
+            body = json.dumps(data).encode('utf-8')
+            etag = f'"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            self.cache.put(key, version, etag, body)
+
+        if if_none_match == etag:
+            return 304, etag, b''
+        return 200, etag, body
+
+    def route(self, path, params, today):
+        segments = [s for s in path.split('/') if s]
+        with self.pool.connection() as conn:
+            if segments == ['students']:
+                return fetch_students(conn)
+
+            if len(segments) == 3 and segments[0] == 'students' and segments[2] == 'history':
+                start_date = _date_param(params, 'start', '0000-01-01')
+                end_date = _date_param(params, 'end', '9999-12-31')
+                return {
+                    'student': segments[1],
+                    'records': fetch_student_history(conn, segments[1], start_date, end_date),
+                }
+
+            if segments and segments[0] == 'attendance' and len(segments) <= 2:
+                date = segments[1] if len(segments) == 2 else today.strftime('%Y-%m-%d')
+                if not DATE_PATTERN.match(date):
+                    raise APIError(400, f"Invalid date: {date}")
+                return {'date': date, 'records': fetch_attendance(conn, date)}
+
+            if segments == ['summary']:
+                default_start = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+                start_date = _date_param(params, 'start', default_start)
+                end_date = _date_param(params, 'end', today.strftime('%Y-%m-%d'))
+                return {
+                    'start': start_date,
+                    'end': end_date,
+                    'days': fetch_attendance_summary(conn, start_date, end_date),
+                }
+
+        raise APIError(404, f"Unknown path: {path}")
+
+def _date_param(params, name, default):
+    value = params.get(name, [default])[0]
+    if not DATE_PATTERN.match(value):
+        raise APIError(400, f"Invalid {name} date: {value}")
+    return value
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY keep-alive
+    # clients wait ~40 ms on delayed ACKs for every response
+    disable_nagle_algorithm = True
+    api = None
+    verbose = False
+
+    def do_GET(self):
+        try:
+            status, etag, body = self.api.respond(self.path, self.headers.get('If-None-Match'))
+        except APIError as e:
+            status, etag, body = e.status, None, json.dumps({'error': e.message}).encode('utf-8')
+        except sqlite3.Error as e:
+            status, etag, body = 500, None, json.dumps({'error': f"Database error: {e}"}).encode('utf-8')
+
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+def create_server(path=None, host=HOST, port=PORT, pool_size=POOL_SIZE, cache_size=CACHE_SIZE, verbose=False):
+    """Build the HTTP server; call serve_forever() on the result"""
+    path = path or db_utils.db_file
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Database file {path} not found.")
+    enable_wal(path)
+
+    handler = type('Handler', (APIRequestHandler,), {
+        'api': AttendanceAPI(path, pool_size, cache_size),
+        'verbose': verbose,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only JSON API over the attendance database")
+    parser.add_argument('--db', default=db_utils.db_file, help="Database file to serve")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help="Read-only connections")
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="Cached responses")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    try:
+        server = create_server(args.db, args.host, args.port, args.pool_size, args.cache_size, args.verbose)
+    except (FileNotFoundError, OSError, sqlite3.Error) as e:
+        print(f"Error starting API server: {e}")
+        sys.exit(1)
+
+    print(f"Serving {args.db} on http://{args.host}:{server.server_address[1]}/")
+    print("Routes: /students, /students/<name>/history, /attendance/<date>, /summary?start=&end=")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping API server")
+    finally:
+        server.server_close()
+        server.RequestHandlerClass.api.close()
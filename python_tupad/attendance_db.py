@@ -0,0 +1,550 @@
+import os
+import sqlite3
+import threading
+import time as tm
+from datetime import datetime, time
+
+# Database file path
+db_file = 'attendance.db'
+
+# Time thresholds for attendance status
+PRESENT_START = time(12, 20)
+PRESENT_END = time(12, 35)
+LATE_END = time(13, 50)
+
+# Allowed weekdays: Monday (0), Thursday (3)
+ALLOWED_DAYS = [0, 3, 5, 6]
+
+# Statements shared with bench_db.py, which explains their query plans
+ATTENDANCE_LOOKUP_SQL = "SELECT status FROM attendance WHERE student_name=? AND date=?"
+ACTIVE_STUDENTS_SQL = "SELECT name FROM students WHERE status='active'"
+ATTENDED_ON_SQL = "SELECT student_name FROM attendance WHERE date=?"
+RFID_DIRECTORY_SQL = ("SELECT r.card_uid, r.student_name, s.status FROM rfid_cards r "
+                      "LEFT JOIN students s ON s.name = r.student_name WHERE r.active = 1")
+
+# Function to check if current time is within valid attendance window
+def is_attendance_time_valid(now=None):
+    current_datetime = now or datetime.now()
+    current_time = current_datetime.time()
+    current_day = current_datetime.weekday()
+    
+    # First check if it's an allowed day
+    if current_day not in ALLOWED_DAYS:
+        return False
+    
+    # Then check if time is within attendance window
+    return PRESENT_START <= current_time <= LATE_END
+
+# Initialize database
+def init_database(image_folder=None):
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file, timeout=20)  # Add timeout to prevent locks
+        cursor = conn.cursor()
+        
+        # Create students table if not exists
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE,
+            image_path TEXT,
+            status TEXT DEFAULT 'active',
+            absent_count INTEGER DEFAULT 0,
+            consecutive_absences INTEGER DEFAULT 0,
+            last_updated TEXT
+        )
+        ''')
+        
+        # Create attendance table if not exists
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY,
+            student_name TEXT,
+            date TEXT,
+            time TEXT,
+            status TEXT,
+            method TEXT DEFAULT 'face',
+            UNIQUE(student_name, date)
+        )
+        ''')
+        
+        # Create RFID cards table if not exists
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rfid_cards (
+            id INTEGER PRIMARY KEY,
+            card_uid TEXT UNIQUE,
+            student_name TEXT,
+            active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (student_name) REFERENCES students(name)
+        )
+        ''')
+        
+        ensure_rfid_version(cursor)
+
+        # Check if consecutive_absences column exists in students table
+        cursor.execute("PRAGMA table_info(students)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        # Add consecutive_absences column if it doesn't exist
+        if 'consecutive_absences' not in columns:
+            print("Adding consecutive_absences column to students table...")
+            cursor.execute('ALTER TABLE students ADD COLUMN consecutive_absences INTEGER DEFAULT 0')
+        
+        # Check if method column exists in attendance table
+        cursor.execute("PRAGMA table_info(attendance)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        # Add method column if it doesn't exist
+        if 'method' not in columns:
+            print("Adding method column to attendance table...")
+            cursor.execute('ALTER TABLE attendance ADD COLUMN method TEXT DEFAULT "face"')
+        
+        conn.commit()
+        print("Database initialized successfully")
+        
+        # Add all students from image_folder to the database if they don't exist
+        if image_folder and os.path.exists(image_folder):
+            for filename in os.listdir(image_folder):
+                if filename.endswith(('.jpg', '.jpeg', '.png', '.jfif')):
+                    name = os.path.splitext(filename)[0]
+                    image_path = os.path.join(image_folder, filename)
+                    
+                    # Check if student exists
+                    cursor.execute("SELECT id FROM students WHERE name=?", (name,))
+                    if cursor.fetchone() is None:
+                        # Add student to database
+                        cursor.execute(
+                            "INSERT INTO students (name, image_path, status, last_updated) VALUES (?, ?, ?, ?)",
+                            (name, image_path, 'active', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                        )
+                        print(f"Added student: {name}")
+            
+            conn.commit()
+            
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+def ensure_rfid_version(cursor):
+    """
+    Create the rfid_version counter and the triggers that bump it whenever
+    rfid_cards changes or a student is renamed, changes status or is
+    deleted, so RfidDirectory can tell those writes from attendance writes.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS rfid_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO rfid_version (id, version) VALUES (1, 0)")
+    for name, event in (('rfid_cards_insert', 'INSERT ON rfid_cards'),
+                        ('rfid_cards_update', 'UPDATE ON rfid_cards'),
+                        ('rfid_cards_delete', 'DELETE ON rfid_cards'),
+                        ('rfid_students_update', 'UPDATE OF name, status ON students'),
+                        ('rfid_students_delete', 'DELETE ON students')):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name}_version AFTER {event}
+        BEGIN
+            UPDATE rfid_version SET version = version + 1 WHERE id = 1;
+        END
+        ''')
+
+def card_uid_key(card_uid, strict=False):
+    """
+    'DE:AD:BE:EF', 'de-ad-be-ef' or [222, 173, 190, 239] -> 'de-ad-be-ef', so
+    stored cards and taps from the device all match. A string that is not hex
+    is only lowercased, unless strict is set, which raises ValueError.
+    """
+    if not isinstance(card_uid, str):
+        return '-'.join(f"{int(b):02x}" for b in card_uid)
+    parts = [part for part in card_uid.replace(':', '-').replace(' ', '-').split('-') if part]
+    try:
+        return '-'.join(f"{int(part, 16):02x}" for part in parts)
+    except ValueError:
+        if strict:
+            raise
+        return card_uid.strip().lower()
+
+class RfidDirectory:
+    """
+    Active RFID cards held in memory: card UID -> (student name, student status).
+
+    Loaded from rfid_cards joined with students. link_rfid_card and
+    unlink_rfid_card apply their own changes directly. Every lookup reads
+    PRAGMA data_version on a connection that never writes, which changes
+    when any other connection commits; the rfid_version counter then tells
+    whether cards or students changed (reload) or only attendance (keep).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.cards = {}
+        self.data_version = None
+        self.version = None
+        self.reloads = 0
+
+    def lookup(self, card_uid):
+        """(student name, status) for an active card, or None"""
+        with self.lock:
+            try:
+                self._check()
+            except sqlite3.Error as e:
+                print(f"Database error refreshing RFID cards: {e}")
+                self.close()
+            return self.cards.get(card_uid_key(card_uid))
+
+    def snapshot(self):
+        """Copy of all active cards, {card UID key: (student name, status)}"""
+        with self.lock:
+            try:
+                self._check()
+            except sqlite3.Error as e:
+                print(f"Database error refreshing RFID cards: {e}")
+                self.close()
+            return dict(self.cards)
+
+    def _check(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=20, isolation_level=None, check_same_thread=False)
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return
+        self.conn.execute("BEGIN")
+        try:
+            version = self._read_version()
+            if version is None or version != self.version:
+                rows = self.conn.execute(RFID_DIRECTORY_SQL).fetchall()
+                self.cards = {card_uid_key(uid): (name, status) for uid, name, status in rows}
+                self.version = version
+                self.reloads += 1
+        finally:
+            self.conn.execute("COMMIT")
+        self.data_version = data_version
+
+    def _read_version(self):
+        try:
+            return self.conn.execute("SELECT version FROM rfid_version WHERE id = 1").fetchone()[0]
+        except (sqlite3.Error, TypeError):
+            # Database without the counter: reload after every write
+            return None
+
+    def apply(self, version, card_uid, entry):
+        """Record a change committed as rfid_version = version; entry None removes the card"""
+        with self.lock:
+            if self.conn is None or self.version is None or version is None:
+                return
+            if version == self.version + 1:
+                if entry:
+                    self.cards[card_uid_key(card_uid)] = entry
+                else:
+                    self.cards.pop(card_uid_key(card_uid), None)
+                self.version = version
+            elif version > self.version:
+                # Something else changed the cards as well; reload on the next lookup
+                self.data_version = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self.data_version = None
+        self.version = None
+
+_rfid_directory = None
+
+def rfid_directory():
+    """The shared RfidDirectory for db_file (recreated if db_file is pointed elsewhere)"""
+    global _rfid_directory
+    if _rfid_directory is None or _rfid_directory.path != db_file:
+        if _rfid_directory is not None:
+            _rfid_directory.close()
+        _rfid_directory = RfidDirectory(db_file)
+    return _rfid_directory
+
+def _rfid_version(cursor):
+    try:
+        cursor.execute("SELECT version FROM rfid_version WHERE id = 1")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+
+# Function to link RFID card with student
+def link_rfid_card(student_name, card_uid):
+    """Link an RFID card with an existing student"""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        cursor = conn.cursor()
+
+        # Link the card if the student exists and the card is new; one statement in the usual case
+        cursor.execute(
+            "INSERT OR IGNORE INTO rfid_cards (card_uid, student_name) SELECT ?, name FROM students WHERE name=?",
+            (card_uid, student_name)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                "SELECT (SELECT 1 FROM students WHERE name=?), student_name, active FROM rfid_cards WHERE card_uid=?",
+                (student_name, card_uid)
+            )
+            row = cursor.fetchone()
+            if row is None or row[0] is None:
+                print(f"Student {student_name} not found")
+                return False
+            existing, active = row[1], row[2]
+            if active and existing == student_name:
+                print(f"Card already linked to {student_name}")
+                return True
+            if active:
+                print(f"Card already linked to another student: {existing}")
+                return False
+            # An unlinked card can be given to anyone
+            cursor.execute("UPDATE rfid_cards SET student_name=?, active=1 WHERE card_uid=?", (student_name, card_uid))
+
+        cursor.execute("SELECT status FROM students WHERE name=?", (student_name,))
+        status = cursor.fetchone()[0]
+        version = _rfid_version(cursor)
+        conn.commit()
+        rfid_directory().apply(version, card_uid, (student_name, status))
+        print(f"Linked RFID card {card_uid} to {student_name}")
+        return True
+        
+    except sqlite3.Error as e:
+        print(f"Database error linking RFID card: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+# Function to unlink an RFID card (the row is kept, inactive)
+def unlink_rfid_card(card_uid):
+    """Deactivate an RFID card; False if no active card has that UID"""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE rfid_cards SET active=0 WHERE card_uid=? AND active=1", (card_uid,))
+        if cursor.rowcount == 0:
+            print(f"No active RFID card {card_uid}")
+            return False
+        version = _rfid_version(cursor)
+        conn.commit()
+        rfid_directory().apply(version, card_uid, None)
+        print(f"Unlinked RFID card {card_uid}")
+        return True
+    except sqlite3.Error as e:
+        print(f"Database error unlinking RFID card: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+# Function to apply many card changes at once (used by rfid_sync.py)
+def update_rfid_cards(links=(), unlinks=()):
+    """
+    Link (student_name, card_uid) pairs and deactivate card UIDs in one transaction.
+    Cards are matched in any UID format, and only active students get a card.
+    Returns (UIDs linked, number of cards unlinked).
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file, timeout=20)
+        cursor = conn.cursor()
+        unlinked = 0
+        if unlinks:
+            keys = {card_uid_key(uid) for uid in unlinks}
+            cursor.execute("SELECT card_uid FROM rfid_cards WHERE active=1")
+            stored = [(uid,) for (uid,) in cursor.fetchall() if card_uid_key(uid) in keys]
+            cursor.executemany("UPDATE rfid_cards SET active=0 WHERE card_uid=?", stored)
+            unlinked = len(stored)
+
+        linked = []
+        for student_name, card_uid in links:
+            cursor.execute(
+                "INSERT OR IGNORE INTO rfid_cards (card_uid, student_name) "
+                "SELECT ?, name FROM students WHERE name=? AND status='active'",
+                (card_uid, student_name)
+            )
+            if cursor.rowcount == 0:
+                # Re-activate a card that was unlinked before
+                cursor.execute(
+                    "UPDATE rfid_cards SET student_name=?, active=1 WHERE card_uid=? AND active=0 "
+                    "AND EXISTS (SELECT 1 FROM students WHERE name=? AND status='active')",
+                    (student_name, card_uid, student_name)
+                )
+            if cursor.rowcount:
+                linked.append(card_uid)
+        conn.commit()
+        return linked, unlinked
+
+    except sqlite3.Error as e:
+        print(f"Database error updating RFID cards: {e}")
+        return [], 0
+    finally:
+        if conn:
+            conn.close()
+
+def lookup_rfid_card(card_uid):
+    """(student name, status) for an active RFID card, from memory; None if unknown"""
+    return rfid_directory().lookup(card_uid)
+
+# Function to get student name from RFID card
+def get_student_from_rfid(card_uid):
+    """Get student name associated with an RFID card"""
+    entry = lookup_rfid_card(card_uid)
+    return entry[0] if entry else None
+
+
+# Update markAttendance to handle database locks
+def markAttendance(name, method="face", now=None):
+    """Record attendance for a student; now overrides the current time (for backfills and benchmarks)"""
+    conn = None
+    try:
+        # Check if we're in a valid attendance time window
+        if not is_attendance_time_valid(now):
+            print(f"Attendance not recorded for {name} - outside valid hours")
+            return "Outside attendance hours"
+            
+        current_datetime = now or datetime.now()
+        current_time = current_datetime.time()
+        current_date = current_datetime.strftime('%Y-%m-%d')
+        
+        # Set status based on time
+        status = "Unknown"
+        if PRESENT_START <= current_time <= PRESENT_END:
+            status = "Present"
+        elif PRESENT_END < current_time <= LATE_END:
+            status = "Late"
+        else:
+            return "Outside attendance hours"
+        
+        # Connect to database with timeout and retry logic
+        max_retries = 3
+        retry_count = 0
+        while retry_count < max_retries:
+            try:
+                conn = sqlite3.connect(db_file, timeout=20)
+                cursor = conn.cursor()
+                
+                # First check if student is active
+                cursor.execute("SELECT status FROM students WHERE name=?", (name,))
+                student_result = cursor.fetchone()
+                
+                if not student_result:
+                    print(f"Student {name} not found in database")
+                    return "Student not found"
+                    
+                if student_result[0] != 'active':
+                    print(f"Student {name} is not active (status: {student_result[0]})")
+                    return "Student not active"
+                
+                # Check if this student already has an attendance record for today
+                cursor.execute(ATTENDANCE_LOOKUP_SQL, (name, current_date))
+                result = cursor.fetchone()
+                
+                if result:
+                    # Already recorded today, don't update
+                    print(f"{name} already marked as {result[0]} for today ({current_date})")
+                    return None
+                else:
+                    # Record new attendance
+                    cursor.execute(
+                        "INSERT INTO attendance (student_name, date, time, status, method) VALUES (?, ?, ?, ?, ?)",
+                        (name, current_date, current_datetime.strftime('%H:%M:%S'), status, method)
+                    )
+                    
+                    # Reset absence count for this student if they're present
+                    if status in ["Present", "Late"]:
+                        cursor.execute(
+                            "UPDATE students SET consecutive_absences = 0 WHERE name = ?",
+                            (name,)
+                        )
+                    
+                    conn.commit()
+                    print(f"Marked {name} as {status} at {current_datetime.strftime('%H:%M:%S')} using {method}")
+                    return status
+                    
+            except sqlite3.Error as e:
+                retry_count += 1
+                if retry_count < max_retries:
+                    print(f"Database error (attempt {retry_count}/{max_retries}): {e}")
+                    tm.sleep(1)  # Use tm.sleep instead of time.sleep
+                else:
+                    print(f"Error in markAttendance after {max_retries} attempts: {e}")
+                    return "Error"
+            finally:
+                if conn:
+                    conn.close()
+                    conn = None
+                    
+    except Exception as e:
+        print(f"Unexpected error in markAttendance: {e}")
+        return "Error"
+    finally:
+        if conn:
+            conn.close()
+
+
+# Update process_absent_students to handle database locks
+def process_absent_students(now=None):
+    """Process students who were absent today (or on the day of now) and update their absent count"""
+    conn = None
+    try:
+        # Connect to database with timeout
+        conn = sqlite3.connect(db_file, timeout=20)
+        cursor = conn.cursor()
+        
+        # Get current date
+        current_date = (now or datetime.now()).strftime('%Y-%m-%d')
+        
+        # Get all active students
+        cursor.execute(ACTIVE_STUDENTS_SQL)
+        active_students = cursor.fetchall()
+        
+        # Get students who attended today
+        cursor.execute(ATTENDED_ON_SQL, (current_date,))
+        attended_students = [record[0] for record in cursor.fetchall()]
+        
+        # Process absent students
+        for student in active_students:
+            name = student[0]
+            if name not in attended_students:
+                # Student was absent today
+                print(f"Student {name} was absent today")
+                
+                # Record absence
+                cursor.execute(
+                    "INSERT OR IGNORE INTO attendance (student_name, date, time, status) VALUES (?, ?, ?, ?)",
+                    (name, current_date, "00:00:00", "absent")
+                )
+                
+                # Increment absent count and consecutive absences
+                cursor.execute("""
+                    UPDATE students 
+                    SET absent_count = absent_count + 1,
+                        consecutive_absences = consecutive_absences + 1 
+                    WHERE name=?
+                """, (name,))
+                
+                # Check if student should be dropped
+                cursor.execute("SELECT consecutive_absences FROM students WHERE name=?", (name,))
+                consecutive_absences = cursor.fetchone()[0]
+                
+                if consecutive_absences >= 3:
+                    # Mark student as dropped
+                    cursor.execute("UPDATE students SET status='dropped' WHERE name=?", (name,))
+                    print(f"Student {name} has been dropped due to {consecutive_absences} consecutive absences")
+        
+        conn.commit()
+        
+    except sqlite3.Error as e:
+        print(f"Database error processing absences: {e}")
+    finally:
+        if conn:
+            conn.close()
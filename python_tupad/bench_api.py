@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import statistics
+import http.client
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from replication import create_attendance_schema
+from api_server import create_server
+
+# Stand-in dataset size
+STUDENTS = 500
+CLASS_DAYS = 60
+
+# Load shape
+CLIENTS = 8
+DURATION = 5            # Seconds per phase
+WRITE_INTERVAL = 0.5    # Seconds between commits in the mixed phase
+TARGET_RPS = 200
+
+def build_dataset(path, rng):
+    """Create a stand-in database with STUDENTS students and CLASS_DAYS days of attendance"""
+    conn = sqlite3.connect(path)
+    create_attendance_schema(conn)
+    names = [f"Student {i:04d}" for i in range(STUDENTS)]
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany("INSERT INTO students (name, status, last_updated) VALUES (?, 'active', ?)",
+                     [(name, now) for name in names])
+
+    dates = []
+    day = datetime.now() - timedelta(days=CLASS_DAYS)
+    for _ in range(CLASS_DAYS):
+        day += timedelta(days=1)
+        date = day.strftime('%Y-%m-%d')
+        dates.append(date)
+        rows = []
+        for name in names:
+            roll = rng.random()
+            if roll < 0.75:
+                rows.append((name, date, f"12:{rng.randint(20, 35):02d}:00", 'Present', 'face'))
+            elif roll < 0.9:
+                rows.append((name, date, f"13:{rng.randint(0, 49):02d}:00", 'Late', 'rfid'))
+            else:
+                rows.append((name, date, '00:00:00', 'absent', 'face'))
+        conn.executemany("INSERT INTO attendance (student_name, date, time, status, method) VALUES (?, ?, ?, ?, ?)",
+                         rows)
+    conn.commit()
+    conn.close()
+    return names, dates
+
+def request_paths(names, dates, rng, count=2000):
+    """A request mix weighted towards recent days and a working set of students"""
+    paths = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4:
+            paths.append(f"/attendance/{rng.choice(dates[-10:])}")
+        elif roll < 0.7:
+            paths.append(f"/students/{quote(rng.choice(names[:100]))}/history")
+        elif roll < 0.9:
+            paths.append(f"/summary?start={dates[0]}&end={dates[-1]}")
+        else:
+            paths.append("/students")
+    return paths
+
+def client(port, paths, deadline, conditional, results, lock):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    etags = {}
+    latencies = []
+    statuses = {}
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        headers = {'If-None-Match': etags[path]} if conditional and path in etags else {}
+        start = time.perf_counter()
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    conn.close()
+    with lock:
+        results['latencies'].extend(latencies)
+        for status, count in statuses.items():
+            results['statuses'][status] = results['statuses'].get(status, 0) + count
+
+def writer(path, dates, deadline):
+    """Commit a small change every WRITE_INTERVAL seconds, invalidating cached responses"""
+    conn = sqlite3.connect(path, timeout=10)
+    while time.perf_counter() < deadline:
+        conn.execute("UPDATE attendance SET time = ? WHERE id = (SELECT MIN(id) FROM attendance WHERE date = ?)",
+                     (datetime.now().strftime('%H:%M:%S.%f'), dates[-1]))
+        conn.commit()
+        time.sleep(WRITE_INTERVAL)
+    conn.close()
+
+def run_phase(label, port, paths, rng, db_path=None, dates=None, conditional=False):
+    deadline = time.perf_counter() + DURATION
+    results = {'latencies': [], 'statuses': {}}
+    lock = threading.Lock()
+    threads = []
+    for _ in range(CLIENTS):
+        mix = paths[:]
+        rng.shuffle(mix)
+        threads.append(threading.Thread(target=client, args=(port, mix, deadline, conditional, results, lock)))
+    if db_path:
+        threads.append(threading.Thread(target=writer, args=(db_path, dates, deadline)))
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(results['latencies'])
+    rps = len(latencies) / elapsed
+    p95 = latencies[int(len(latencies) * 0.95)]
+    statuses = ', '.join(f"{status}: {count}" for status, count in sorted(results['statuses'].items()))
+    print(f"{label:<28}{rps:>10,.0f}{statistics.median(latencies):>10.2f}{p95:>10.2f}   {statuses}")
+    return rps
+
+def run_benchmark():
+    rng = random.Random(7)
+    work_dir = tempfile.mkdtemp(prefix='tupad_api_')
+    server = None
+    try:
+        db_path = os.path.join(work_dir, 'attendance.db')
+        names, dates = build_dataset(db_path, rng)
+        server = create_server(db_path, port=0)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        api = server.RequestHandlerClass.api
+
+        paths = request_paths(names, dates, rng)
+        print(f"Stand-in dataset: {STUDENTS} students, {CLASS_DAYS} days; "
+              f"{CLIENTS} keep-alive clients, {DURATION}s per phase\n")
+        print(f"{'Phase':<28}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}   statuses")
+
+        rates = [
+            run_phase("Read only", port, paths, rng),
+            run_phase("Read only, If-None-Match", port, paths, rng, conditional=True),
+            run_phase(f"Writes every {WRITE_INTERVAL}s", port, paths, rng, db_path, dates),
+        ]
+        print(f"\nCache: {api.cache.hits} hits, {api.cache.misses} misses")
+        print(f"Target: at least {TARGET_RPS} req/s in every phase")
+        return min(rates) >= TARGET_RPS
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+            server.RequestHandlerClass.api.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,66 @@
+import os
+import sys
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+
+# Startup budget for the quick admin commands, in milliseconds
+TARGET_MS = 200
+RUNS = 10
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Commands timed end to end, run against a copy of the database
+COMMANDS = [
+    ['db_utils.py', 'students'],
+    ['db_utils.py', 'drop', 'Benchmark Student'],
+    ['db_utils.py', 'reactivate', 'Benchmark Student'],
+    ['list_students.py'],
+]
+
+def time_command(args, work_dir):
+    """Run a command RUNS times and return the wall-clock times in milliseconds"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=work_dir,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def run_benchmark():
+    work_dir = tempfile.mkdtemp(prefix='tupad_cli_')
+    try:
+        source_db = os.path.join(script_dir, 'attendance.db')
+        work_db = os.path.join(work_dir, 'attendance.db')
+        shutil.copy(source_db, work_db)
+        for name in ('db_utils.py', 'list_students.py'):
+            shutil.copy(os.path.join(script_dir, name), work_dir)
+
+        conn = sqlite3.connect(work_db)
+        conn.execute("INSERT OR IGNORE INTO students (name, status) VALUES ('Benchmark Student', 'active')")
+        conn.commit()
+        conn.close()
+
+        baseline = time_command(['-c', 'pass'], work_dir)
+        print(f"Interpreter startup baseline: {statistics.median(baseline):.0f} ms (median of {RUNS})\n")
+
+        failed = False
+        print(f"{'Command':<45}{'median':>10}{'max':>10}")
+        for command in COMMANDS:
+            timings = time_command(command, work_dir)
+            median = statistics.median(timings)
+            verdict = "OK" if median < TARGET_MS else "SLOW"
+            failed = failed or median >= TARGET_MS
+            print(f"{' '.join(command):<45}{median:>8.0f}ms{max(timings):>8.0f}ms  {verdict}")
+
+        print(f"\nTarget: under {TARGET_MS} ms per command")
+        return not failed
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,210 @@
+import io
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import platform
+import tempfile
+import argparse
+import statistics
+import contextlib
+import time as tm
+from datetime import datetime, timedelta
+
+import db_utils
+import mark_absent
+from attendance_db import (PRESENT_START, ALLOWED_DAYS, ATTENDANCE_LOOKUP_SQL, ACTIVE_STUDENTS_SQL, ATTENDED_ON_SQL,
+                          RFID_DIRECTORY_SQL, markAttendance, process_absent_students)
+from generate_dataset import generate_dataset
+
+# Repeats for read-only commands (the median is recorded)
+REPEAT = 3
+
+# How many check-ins the markAttendance step records
+MARK_COUNT = 300
+
+# A step slower than the baseline by more than this factor (and MIN_DELTA seconds) is a regression
+REGRESSION_FACTOR = 1.25
+MIN_DELTA = 0.005
+
+# Statements from db_utils and attendance_db, for EXPLAIN QUERY PLAN; {source} is the live attendance table
+QUERIES = {
+    'view_students': (db_utils.VIEW_STUDENTS_SQL, ()),
+    'view_attendance': (db_utils.VIEW_ATTENDANCE_SQL, ('{last}',)),
+    'daily_status_counts': (db_utils.DAILY_STATUS_COUNTS_SQL, ('{last}',)),
+    'export_range': (db_utils.EXPORT_RANGE_SQL, ('{first}', '{last}')),
+    'student_history': (db_utils.STUDENT_HISTORY_SQL, ('{student}', '{first}', '{last}')),
+    'mark_attendance_lookup': (ATTENDANCE_LOOKUP_SQL, ('{student}', '{last}')),
+    'absent_attended_today': (ATTENDED_ON_SQL, ('{last}',)),
+    'active_students': (ACTIVE_STUDENTS_SQL, ()),
+    'rfid_directory': (RFID_DIRECTORY_SQL, ()),
+}
+
+def query_plans(db_path, values):
+    """EXPLAIN QUERY PLAN for every statement in QUERIES"""
+    conn = sqlite3.connect(db_path)
+    plans = {}
+    try:
+        for name, (sql, params) in QUERIES.items():
+            params = tuple(p.format(**values) for p in params)
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql.format(source='attendance')}", params).fetchall()
+            plans[name] = [row[-1] for row in rows]
+    finally:
+        conn.close()
+    return plans
+
+def timed(step, repeat=1):
+    """Run step with its output discarded and return (median seconds, error message)"""
+    timings = []
+    for _ in range(repeat):
+        start = tm.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                step()
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+        timings.append(tm.perf_counter() - start)
+    return statistics.median(timings), None
+
+def next_class_day(after):
+    day = after + timedelta(days=1)
+    while day.weekday() not in ALLOWED_DAYS:
+        day += timedelta(days=1)
+    return day
+
+def benchmark_steps(values):
+    """(name, callable, read_only) for every db_utils command and the absence pipeline"""
+    first, last, student = values['first'], values['last'], values['student']
+    class_day = next_class_day(datetime.strptime(last, '%Y-%m-%d'))
+    check_in = datetime.combine(class_day.date(), PRESENT_START) + timedelta(minutes=5)
+    end_of_day = datetime.combine(class_day.date(), PRESENT_START) + timedelta(hours=3)
+    names = values['active_names']
+    report_start = (datetime.strptime(last, '%Y-%m-%d') - timedelta(days=13)).strftime('%Y-%m-%d')
+    term = values['terms'][0]
+
+    def mark_many():
+        for name in names[:MARK_COUNT]:
+            markAttendance(name, now=check_in)
+
+    def bulk_drop_reactivate():
+        for action in ('drop', 'reactivate'):
+            with open(f"roster_{action}.csv", 'w', encoding='utf-8') as f:
+                f.write("action,name\n" + ''.join(f"{action},{name}\n" for name in names[:100]))
+            db_utils.bulk_roster(f"roster_{action}.csv")
+
+    return [
+        ('students', db_utils.view_students, True),
+        ('attendance', lambda: db_utils.view_attendance(last), True),
+        ('export_csv', lambda: db_utils.export_attendance(first, last, 'csv'), True),
+        ('export_parquet', lambda: db_utils.export_attendance(first, last, 'parquet'), True),
+        ('report', lambda: db_utils.generate_attendance_report(last), True),
+        ('reports_2_weeks', lambda: db_utils.generate_attendance_reports(report_start, last), True),
+        ('changes_snapshot', lambda: db_utils.export_attendance_changes('bench', 'ndjson', 'changes.ndjson'), False),
+        ('markAttendance', mark_many, False),
+        ('process_absent_students', lambda: process_absent_students(now=end_of_day), False),
+        ('mark_absent_students', mark_absent.mark_absent_students, False),
+        ('changes_incremental', lambda: db_utils.export_attendance_changes('bench', 'ndjson', 'changes2.ndjson'), False),
+        ('reset', lambda: db_utils.reset_absent_count(student), False),
+        ('drop', lambda: db_utils.mark_student_dropped(student), False),
+        ('reactivate', lambda: db_utils.reactivate_student(student), False),
+        ('bulk_drop_reactivate_100', bulk_drop_reactivate, False),
+        ('archive', lambda: db_utils.archive_term(term['term'], term['start'], term['end']), False),
+        ('terms', db_utils.view_archived_terms, True),
+        ('attendance_archived', lambda: db_utils.view_attendance(term['end']), True),
+    ]
+
+def compare(results, baseline_path):
+    """Print timing ratios against a saved baseline and return the regressed steps"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nCompared with {baseline_path} ({baseline.get('created', 'unknown date')}):")
+    for name, current in results['timings'].items():
+        previous = baseline.get('timings', {}).get(name)
+        if current is None or previous is None:
+            continue
+        ratio = current / previous if previous else float('inf')
+        flag = "REGRESSION" if ratio > REGRESSION_FACTOR and current - previous > MIN_DELTA else ""
+        if flag:
+            regressions.append(name)
+        print(f"  {name:<28}{previous * 1000:>10.1f} ms -> {current * 1000:>10.1f} ms  x{ratio:.2f} {flag}")
+    for name, plan in results['query_plans'].items():
+        if plan != baseline.get('query_plans', {}).get(name, plan):
+            print(f"  Query plan changed for {name}: {plan}")
+    return regressions
+
+def run_benchmark(students, terms, db=None, output=None, baseline=None):
+    work_dir = tempfile.mkdtemp(prefix='tupad_db_')
+    previous_dir = os.getcwd()
+    db_path = os.path.join(work_dir, 'attendance.db')
+    output = os.path.abspath(output) if output else None
+    baseline = os.path.abspath(baseline) if baseline else None
+    try:
+        if db:
+            shutil.copy(db, db_path)
+            dataset = {'source': os.path.abspath(db)}
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                dataset = generate_dataset(db_path, students, terms)
+
+        conn = sqlite3.connect(db_path)
+        first, last = conn.execute("SELECT MIN(date), MAX(date) FROM attendance").fetchone()
+        active_names = [row[0] for row in conn.execute("SELECT name FROM students WHERE status='active' ORDER BY name")]
+        records = conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+        conn.close()
+
+        terms_info = dataset.get('terms') or [{'term': 'bench', 'start': first, 'end': first}]
+        values = {'first': first, 'last': last, 'student': active_names[0],
+                  'active_names': active_names, 'terms': terms_info}
+        plans = query_plans(db_path, values)
+
+        # Relative paths in db_utils, attendance_db and mark_absent resolve inside the work directory
+        os.chdir(work_dir)
+        print(f"Dataset: {records} attendance records, {len(active_names)} active students, {first} to {last}\n")
+        print(f"{'Step':<28}{'time':>12}")
+        timings, errors = {}, {}
+        for name, step, read_only in benchmark_steps(values):
+            seconds, error = timed(step, REPEAT if read_only else 1)
+            timings[name] = seconds
+            if error:
+                errors[name] = error
+                print(f"{name:<28}{'error':>12}  {error}")
+            else:
+                print(f"{name:<28}{seconds * 1000:>9.1f} ms")
+
+        print("\nQuery plans:")
+        for name, plan in plans.items():
+            print(f"  {name}: {'; '.join(plan)}")
+
+        results = {
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'dataset': dict(dataset, records=records),
+            'timings': timings,
+            'errors': errors,
+            'query_plans': plans,
+        }
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"\nResults saved to {output}")
+
+        if baseline:
+            return not compare(results, baseline)
+        return True
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time db_utils commands and the absence pipeline on a large database")
+    parser.add_argument('--students', type=int, default=2000, help="Students in the generated dataset")
+    parser.add_argument('--terms', type=int, default=2, help="Terms in the generated dataset")
+    parser.add_argument('--db', help="Benchmark a copy of this database instead of generating one")
+    parser.add_argument('--output', default='bench_db_results.json', help="Where to save the results")
+    parser.add_argument('--compare', help="Baseline JSON to compare against; exits 1 on regressions")
+    args = parser.parse_args()
+
+    sys.exit(0 if run_benchmark(args.students, args.terms, args.db, args.output, args.compare) else 1)
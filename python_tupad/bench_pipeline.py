@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import argparse
+import threading
+import contextlib
+import io
+import random
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+import requests
+
+import attendance_db
+from attendance_db import PRESENT_START, ALLOWED_DAYS, init_database, markAttendance
+from frame_recorder import read_frames
+from esp32cam_simulator import DeviceSimulator, create_simulator, load_frames
+from recognition_pipeline import StageTimer, decode_jpeg, flip_frame, to_rgb, encode_faces, match_face, process_frame
+from capture_policy import TwoTierCapture, sized_url
+
+# Stages in pipeline order, as reported
+STAGES = ['fetch', 'decode', 'flip', 'resize', 'color', 'face_locations', 'face_encodings',
+          'match', 'db_write', 'feedback', 'frame_total']
+
+# A stage whose p95 grows by more than this factor (and MIN_DELTA_MS) is reported as a regression
+REGRESSION_FACTOR = 1.25
+MIN_DELTA_MS = 2.0
+
+# Face-free frames for --empty are the corpus cut into this many tiles a side and shuffled
+EMPTY_TILES = 8
+
+def known_faces(reference_dir):
+    """Encode the reference images the same way the recognition script does"""
+    encodings, names = [], []
+    for filename in sorted(os.listdir(reference_dir)):
+        img = cv2.imread(os.path.join(reference_dir, filename))
+        if img is None:
+            continue
+        found = encode_faces(to_rgb(img), None)
+        if found:
+            encodings.append(found[0])
+            names.append(os.path.splitext(filename)[0])
+    return encodings, names
+
+def as_camera_frames(frames):
+    """Turn upright photos upside down, the way the mounted ESP32-CAM delivers them"""
+    rotated = []
+    for jpeg in frames:
+        img = decode_jpeg(jpeg)
+        if img is not None:
+            rotated.append(cv2.imencode('.jpg', flip_frame(img))[1].tobytes())
+    return rotated
+
+def empty_frames(frames, count):
+    """Frames with nobody in view but as much detail: the corpus with its tiles shuffled"""
+    empty = []
+    for i in range(count):
+        img = decode_jpeg(frames[i % len(frames)])
+        rows, cols = img.shape[0] // EMPTY_TILES, img.shape[1] // EMPTY_TILES
+        tiles = [img[r * rows:(r + 1) * rows, c * cols:(c + 1) * cols]
+                 for r in range(EMPTY_TILES) for c in range(EMPTY_TILES)]
+        random.Random(i).shuffle(tiles)
+        shuffled = np.vstack([np.hstack(tiles[r * EMPTY_TILES:(r + 1) * EMPTY_TILES]) for r in range(EMPTY_TILES)])
+        empty.append(cv2.imencode('.jpg', shuffled)[1].tobytes())
+    return empty
+
+def class_time():
+    """A moment inside the Present window on an allowed day, so markAttendance writes"""
+    day = datetime.now()
+    while day.weekday() not in ALLOWED_DAYS:
+        day += timedelta(days=1)
+    return datetime.combine(day.date(), PRESENT_START) + timedelta(minutes=5)
+
+def run_pipeline(corpus, base_url, known_encodings, known_names, now, repeat=1, two_tier=False):
+    """
+    Fetch every frame from the camera URL and run it through the production stages.
+    Returns the timer, faces found, faces matched and bytes received.
+    """
+    timer = StageTimer()
+    faces = matched = received = 0
+
+    def fetch(size=None):
+        nonlocal received
+        with timer.stage('fetch'):
+            response = requests.get(sized_url(f"{base_url}/capture", size) if size else f"{base_url}/capture",
+                                    timeout=5)
+        received += len(response.content)
+        return response.content
+
+    policy = TwoTierCapture(fetch, stage=timer.stage) if two_tier else None
+    for _ in range(repeat):
+        for _ in range(len(corpus)):
+            with timer.stage('frame_total'):
+                if policy:
+                    img, locations, encodings = policy.capture()
+                    with timer.stage('match'):
+                        results = [(location, *match_face(known_encodings, encoding))
+                                   for location, encoding in zip(locations, encodings)]
+                else:
+                    img, results = process_frame(fetch(), known_encodings, timer=timer)
+                if img is None:
+                    continue
+
+                faces += len(results)
+                names = [known_names[index] for _, index, _ in results if index is not None]
+                matched += len(names)
+                statuses = []
+                with timer.stage('db_write'):
+                    for name in names:
+                        statuses.append(markAttendance(name, now=now))
+                with timer.stage('feedback'):
+                    # Same calls as update_oled_display and play_buzzer_sound
+                    lines = [names[0], str(statuses[0]), now.strftime('%H:%M:%S'), now.strftime('%Y-%m-%d')] \
+                        if names else ["Face Recognition", "System Ready", f"{len(known_names)} faces", "in database"]
+                    requests.post(f"{base_url}/oled", json={'clear': False, 'lines': lines}, timeout=2)
+                    for status in statuses:
+                        if status in ('Present', 'Late'):
+                            requests.post(f"{base_url}/buzzer", json={'status': status.lower()}, timeout=2)
+    return timer, faces, matched, received
+
+def compare(summary, baseline_path):
+    """Print p95 ratios against a saved baseline and return the regressed stages"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nCompared with {baseline_path} ({baseline.get('created', 'unknown date')}), p95:")
+    for stage in STAGES:
+        current = summary.get(stage)
+        previous = baseline.get('stages', {}).get(stage)
+        if not current or not previous:
+            continue
+        ratio = current['p95_ms'] / previous['p95_ms'] if previous['p95_ms'] else 1.0
+        regressed = ratio > REGRESSION_FACTOR and current['p95_ms'] - previous['p95_ms'] > MIN_DELTA_MS
+        if regressed:
+            regressions.append(stage)
+        print(f"  {stage:<16}{previous['p95_ms']:>10.2f} ms -> {current['p95_ms']:>10.2f} ms  "
+              f"x{ratio:.2f} {'REGRESSION' if regressed else ''}")
+    return regressions
+
+def run_benchmark(recording=None, frames_dir='image_folder', reference_dir='image_folder', url=None,
+                  repeat=1, latency=0.0, output=None, baseline=None, two_tier=False, empty=0, switch_delay=0.0):
+    # Recordings come straight from the camera; a folder of photos is assumed to be upright
+    corpus = [jpeg for _, jpeg in read_frames(recording)] if recording else as_camera_frames(load_frames(frames_dir))
+    if not corpus:
+        print("No frames to benchmark")
+        return False
+    corpus += empty_frames(corpus, empty)
+
+    work_dir = tempfile.mkdtemp(prefix='tupad_pipeline_')
+    server = None
+    try:
+        known_encodings, known_names = known_faces(reference_dir)
+        attendance_db.db_file = os.path.join(work_dir, 'attendance.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            init_database(reference_dir)
+
+        if url:
+            base_url = url.rstrip('/')
+        else:
+            # Serve the corpus from a local simulated camera so the fetch stage is a real HTTP round trip
+            server = create_simulator(DeviceSimulator(corpus, latency=latency / 1000,
+                                                      switch_delay=switch_delay / 1000), port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        print(f"Corpus: {len(corpus)} frames from {recording or frames_dir} ({empty} without faces); "
+              f"{len(known_names)} known faces; camera {base_url}; "
+              f"{'two-tier' if two_tier else 'single-frame'} capture\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            timer, faces, matched, received = run_pipeline(corpus, base_url, known_encodings, known_names,
+                                                           class_time(), repeat, two_tier)
+
+        summary = timer.summary()
+        print(f"{'Stage':<16}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage in STAGES:
+            if stage in summary:
+                s = summary[stage]
+                print(f"{stage:<16}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                      f"{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+        total = summary.get('frame_total')
+        if total:
+            print(f"\n{faces} faces found, {matched} matched; "
+                  f"{1000 / total['mean_ms']:.1f} frames/s end to end; "
+                  f"{received / total['count'] / 1024:.1f} KB received per frame")
+
+        results = {
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'corpus': {'source': os.path.abspath(recording or frames_dir), 'frames': len(corpus), 'repeat': repeat,
+                       'empty': empty},
+            'capture': 'two-tier' if two_tier else 'single-frame',
+            'faces': faces,
+            'matched': matched,
+            'bytes_received': received,
+            'stages': summary,
+        }
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"Results saved to {output}")
+        if baseline:
+            return not compare(summary, baseline)
+        return True
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the recognition pipeline")
+    parser.add_argument('--recording', help="frame_recorder.py recording to use as the corpus")
+    parser.add_argument('--frames', default='image_folder', help="Folder of JPEG frames (when no --recording)")
+    parser.add_argument('--reference', default='image_folder', help="Folder of known faces")
+    parser.add_argument('--url', help="Fetch from this camera (e.g. a running simulator) instead of a built-in one")
+    parser.add_argument('--latency', type=float, default=0, help="Latency of the built-in simulated camera, ms")
+    parser.add_argument('--switch-delay', type=float, default=0,
+                        help="Resolution switch time of the built-in simulated camera, ms")
+    parser.add_argument('--two-tier', action='store_true', help="Probe at low resolution, fetch faces at high")
+    parser.add_argument('--empty', type=int, default=0, help="Face-free frames to add to the corpus")
+    parser.add_argument('--repeat', type=int, default=3, help="Passes over the corpus")
+    parser.add_argument('--output', default='bench_pipeline_results.json', help="Where to save the results")
+    parser.add_argument('--compare', help="Baseline JSON to compare against; exits 1 on regressions")
+    args = parser.parse_args()
+
+    try:
+        ok = run_benchmark(args.recording, args.frames, args.reference, args.url, args.repeat,
+                           args.latency, args.output, args.compare, args.two_tier, args.empty,
+                           args.switch_delay)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        ok = False
+    sys.exit(0 if ok else 1)
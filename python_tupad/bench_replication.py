@@ -0,0 +1,148 @@
+import os
+import sys
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from db_utils import ensure_change_log
+from replication import create_attendance_schema, ship_deltas, Collector
+
+# Simulation size
+NODE_COUNT = 20
+STUDENTS_PER_NODE = 150
+SHARED_STUDENTS = 30    # Students who attend classes in more than one room
+CLASS_DAYS = 40
+
+def build_node(node_db, node_index, rng):
+    """Create a node database and simulate a term of attendance through the triggers"""
+    conn = sqlite3.connect(node_db)
+    create_attendance_schema(conn)
+    ensure_change_log(conn)
+    cursor = conn.cursor()
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    names = [f"Node{node_index:02d} Student {i:04d}" for i in range(STUDENTS_PER_NODE)]
+    names += [f"Shared Student {i:04d}" for i in range(SHARED_STUDENTS)]
+    cursor.executemany(
+        "INSERT INTO students (name, status, last_updated) VALUES (?, 'active', ?)",
+        [(name, now) for name in names]
+    )
+
+    start = datetime(2025, 1, 6)
+    for day in range(CLASS_DAYS):
+        date = (start + timedelta(days=day)).strftime('%Y-%m-%d')
+        rows = []
+        for name in names:
+            roll = rng.random()
+            if roll < 0.75:
+                rows.append((name, date, f"12:{rng.randint(20, 35):02d}:{rng.randint(0, 59):02d}", 'Present', 'face'))
+            elif roll < 0.9:
+                rows.append((name, date, f"13:{rng.randint(0, 49):02d}:{rng.randint(0, 59):02d}", 'Late', 'rfid'))
+            else:
+                rows.append((name, date, '00:00:00', 'absent', 'face'))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO attendance (student_name, date, time, status, method) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+
+    # A few status changes so student replication is exercised too
+    cursor.executemany(
+        "UPDATE students SET status = 'dropped', last_updated = ? WHERE name = ?",
+        [(now, name) for name in rng.sample(names, 5)]
+    )
+    conn.commit()
+    conn.close()
+
+def run_benchmark():
+    rng = random.Random(42)
+    work_dir = tempfile.mkdtemp(prefix='tupad_replication_')
+    drop_dir = os.path.join(work_dir, 'drop')
+    central_db = os.path.join(work_dir, 'central.db')
+
+    try:
+        print(f"Simulating {NODE_COUNT} nodes in {work_dir}...")
+        node_dbs = []
+        for i in range(NODE_COUNT):
+            node_db = os.path.join(work_dir, f"node{i:02d}.db")
+            build_node(node_db, i, rng)
+            node_dbs.append(node_db)
+
+        # The triggers saw every write, so skip the first-run snapshot and measure the outbox path
+        marks = {}
+        for node_db in node_dbs:
+            conn = sqlite3.connect(node_db)
+            conn.execute("INSERT INTO export_watermarks (consumer, last_seq) VALUES ('replication', 0)")
+            conn.commit()
+            for student_date in conn.execute("SELECT student_name, date FROM attendance"):
+                marks[student_date] = marks.get(student_date, 0) + 1
+            conn.close()
+        # Marks of shared students made in more than one room on the same day
+        duplicate_marks = sum(count - 1 for count in marks.values())
+
+        start = time.perf_counter()
+        shipped = 0
+        for i, node_db in enumerate(node_dbs):
+            shipped += ship_deltas(node_db, f"room{i:02d}", drop_dir)
+        ship_seconds = time.perf_counter() - start
+
+        delta_files = os.listdir(drop_dir)
+        compressed_bytes = sum(os.path.getsize(os.path.join(drop_dir, f)) for f in delta_files)
+
+        # Keep one batch aside to check that a re-delivered file is a no-op
+        duplicate = os.path.join(work_dir, 'duplicate.json.gz')
+        shutil.copy(os.path.join(drop_dir, sorted(delta_files)[0]), duplicate)
+
+        collector = Collector(central_db)
+        # The collector has to start where the skipped snapshot left the nodes, or it waits for it
+        collector.conn.executemany("INSERT INTO replication_nodes (node_id, last_seq) VALUES (?, 0)",
+                                   [(f"room{i:02d}",) for i in range(NODE_COUNT)])
+        collector.conn.commit()
+        start = time.perf_counter()
+        applied = collector.apply_directory(drop_dir)
+        apply_seconds = time.perf_counter() - start
+
+        shutil.copy(duplicate, os.path.join(drop_dir, sorted(delta_files)[0]))
+        reapplied = collector.apply_directory(drop_dir)
+
+        cursor = collector.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM attendance")
+        central_rows = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(DISTINCT student_name || date) FROM attendance")
+        distinct_rows = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM replication_conflicts")
+        conflict_rows = cursor.fetchone()[0]
+        collector.close()
+
+        print("\n=== Replication Benchmark ===")
+        print(f"Nodes:                   {NODE_COUNT}")
+        print(f"Changes shipped:         {shipped}")
+        print(f"Delta files:             {len(delta_files)} ({compressed_bytes / 1024:.1f} KiB compressed)")
+        print(f"Ship time:               {ship_seconds:.2f}s ({shipped / ship_seconds:,.0f} changes/s)")
+        print(f"Apply time:              {apply_seconds:.2f}s ({applied / apply_seconds:,.0f} changes/s)")
+        print(f"Conflicts recorded:      {collector.conflicts}")
+        print(f"Central attendance rows: {central_rows} (unique student/date: {distinct_rows})")
+        print(f"Re-delivered batch:      {reapplied} changes applied (expected 0)")
+
+        # Every student/date seen on any node ends up once; identical marks from two rooms are no conflict
+        failures = []
+        if central_rows != len(marks) or distinct_rows != len(marks):
+            failures.append(f"central attendance has {central_rows} rows, expected {len(marks)}")
+        if not 0 < collector.conflicts <= duplicate_marks or conflict_rows != collector.conflicts:
+            failures.append(f"{collector.conflicts} conflicts counted and {conflict_rows} recorded, "
+                            f"expected between 1 and {duplicate_marks}")
+        if collector.deferred:
+            failures.append(f"{collector.deferred} delta files were deferred")
+        if reapplied:
+            failures.append(f"the re-delivered batch applied {reapplied} changes")
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        return not failures
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,199 @@
+import io
+import os
+import sys
+import json
+import random
+import shutil
+import sqlite3
+import platform
+import tempfile
+import argparse
+import contextlib
+import time as tm
+from datetime import datetime, timedelta
+
+import attendance_db
+from attendance_db import (PRESENT_START, ALLOWED_DAYS, init_database, link_rfid_card, unlink_rfid_card,
+                           lookup_rfid_card, rfid_directory, markAttendance)
+
+# Registered cards and lookups per run
+CARDS = 10000
+TAPS = 100000
+
+# Share of taps by cards that are not registered
+UNKNOWN_SHARE = 0.1
+
+# An attendance write after every this many taps, for the mixed workload
+WRITE_EVERY = 50
+
+# Taps through the old per-tap connection, which is much slower
+CONNECTION_TAPS = 5000
+
+# A rate lower than the baseline by more than this factor is a regression
+REGRESSION_FACTOR = 1.25
+
+def lookup_with_connection(card_uid):
+    """How get_student_from_rfid used to resolve a tap: a new connection and query per card"""
+    conn = sqlite3.connect(attendance_db.db_file)
+    try:
+        row = conn.execute("SELECT student_name FROM rfid_cards WHERE card_uid=? AND active=1",
+                           (card_uid,)).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def build_database(cards, rng):
+    """Students with one linked card each, in the recognition script's 'de-ad-be-ef' format"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    uids = set()
+    while len(uids) < cards:
+        uids.add('-'.join(f"{rng.randrange(256):02x}" for _ in range(4)))
+    uids = sorted(uids)
+    conn = sqlite3.connect(attendance_db.db_file)
+    conn.executemany("INSERT INTO students (name, status, last_updated) VALUES (?, ?, ?)",
+                     [(f"Student {i:05d}", 'dropped' if i % 50 == 0 else 'active', now) for i in range(cards)])
+    conn.executemany("INSERT INTO rfid_cards (card_uid, student_name) VALUES (?, ?)",
+                     [(uid, f"Student {i:05d}") for i, uid in enumerate(uids)])
+    conn.commit()
+    conn.close()
+    return uids
+
+def tap_sequence(uids, count, rng):
+    taps = []
+    for _ in range(count):
+        if rng.random() < UNKNOWN_SHARE:
+            taps.append('ff-' + '-'.join(f"{rng.randrange(256):02x}" for _ in range(3)))
+        else:
+            taps.append(rng.choice(uids))
+    return taps
+
+def rate(count, seconds):
+    return count / seconds if seconds else float('inf')
+
+def run_steps(uids, taps):
+    """Return {step: (taps or operations per second, detail)}"""
+    results = {}
+    directory = rfid_directory()
+
+    start = tm.perf_counter()
+    found = sum(1 for uid in taps[:CONNECTION_TAPS] if lookup_with_connection(uid))
+    results['connection_per_tap'] = (rate(CONNECTION_TAPS, tm.perf_counter() - start), f"{found} known")
+
+    start = tm.perf_counter()
+    lookup_rfid_card(uids[0])
+    results['directory_load'] = (rate(1, tm.perf_counter() - start), f"{len(directory.cards)} cards")
+
+    start = tm.perf_counter()
+    found = sum(1 for uid in taps if lookup_rfid_card(uid))
+    results['directory'] = (rate(len(taps), tm.perf_counter() - start), f"{found} known")
+
+    # Attendance writes change PRAGMA data_version but not the cards, so they must not cause reloads
+    class_day = datetime.now()
+    while class_day.weekday() not in ALLOWED_DAYS:
+        class_day += timedelta(days=1)
+    check_in = datetime.combine(class_day.date(), PRESENT_START) + timedelta(minutes=5)
+    reloads = directory.reloads
+    mixed = taps[:len(taps) // 10]
+    writes = 0
+    start = tm.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, uid in enumerate(mixed):
+            card = lookup_rfid_card(uid)
+            if i % WRITE_EVERY == 0 and card:
+                markAttendance(card[0], method='rfid', now=check_in)
+                writes += 1
+    elapsed = tm.perf_counter() - start
+    results['directory_with_writes'] = (rate(len(mixed), elapsed),
+                                        f"{writes} writes, {directory.reloads - reloads} reloads")
+
+    # Link and unlink update the dictionary in place
+    reloads = directory.reloads
+    spare = [f"Student {i:05d}" for i in range(1, len(uids), 50)][:200]
+    start = tm.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, name in enumerate(spare):
+            uid = f"ee-ee-{i >> 8:02x}-{i & 255:02x}"
+            link_rfid_card(name, uid)
+            assert lookup_rfid_card(uid)[0] == name
+            unlink_rfid_card(uid)
+            assert lookup_rfid_card(uid) is None
+    elapsed = tm.perf_counter() - start
+    results['link_unlink'] = (rate(len(spare) * 2, elapsed), f"{directory.reloads - reloads} reloads")
+
+    # A card linked by another program is picked up through data_version
+    conn = sqlite3.connect(attendance_db.db_file)
+    conn.execute("INSERT INTO rfid_cards (card_uid, student_name) VALUES ('ef-ef-ef-ef', 'Student 00001')")
+    conn.commit()
+    conn.close()
+    start = tm.perf_counter()
+    card = lookup_rfid_card('EF:EF:EF:EF')
+    results['external_change'] = (rate(1, tm.perf_counter() - start), f"found {card[0] if card else None}")
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nCompared with {baseline_path} ({baseline.get('created', 'unknown date')}):")
+    for name, current in results['rates'].items():
+        previous = baseline.get('rates', {}).get(name)
+        if not previous:
+            continue
+        ratio = current / previous
+        flag = "REGRESSION" if ratio * REGRESSION_FACTOR < 1 else ""
+        if flag:
+            regressions.append(name)
+        print(f"  {name:<24}{previous:>14,.0f}/s -> {current:>14,.0f}/s  x{ratio:.2f} {flag}")
+    return regressions
+
+def run_benchmark(cards=CARDS, taps=TAPS, seed=42, output=None, baseline=None):
+    rng = random.Random(seed)
+    work_dir = tempfile.mkdtemp(prefix='tupad_rfid_')
+    previous_db = attendance_db.db_file
+    attendance_db.db_file = os.path.join(work_dir, 'attendance.db')
+    try:
+        uids = build_database(cards, rng)
+        results = run_steps(uids, tap_sequence(uids, taps, rng))
+        rfid_directory().close()
+    finally:
+        attendance_db.db_file = previous_db
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{cards} registered cards, {taps} taps ({UNKNOWN_SHARE:.0%} unknown)\n")
+    print(f"{'Step':<24}{'rate':>16}  detail")
+    for name, (per_second, detail) in results.items():
+        unit = "loads/s" if name in ('directory_load', 'external_change') else "/s"
+        print(f"{name:<24}{per_second:>14,.0f}{unit:<8}{detail}")
+    lookup_us = 1e6 / results['directory'][0]
+    print(f"\nIn-memory lookup: {lookup_us:.1f} us per tap, "
+          f"{results['directory'][0] / results['connection_per_tap'][0]:.0f}x the per-tap connection")
+
+    summary = {
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'cards': cards,
+        'taps': taps,
+        'rates': {name: per_second for name, (per_second, _) in results.items()},
+        'details': {name: detail for name, (_, detail) in results.items()},
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results saved to {output}")
+    if baseline:
+        return not compare(summary, baseline)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RFID taps per second with the in-memory card directory")
+    parser.add_argument('--cards', type=int, default=CARDS, help="Registered cards")
+    parser.add_argument('--taps', type=int, default=TAPS, help="Lookups to time")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Save the results as JSON")
+    parser.add_argument('--compare', help="Baseline JSON to compare against; exits 1 on regressions")
+    args = parser.parse_args()
+
+    sys.exit(0 if run_benchmark(args.cards, args.taps, args.seed, args.output, args.compare) else 1)
@@ -0,0 +1,284 @@
+import sys
+import argparse
+import statistics
+import time as tm
+from collections import deque
+
+import requests
+
+from capture_policy import TwoTierCapture, PROBE_SIZE, DETAIL_SIZE, parse_size, sized_url
+from esp32_device import DeviceClient
+from metrics import CAMERA_TUNES
+from recognition_pipeline import SCALE, decode_jpeg, flip_frame, shrink_frame, to_rgb, locate_faces
+from structured_logging import get_logger
+
+log = get_logger('camera_tuner')
+
+# Frame sizes tried, smallest first; the firmware ignores those above the size it booted with
+SIZES = ('320x240', '400x296', '640x480', '800x600', '1024x768', '1280x1024', '1600x1200')
+
+# OV2640 JPEG quality values tried, best first (0-63; lower is better and makes larger frames)
+QUALITIES = (10, 15, 24, 36)
+
+# The best JPEG quality is kept as long as frames this large fit; below it a worse quality is tried
+MIN_SIZE = '640x480'
+
+# Frames timed per setting
+SAMPLES = 3
+
+# Frames per second the fetches must keep up with; the recognition loop captures every 0.5 s
+TARGET_FPS = 2.0
+
+# Seconds between periodic tunes, so a link that got better is used again
+TUNE_INTERVAL = 900
+
+# Fetches compared with the tuned timings, and how much slower they must get to count as a degraded link
+WINDOW = 20
+DEGRADED_FACTOR = 2.0
+
+# A setting finding faces in less than this share of the frames the best one does lost them to compression
+DETECTION_FLOOR = 0.5
+
+# Tunes wait until nobody has been seen for this many seconds
+IDLE_SECONDS = 10
+
+def size_width(size):
+    """Width of '640x480', or 0 for the camera's own size (None)"""
+    return parse_size(size)[0] if size else 0
+
+def describe(measurement):
+    """'800x600 at quality 15: 180 ms, 42.1 KB, faces in 100% of frames'"""
+    m = measurement
+    quality = f"quality {m['quality']}" if m['quality'] is not None else "the current quality"
+    if m['seconds'] is None:
+        return f"{m['size'] or 'camera size'} at {quality}: no frames"
+    return (f"{m['size'] or 'camera size'} at {quality}: {m['seconds'] * 1000:.0f} ms, "
+            f"{m['kb']:.1f} KB, faces in {m['faces']:.0%} of frames")
+
+class CameraTuner:
+    """
+    Choose the frame size and JPEG quality that keep up with a target frame rate.
+
+    tune() times samples fetches of each setting through the capture
+    policy's fetch, after control('quality', q), and counts the frames in
+    which a face is found at the width the pipeline detects at. With
+    two-tier capture the probe size stays and the detail size is tuned, so
+    a probe plus a detail frame must arrive within one frame interval;
+    otherwise the size of every frame is tuned. The best quality at which
+    MIN_SIZE frames fit is kept, at the largest size that fits; worse
+    qualities are only tried, and used, when the better ones cannot carry
+    MIN_SIZE frames in time. Settings that lose faces the others find are
+    skipped. Sizes are tried from small to large and a quality is given up
+    at the first size that does not fit.
+
+    observe() is given the time of each fetch outside tuning. due() asks
+    for a new tune every interval seconds and when those fetches get
+    DEGRADED_FACTOR times slower than when tuned, as on a failing Wi-Fi link.
+    """
+
+    def __init__(self, policy, control, target_fps=TARGET_FPS, interval=TUNE_INTERVAL, sizes=SIZES,
+                 qualities=QUALITIES, samples=SAMPLES):
+        self.policy = policy
+        self.control = control
+        self.budget = 1 / target_fps
+        self.interval = interval
+        self.sizes = sizes
+        self.qualities = qualities
+        self.samples = samples
+        self.setting = None
+        self.expected = {}
+        self.recent = deque(maxlen=WINDOW)
+        self.last_tune = None
+        self.tuning = False
+
+    def _fetch(self, size):
+        """(seconds, JPEG bytes, upright image) of one frame; the image is None on failure"""
+        start = tm.perf_counter()
+        content = self.policy.fetch(size)
+        seconds = tm.perf_counter() - start
+        img = decode_jpeg(content) if content is not None else None
+        return seconds, content, flip_frame(img) if img is not None else None
+
+    def _has_face(self, img):
+        """Whether the pipeline would find a face, detecting at the width it uses"""
+        if self.policy.sized:
+            scale = size_width(self.policy.probe_size) * self.policy.probe_scale / img.shape[1]
+        else:
+            scale = SCALE
+        return bool(locate_faces(to_rgb(shrink_frame(img, scale))))
+
+    def _measure(self, size, quality, probe=None):
+        """
+        Time samples fetches of size. With probe each one follows a probe
+        fetch, as in two-tier capture, and 'seconds' covers both; without, a
+        first untimed fetch switches the sensor to the size.
+        """
+        m = {'size': size, 'quality': quality, 'probe': False, 'supported': True, 'seconds': None,
+             'fetch': None, 'kb': 0.0, 'faces': 0.0, 'failures': 0}
+        if not probe:
+            self._fetch(size)
+        totals, fetches, received, faces = [], [], 0, 0
+        for _ in range(self.samples):
+            before = 0.0
+            if probe:
+                before, _, probe_img = self._fetch(probe)
+                if probe_img is None:
+                    m['failures'] += 1
+                    continue
+            seconds, content, img = self._fetch(size)
+            if img is None:
+                m['failures'] += 1
+                continue
+            if size and img.shape[1] != size_width(size):
+                m['supported'] = False
+                return m
+            totals.append(before + seconds)
+            fetches.append(seconds)
+            received += len(content)
+            faces += self._has_face(img)
+        if fetches:
+            m['seconds'] = statistics.median(totals)
+            m['fetch'] = statistics.median(fetches)
+            m['kb'] = received / len(fetches) / 1024
+            m['faces'] = faces / len(fetches)
+        return m
+
+    def fits(self, m):
+        return (m['supported'] and m['seconds'] is not None and m['seconds'] <= self.budget
+                and m['failures'] * 2 < self.samples)
+
+    def _search(self):
+        """Measurements of the settings worth trying, in the order of the class docstring"""
+        _, _, img = self._fetch(self.sizes[0])
+        if img is None:
+            return []
+        if img.shape[1] != size_width(self.sizes[0]):
+            # Firmware without /capture?size= leaves only the JPEG quality to tune
+            self.policy.sized = False
+            probe, sizes = None, [None]
+        else:
+            probe = self.policy.probe_size if self.policy.sized else None
+            sizes = [size for size in self.sizes if size_width(size) > size_width(probe)]
+
+        measured = []
+        for quality in self.qualities:
+            if not self.control('quality', quality):
+                log.warning("Could not set the camera's JPEG quality; tuning the frame size only")
+                quality = None
+            if probe:
+                steady = self._measure(probe, quality)
+                steady['probe'] = True
+                measured.append(steady)
+            fitted, largest = False, None
+            for size in list(sizes):
+                m = self._measure(size, quality, probe)
+                measured.append(m)
+                if not m['supported']:
+                    # Larger than the size the camera booted with, like every size after it
+                    sizes = sizes[:sizes.index(size)]
+                    break
+                if not self.fits(m):
+                    break
+                fitted, largest = True, size
+            if quality is None or not sizes or \
+                    (fitted and size_width(largest) >= min(size_width(MIN_SIZE), size_width(sizes[-1]))):
+                break
+        return measured
+
+    def choose(self, measured):
+        """The measurement of the setting to use, or None if no frame arrived"""
+        candidates = [m for m in measured if not m['probe'] and m['supported'] and m['seconds'] is not None]
+        if not candidates:
+            return None
+        fitting = [m for m in candidates if self.fits(m)]
+        if not fitting:
+            # Nothing keeps up, so lose the fewest frames
+            return min(candidates, key=lambda m: m['seconds'])
+        most = max(m['faces'] for m in fitting)
+        fitting = [m for m in fitting if m['faces'] >= most * DETECTION_FLOOR]
+        enough = min(size_width(MIN_SIZE), max(size_width(m['size']) for m in fitting))
+        return max(fitting, key=lambda m: (size_width(m['size']) >= enough, -(m['quality'] or 0),
+                                           size_width(m['size'])))
+
+    def apply(self, best, measured):
+        """Set the chosen quality and size and remember their fetch times"""
+        if best['quality'] is not None:
+            self.control('quality', best['quality'])
+        if self.policy.sized:
+            self.policy.detail_size = best['size']
+        else:
+            self.policy.frame_size = best['size']
+        self.setting = (best['size'], best['quality'])
+        self.expected = {best['size']: best['fetch']}
+        for m in measured:
+            if m['probe'] and m['quality'] == best['quality'] and m['fetch']:
+                self.expected[m['size']] = m['fetch']
+
+    def tune(self, reason='interval', verbose=False):
+        """Measure, apply the best setting and return its measurement; None keeps the current one"""
+        self.tuning = True
+        try:
+            measured = self._search()
+        finally:
+            self.tuning = False
+        self.last_tune = tm.time()
+        self.recent.clear()
+        if verbose:
+            print(f"Camera tuning for {1 / self.budget:g} frames/s "
+                  f"({'probe ' + self.policy.probe_size + ' + detail' if self.policy.sized else 'single frame'}):")
+            for m in measured:
+                print(f"  {'probe ' if m['probe'] else ''}{describe(m)}"
+                      f"{'' if m['supported'] else ' (size not supported)'}")
+        best = self.choose(measured)
+        if best is None:
+            log.warning("Camera tuning got no frames; keeping the current setting")
+            return None
+        self.apply(best, measured)
+        CAMERA_TUNES.inc(reason=reason)
+        if verbose:
+            print(f"Chosen: {describe(best)}{'' if self.fits(best) else ' (the fastest; none keeps up)'}")
+        log.info("Camera tuned (%s): %s", reason, describe(best))
+        return best
+
+    def observe(self, size, seconds):
+        """Compare a successful fetch outside tuning with the time it took when tuned"""
+        expected = self.expected.get(size)
+        if expected and not self.tuning:
+            # A tenth of the frame interval is too little to notice on a fast link
+            self.recent.append(seconds / max(expected, self.budget / 10))
+
+    def degraded(self):
+        return len(self.recent) >= WINDOW // 2 and statistics.median(self.recent) > DEGRADED_FACTOR
+
+    def due(self, idle_seconds):
+        """Why tune() should run now ('interval' or 'degraded'), or None; only when nobody was seen lately"""
+        if self.tuning or idle_seconds < IDLE_SECONDS:
+            return None
+        if self.last_tune is None or tm.time() - self.last_tune >= self.interval:
+            return 'interval'
+        if self.degraded():
+            return 'degraded'
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure frame sizes and JPEG qualities and set the best on an ESP32-CAM")
+    parser.add_argument('address', help="ESP32-CAM address, e.g. 192.168.0.156")
+    parser.add_argument('--fps', type=float, default=TARGET_FPS, help="Frame rate the fetches must keep up with")
+    parser.add_argument('--probe-size', default=PROBE_SIZE, help="Two-tier probe size ('' for single-frame capture)")
+    parser.add_argument('--samples', type=int, default=SAMPLES, help="Frames timed per setting")
+    args = parser.parse_args()
+
+    url = f"http://{args.address}/capture"
+    session = requests.Session()
+
+    def fetch(size):
+        try:
+            response = session.get(sized_url(url, size) if size else url, timeout=5)
+        except requests.exceptions.RequestException as e:
+            print(f"Capture failed: {e}")
+            return None
+        return response.content if response.status_code == 200 else None
+
+    tuner = CameraTuner(TwoTierCapture(fetch, args.probe_size, DETAIL_SIZE), DeviceClient(args.address).control,
+                        args.fps, samples=args.samples)
+    sys.exit(0 if tuner.tune('manual', verbose=True) else 1)
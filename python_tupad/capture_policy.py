@@ -0,0 +1,167 @@
+from contextlib import nullcontext
+
+from recognition_pipeline import SCALE, decode_jpeg, flip_frame, shrink_frame, to_rgb, locate_faces, encode_faces
+
+# Resolution polled for face detection, and the one fetched only once a face was found
+PROBE_SIZE = '320x240'
+DETAIL_SIZE = '800x600'
+
+# Probe frames are shrunk by this factor before detection (320x240 -> 160x120, as 640x480 at SCALE)
+PROBE_SCALE = 0.5
+
+# Context kept around each face in the high-resolution crop, as a share of the face size
+CROP_MARGIN = 0.5
+
+def parse_size(size):
+    """'320x240' -> (320, 240)"""
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+def sized_url(url, size):
+    """Camera URL asking the firmware for a frame of the given size"""
+    return f"{url}{'&' if '?' in url else '?'}size={size}"
+
+def resize_location(location, factor, shape):
+    """(top, right, bottom, left) multiplied by factor and clipped to an image of the given shape"""
+    top, right, bottom, left = location
+    height, width = shape[:2]
+    return (max(0, int(top * factor)), min(width, int(right * factor)),
+            min(height, int(bottom * factor)), max(0, int(left * factor)))
+
+def crop_box(location, shape, margin=CROP_MARGIN):
+    """(top, bottom, left, right) of a region around a face, widened by margin on every side"""
+    top, right, bottom, left = location
+    pad_y = int((bottom - top) * margin)
+    pad_x = int((right - left) * margin)
+    height, width = shape[:2]
+    return max(0, top - pad_y), min(height, bottom + pad_y), max(0, left - pad_x), min(width, right + pad_x)
+
+class TwoTierCapture:
+    """
+    Detect faces on a small frame and fetch a large one only when there is a face.
+
+    fetch(size) returns the JPEG bytes of one camera frame of that size
+    ('320x240') or of the default size when size is None, or None on
+    failure. Each capture() fetches a probe_size frame and looks for faces
+    on it. Only when one is found is a detail_size frame fetched; each face
+    is found again in a crop of it around where the probe saw it and
+    encoded from there, so nobody in view costs one small download and
+    decode, and a face is encoded from more pixels.
+
+    Firmware that ignores the size, a replayed recording, or a probe that
+    is already as large as the detail frame fall back to the single-frame
+    path: detection and encoding on the frame shrunk by SCALE, as before.
+    That path fetches frame_size frames (None for the camera's own size).
+    stage(name) may return a context manager that times each stage.
+    """
+
+    def __init__(self, fetch, probe_size=PROBE_SIZE, detail_size=DETAIL_SIZE, probe_scale=PROBE_SCALE,
+                 margin=CROP_MARGIN, stage=None):
+        self.fetch = fetch
+        self.probe_size = probe_size or None
+        self.detail_size = detail_size or None
+        self.probe_scale = probe_scale
+        self.margin = margin
+        self.stage = stage or (lambda name: nullcontext())
+        self.sized = bool(self.probe_size and self.detail_size)
+        self.frame_size = None
+        self.content = None
+        self.stats = {'probes': 0, 'details': 0, 'probe_bytes': 0, 'detail_bytes': 0}
+
+    def _frame(self, size):
+        """(JPEG bytes, upright image) of one frame, or (None, None)"""
+        content = self.fetch(size)
+        return content, self._decode(content) if content is not None else None
+
+    def _decode(self, content):
+        with self.stage('decode'):
+            img = decode_jpeg(content)
+        if img is None:
+            return None
+        with self.stage('flip'):
+            return flip_frame(img)
+
+    def _detect(self, img, scale):
+        """Face locations on img (at full size) plus the RGB detection image and its locations"""
+        with self.stage('resize'):
+            small = shrink_frame(img, scale) if scale != 1 else img
+        with self.stage('color'):
+            rgb = to_rgb(small)
+        with self.stage('face_locations'):
+            found = locate_faces(rgb)
+        return [resize_location(location, 1 / scale, img.shape) for location in found], rgb, found
+
+    def capture(self):
+        """
+        (img, face locations on img, encodings), or (None, [], []) if no frame
+        could be read; content then holds the undecodable JPEG, if any.
+        """
+        if not self.sized:
+            return self._single(self.fetch(self.frame_size))
+
+        content, img = self._frame(self.probe_size)
+        if img is None:
+            self.content = content
+            return None, [], []
+        probe_width = parse_size(self.probe_size)[0]
+        if img.shape[1] != probe_width or probe_width >= parse_size(self.detail_size)[0]:
+            # The camera did not honour the size, so asking for two sizes only doubles the traffic
+            print(f"Camera returned {img.shape[1]}x{img.shape[0]} for {self.probe_size}; "
+                  f"using single-frame capture")
+            self.sized = False
+            return self._single(content, img)
+
+        self.stats['probes'] += 1
+        self.stats['probe_bytes'] += len(content)
+        locations, rgb, found = self._detect(img, self.probe_scale)
+        if not locations:
+            self.content = content
+            return img, [], []
+
+        detail_content, detail = self._frame(self.detail_size)
+        if detail is None:
+            # Encode from the probe rather than lose the face
+            self.content = content
+            with self.stage('face_encodings'):
+                return img, locations, encode_faces(rgb, found)
+        self.stats['details'] += 1
+        self.stats['detail_bytes'] += len(detail_content)
+        self.content = detail_content
+
+        factor = detail.shape[1] / img.shape[1]
+        detail_locations, encodings = [], []
+        for location in locations:
+            y0, y1, x0, x1 = crop_box(resize_location(location, factor, detail.shape), detail.shape, self.margin)
+            crop = to_rgb(detail[y0:y1, x0:x1])
+            # The subject may have moved between the two frames, so find the face again in
+            # the crop, shrunk back to the probe's scale to keep this detection cheap
+            with self.stage('face_locations'):
+                found = locate_faces(shrink_frame(crop, self.probe_scale / factor))
+            if not found:
+                continue
+            top, right, bottom, left = max(found, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+            box = resize_location((top, right, bottom, left), factor / self.probe_scale, crop.shape)
+            with self.stage('face_encodings'):
+                encodings.extend(encode_faces(crop, [box]))
+            detail_locations.append((box[0] + y0, box[1] + x0, box[2] + y0, box[3] + x0))
+        return detail, detail_locations, encodings
+
+    def _single(self, content, img=None):
+        self.content = content
+        if img is None and content is not None:
+            img = self._decode(content)
+        if img is None:
+            return None, [], []
+        locations, rgb, found = self._detect(img, SCALE)
+        with self.stage('face_encodings'):
+            encodings = encode_faces(rgb, found)
+        return img, locations, encodings
+
+    def summary(self):
+        """One line about the traffic saved, or None before any probe"""
+        probes = self.stats['probes']
+        if not probes:
+            return None
+        average = (self.stats['probe_bytes'] + self.stats['detail_bytes']) / probes
+        return (f"Two-tier capture: {probes} probes at {self.probe_size}, {self.stats['details']} "
+                f"{self.detail_size} frames fetched for faces, {average / 1024:.1f} KB per frame on average")
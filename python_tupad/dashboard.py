@@ -0,0 +1,306 @@
+import os
+import re
+import sys
+import json
+import html
+import time
+import argparse
+import sqlite3
+
+import db_utils
+from db_utils import (connect_db, ensure_change_log, fetch_students, fetch_attendance,
+                      fetch_student_history, fetch_attendance_summary)
+
+# Default output directory for the generated site
+output_dir = 'dashboard'
+
+# File inside the output directory that remembers what the last build covered
+STATE_FILE = '.build_state.json'
+
+STATUS_COLORS = {'present': '#2e7d32', 'late': '#f9a825', 'absent': '#c62828'}
+STATUS_ORDER = ['present', 'late', 'absent']
+
+PAGE_STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; margin: 1em 0; }
+th, td { border: 1px solid #ccc; padding: 4px 10px; text-align: left; }
+th { background: #eee; }
+.present { color: #2e7d32; } .late { color: #b8860b; } .absent { color: #c62828; }
+nav a { margin-right: 1em; }
+"""
+
+def _slug(text):
+    """File-name safe version of a student name or term"""
+    return re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-').lower() or 'unnamed'
+
+def _escape(value):
+    return html.escape('' if value is None else str(value))
+
+def _page(title, body, depth=1):
+    """Wrap body in the common page layout; depth is the directory level below the site root"""
+    root = '../' * depth
+    return (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{_escape(title)}</title>"
+            f"<style>{PAGE_STYLE}</style></head><body>\n"
+            f"<nav><a href=\"{root}index.html\">Overview</a></nav>\n"
+            f"<h1>{_escape(title)}</h1>\n{body}\n"
+            f"<p><small>Generated {time.strftime('%Y-%m-%d %H:%M:%S')}</small></p>\n</body></html>\n")
+
+def _status_cell(status):
+    return f"<td class=\"{_escape((status or '').lower())}\">{_escape(status)}</td>"
+
+def _svg_status_bars(counts):
+    """Horizontal bar chart of {status: count}"""
+    total = max(sum(counts.values()), 1)
+    rows = [s for s in STATUS_ORDER if s in counts] + sorted(s for s in counts if s not in STATUS_ORDER)
+    height = 26 * len(rows) + 10
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="420" height="{height}">']
+    for i, status in enumerate(rows):
+        width = 300 * counts[status] / total
+        y = 5 + i * 26
+        parts.append(f'<text x="0" y="{y + 15}" font-size="13">{_escape(status.title())}</text>')
+        parts.append(f'<rect x="70" y="{y}" width="{width:.1f}" height="20" '
+                     f'fill="{STATUS_COLORS.get(status, "#607d8b")}"/>')
+        parts.append(f'<text x="{75 + width:.1f}" y="{y + 15}" font-size="13">{counts[status]}</text>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+def _svg_daily_stacked(summary):
+    """Stacked bar per date of the status counts in {date: {status: count}}"""
+    dates = sorted(summary)
+    if not dates:
+        return ''
+    peak = max(sum(counts.values()) for counts in summary.values()) or 1
+    bar = max(4, min(24, 720 // len(dates)))
+    width = bar * len(dates) + 10
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="170">']
+    for i, date in enumerate(dates):
+        y = 160
+        for status in STATUS_ORDER:
+            count = summary[date].get(status, 0)
+            if not count:
+                continue
+            h = 150 * count / peak
+            y -= h
+            parts.append(f'<rect x="{5 + i * bar}" y="{y:.1f}" width="{bar - 1}" height="{h:.1f}" '
+                         f'fill="{STATUS_COLORS[status]}"><title>{date} {status}: {count}</title></rect>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+def _svg_timeline(history):
+    """One coloured square per class day for a student's history"""
+    if not history:
+        return ''
+    per_row = 40
+    rows = (len(history) + per_row - 1) // per_row
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{per_row * 14 + 4}" height="{rows * 14 + 4}">']
+    for i, record in enumerate(history):
+        status = (record['status'] or '').lower()
+        parts.append(f'<rect x="{2 + (i % per_row) * 14}" y="{2 + (i // per_row) * 14}" width="12" height="12" '
+                     f'fill="{STATUS_COLORS.get(status, "#607d8b")}"><title>{record["date"]} {status}</title></rect>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def _load_terms(conn):
+    """Archived terms plus the current term (whatever is still in the live table)"""
+    cursor = conn.cursor()
+    terms = []
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='archived_terms'")
+    if cursor.fetchone():
+        cursor.execute("SELECT term, start_date, end_date FROM archived_terms ORDER BY start_date")
+        terms = [list(row) for row in cursor.fetchall()]
+    terms.append(['current', None, None])
+    return terms
+
+def _term_for_date(terms, date):
+    for term, start_date, end_date in terms:
+        if start_date and start_date <= date <= end_date:
+            return term
+    return 'current'
+
+def _term_summary(conn, term, start_date, end_date):
+    if term == 'current':
+        return fetch_attendance_summary(conn, '0000-01-01', '9999-12-31', include_archives=False)
+    return fetch_attendance_summary(conn, start_date, end_date)
+
+def build_day_page(conn, site_dir, date):
+    """Write days/<date>.html; returns False when the date no longer has records"""
+    records = fetch_attendance(conn, date)
+    path = os.path.join(site_dir, 'days', f"{date}.html")
+    if not records:
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+
+    counts = {}
+    for record in records:
+        status = (record['status'] or '').lower()
+        counts[status] = counts.get(status, 0) + 1
+
+    rows = ''.join(
+        f"<tr><td><a href=\"../students/{_slug(r['student_name'])}.html\">{_escape(r['student_name'])}</a></td>"
+        f"<td>{_escape(r['time'])}</td>{_status_cell(r['status'])}<td>{_escape(r['method'])}</td></tr>"
+        for r in records
+    )
+    body = (f"{_svg_status_bars(counts)}\n<table><tr><th>Name</th><th>Time</th><th>Status</th><th>Method</th></tr>"
+            f"{rows}</table>")
+    _write(path, _page(f"Attendance for {date}", body))
+    return True
+
+def build_student_page(conn, site_dir, student):
+    history = fetch_student_history(conn, student['name'])
+    counts = {}
+    for record in history:
+        status = (record['status'] or '').lower()
+        counts[status] = counts.get(status, 0) + 1
+
+    rows = ''.join(
+        f"<tr><td><a href=\"../days/{r['date']}.html\">{r['date']}</a></td><td>{_escape(r['time'])}</td>"
+        f"{_status_cell(r['status'])}<td>{_escape(r['method'])}</td></tr>"
+        for r in reversed(history)
+    )
+    body = (f"<p>Status: <b>{_escape(student['status'])}</b>, absences: {_escape(student['absent_count'])}</p>\n"
+            f"{_svg_status_bars(counts) if counts else ''}\n{_svg_timeline(history)}\n"
+            f"<table><tr><th>Date</th><th>Time</th><th>Status</th><th>Method</th></tr>{rows}</table>")
+    _write(os.path.join(site_dir, 'students', f"{_slug(student['name'])}.html"), _page(student['name'], body))
+
+def build_term_page(conn, site_dir, term, start_date, end_date):
+    summary = _term_summary(conn, term, start_date, end_date)
+    rows = ''.join(
+        f"<tr><td><a href=\"../days/{date}.html\">{date}</a></td>"
+        + ''.join(f"<td>{counts.get(status, 0)}</td>" for status in STATUS_ORDER)
+        + "</tr>"
+        for date, counts in sorted(summary.items(), reverse=True)
+    )
+    title = "Current term" if term == 'current' else f"Term {term} ({start_date} to {end_date})"
+    body = (f"{_svg_daily_stacked(summary)}\n<table><tr><th>Date</th>"
+            + ''.join(f"<th>{status.title()}</th>" for status in STATUS_ORDER)
+            + f"</tr>{rows}</table>")
+    _write(os.path.join(site_dir, 'terms', f"{_slug(term)}.html"), _page(title, body))
+    return summary
+
+def build_index(conn, site_dir, terms, students):
+    term_rows = ''.join(
+        f"<tr><td><a href=\"terms/{_slug(term)}.html\">{_escape(term)}</a></td>"
+        f"<td>{_escape(start_date or '')}</td><td>{_escape(end_date or '')}</td></tr>"
+        for term, start_date, end_date in reversed(terms)
+    )
+    student_rows = ''.join(
+        f"<tr><td><a href=\"students/{_slug(s['name'])}.html\">{_escape(s['name'])}</a></td>"
+        f"<td>{_escape(s['status'])}</td><td>{_escape(s['absent_count'])}</td></tr>"
+        for s in students
+    )
+    body = (f"<h2>Terms</h2><table><tr><th>Term</th><th>Start</th><th>End</th></tr>{term_rows}</table>\n"
+            f"<h2>Students</h2><table><tr><th>Name</th><th>Status</th><th>Absences</th></tr>{student_rows}</table>")
+    _write(os.path.join(site_dir, 'index.html'), _page("Attendance Dashboard", body, depth=0))
+
+def build_dashboard(site_dir=None, full=False):
+    """
+    Build the static HTML dashboard, rebuilding only pages whose data changed.
+
+    The change_log sequence number reached by the last build is stored in the
+    site directory. An incremental build reads only the change_log entries
+    after it and regenerates the day, student and term pages they touch plus
+    the overview page. A full build runs the first time, when requested, or
+    when the set of archived terms has changed.
+    """
+    site_dir = site_dir or output_dir
+    started = time.perf_counter()
+
+    conn = connect_db()
+    if not conn:
+        return
+
+    try:
+        ensure_change_log(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+        high_water = cursor.fetchone()[0]
+        terms = _load_terms(conn)
+
+        state_path = os.path.join(site_dir, STATE_FILE)
+        state = None
+        if not full and os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('db_file') != os.path.abspath(db_utils.db_file) or state.get('terms') != terms:
+                state = None
+        if state is not None:
+            # Entries after the last build were pruned (db_utils.py prune_changes), so rebuild everything
+            cursor.execute("SELECT MIN(seq) FROM change_log")
+            oldest = cursor.fetchone()[0]
+            if oldest is not None and oldest > state['last_seq'] + 1:
+                state = None
+
+        pages = 0
+        students = fetch_students(conn)
+        if state is None:
+            summary = fetch_attendance_summary(conn, '0000-01-01', '9999-12-31')
+            for date in summary:
+                pages += build_day_page(conn, site_dir, date)
+            for student in students:
+                build_student_page(conn, site_dir, student)
+                pages += 1
+            for term, start_date, end_date in terms:
+                build_term_page(conn, site_dir, term, start_date, end_date)
+                pages += 1
+            mode = 'Full'
+        else:
+            cursor.execute("""
+                SELECT table_name, payload FROM change_log
+                WHERE seq > ? AND seq <= ?
+            """, (state['last_seq'], high_water))
+            dates, names = set(), set()
+            for table_name, payload in cursor.fetchall():
+                row = json.loads(payload)
+                if table_name == 'attendance':
+                    dates.add(row['date'])
+                    names.add(row['student_name'])
+                elif table_name == 'students':
+                    names.add(row['name'])
+
+            if not dates and not names:
+                print(f"Dashboard in {site_dir}/ is up to date "
+                      f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+                return
+
+            for date in sorted(dates):
+                pages += build_day_page(conn, site_dir, date)
+            for student in students:
+                if student['name'] in names:
+                    build_student_page(conn, site_dir, student)
+                    pages += 1
+            for term in {_term_for_date(terms, date) for date in dates}:
+                _, start_date, end_date = next(t for t in terms if t[0] == term)
+                build_term_page(conn, site_dir, term, start_date, end_date)
+                pages += 1
+            mode = 'Incremental'
+
+        build_index(conn, site_dir, terms, students)
+        pages += 1
+
+        _write(state_path, json.dumps({
+            'db_file': os.path.abspath(db_utils.db_file),
+            'last_seq': high_water,
+            'terms': terms,
+        }))
+        print(f"{mode} build wrote {pages} pages to {site_dir}/ "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Error building dashboard: {e}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a static HTML attendance dashboard")
+    parser.add_argument('--output', default=output_dir, help="Directory to write the site to")
+    parser.add_argument('--full', action='store_true', help="Rebuild every page")
+    args = parser.parse_args()
+
+    build_dashboard(args.output, args.full)
+    sys.exit(0)
@@ -1,14 +1,65 @@
 import sqlite3
 import os
 import sys
+import csv
+import json
+import argparse
 from datetime import datetime, timedelta
-from tabulate import tabulate
-import pandas as pd
-import matplotlib.pyplot as plt
+
+# pandas, matplotlib and tabulate are imported inside the commands that use
+# them, so quick commands (students, drop, reactivate) start without loading them
 
 # Database file path
 db_file = 'attendance.db'
 
+# Output directory for the month-partitioned Parquet export
+parquet_dir = 'attendance_parquet'
+
+# Directory holding one database file per archived term
+archive_dir = 'archives'
+
+# Columns copied into and read back from term archives
+ATTENDANCE_COLUMNS = ['id', 'student_name', 'date', 'time', 'status', 'method']
+
+# Statements shared with bench_db.py, which explains their query plans; {source} is an attendance_source()
+VIEW_STUDENTS_SQL = """
+    SELECT id, name, status, absent_count, last_updated
+    FROM students
+    ORDER BY status, name
+"""
+VIEW_ATTENDANCE_SQL = """
+    SELECT a.student_name, a.time, a.status
+    FROM {source} a
+    JOIN students s ON a.student_name = s.name
+    WHERE a.date = ?
+    ORDER BY a.time
+"""
+DAILY_STATUS_COUNTS_SQL = """
+    SELECT status, COUNT(*)
+    FROM {source} a
+    WHERE date = ?
+    GROUP BY status
+"""
+EXPORT_RANGE_SQL = """
+    SELECT
+        a.student_name as Name,
+        a.date as Date,
+        a.time as Time,
+        a.status as Status
+    FROM
+        {source} a
+    WHERE
+        a.date BETWEEN ? AND ?
+    ORDER BY
+        a.date DESC, a.student_name
+"""
+STUDENT_HISTORY_SQL = """
+    SELECT a.date, a.time, a.status, a.method
+    FROM {source} a
+    WHERE a.student_name = ? AND a.date BETWEEN ? AND ?
+    ORDER BY a.date
+"""
+
 def connect_db():
     """Connect to the SQLite database"""
     if not os.path.exists(db_file):
@@ -30,11 +81,7 @@ def view_students():
     
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, name, status, absent_count, last_updated 
-            FROM students 
-            ORDER BY status, name
-        """)
+        cursor.execute(VIEW_STUDENTS_SQL)
         
         students = cursor.fetchall()
         
@@ -43,6 +90,7 @@ def view_students():
             return
         
         # Format data for display
+        from tabulate import tabulate
         headers = ["ID", "Name", "Status", "Absent Count", "Last Updated"]
         print("\n" + tabulate(students, headers=headers, tablefmt="grid"))
         
@@ -74,13 +122,8 @@ def view_attendance(date=None):
     
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT a.student_name, a.time, a.status
-            FROM attendance a
-            JOIN students s ON a.student_name = s.name
-            WHERE a.date = ? 
-            ORDER BY a.time
-        """, (date,))
+        source = attendance_source(conn, date, date)
+        cursor.execute(VIEW_ATTENDANCE_SQL.format(source=source), (date,))
         
         attendance = cursor.fetchall()
         
@@ -89,17 +132,13 @@ def view_attendance(date=None):
             return
         
         # Format data for display
+        from tabulate import tabulate
         headers = ["Name", "Time", "Status"]
         print(f"\nAttendance for {date}:")
         print(tabulate(attendance, headers=headers, tablefmt="grid"))
         
         # Count by status
-        cursor.execute("""
-            SELECT status, COUNT(*) 
-            FROM attendance 
-            WHERE date = ? 
-            GROUP BY status
-        """, (date,))
+        cursor.execute(DAILY_STATUS_COUNTS_SQL.format(source=source), (date,))
         status_counts = cursor.fetchall()
         
         print("\nAttendance Summary:")
@@ -111,6 +150,69 @@ def view_attendance(date=None):
     finally:
         conn.close()
 
+def fetch_students(conn):
+    """Return all students as dicts, ordered by name"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, name, status, absent_count, last_updated
+        FROM students
+        ORDER BY name
+    """)
+    columns = ['id', 'name', 'status', 'absent_count', 'last_updated']
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def fetch_attendance(conn, date):
+    """Return the attendance records for one date as dicts, ordered by time"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT a.student_name, a.time, a.status, a.method
+            FROM {attendance_source(conn, date, date)} a
+            WHERE a.date = ?
+            ORDER BY a.time, a.student_name
+        """, (date,))
+        rows = cursor.fetchall()
+    finally:
+        detach_archives(conn)
+    columns = ['student_name', 'time', 'status', 'method']
+    return [dict(zip(columns, row)) for row in rows]
+
+def fetch_student_history(conn, student_name, start_date='0000-01-01', end_date='9999-12-31'):
+    """Return one student's attendance records between two dates as dicts, ordered by date"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(STUDENT_HISTORY_SQL.format(source=attendance_source(conn, start_date, end_date)),
+                       (student_name, start_date, end_date))
+        rows = cursor.fetchall()
+    finally:
+        detach_archives(conn)
+    columns = ['date', 'time', 'status', 'method']
+    return [dict(zip(columns, row)) for row in rows]
+
+def fetch_attendance_summary(conn, start_date, end_date, include_archives=True):
+    """
+    Return {date: {status: count}} for every date with records between two dates.
+
+    With include_archives=False only the live attendance table is read.
+    """
+    cursor = conn.cursor()
+    try:
+        source = attendance_source(conn, start_date, end_date) if include_archives else 'attendance'
+        cursor.execute(f"""
+            SELECT a.date, lower(a.status), COUNT(*)
+            FROM {source} a
+            WHERE a.date BETWEEN ? AND ?
+            GROUP BY a.date, lower(a.status)
+            ORDER BY a.date
+        """, (start_date, end_date))
+        rows = cursor.fetchall()
+    finally:
+        detach_archives(conn)
+    summary = {}
+    for date, status, count in rows:
+        summary.setdefault(date, {})[status] = count
+    return summary
+
 def reset_absent_count(student_name=None):
     """Reset absent count for a student or all students"""
     conn = connect_db()
@@ -208,8 +310,153 @@ def reactivate_student(student_name):
     finally:
         conn.close()
 
-def export_attendance(start_date=None, end_date=None, format='csv'):
-    """Export attendance data to CSV or Excel"""
+def bulk_roster(source, default_action=None, report_file=None):
+    """
+    Apply many roster changes from a CSV file (or '-' for stdin) in one transaction.
+
+    The CSV has a header with a name column and optionally action, card_uid
+    and image_path columns. Supported actions are enroll, drop, reactivate and
+    link (RFID card). Without an action column every row uses default_action,
+    so a plain list of names with a 'name' header also works. Current state is
+    read with one query per table and all writes are done with executemany.
+    Returns the per-row results as a list of dicts.
+    """
+    started = datetime.now()
+
+    try:
+        handle = sys.stdin if source == '-' else open(source, newline='', encoding='utf-8')
+        try:
+            rows = list(csv.DictReader(handle))
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+    except OSError as e:
+        print(f"Error reading roster file: {e}")
+        return None
+
+    conn = connect_db()
+    if not conn:
+        return None
+
+    results = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rfid_cards (
+            id INTEGER PRIMARY KEY,
+            card_uid TEXT UNIQUE,
+            student_name TEXT,
+            active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (student_name) REFERENCES students(name)
+        )
+        ''')
+
+        cursor.execute("SELECT name, status FROM students")
+        statuses = dict(cursor.fetchall())
+        cursor.execute("SELECT card_uid, student_name FROM rfid_cards")
+        cards = dict(cursor.fetchall())
+
+        now = started.strftime('%Y-%m-%d %H:%M:%S')
+        enrollments = []
+        # In file order: reactivating and then dropping a student still clears the absent count
+        status_changes = []
+        links = []
+
+        # Work out every row against the in-memory roster, so later rows see earlier ones
+        for line_number, row in enumerate(rows, start=2):
+            action = (row.get('action') or default_action or '').strip().lower()
+            name = (row.get('name') or '').strip()
+            card_uid = (row.get('card_uid') or '').strip()
+            result, message = 'error', ''
+
+            if not name:
+                message = "Missing student name"
+            elif action == 'enroll':
+                if name in statuses:
+                    result, message = 'skipped', f"Already enrolled ({statuses[name]})"
+                else:
+                    enrollments.append((name, (row.get('image_path') or '').strip() or None, 'active', now))
+                    statuses[name] = 'active'
+                    result, message = 'ok', "Enrolled"
+            elif action in ('drop', 'reactivate'):
+                target = 'dropped' if action == 'drop' else 'active'
+                if name not in statuses:
+                    message = "Student not found"
+                elif statuses[name] == target:
+                    result, message = 'skipped', f"Already {target}"
+                else:
+                    statuses[name] = target
+                    status_changes.append((target, action == 'reactivate', now, name))
+                    result, message = 'ok', "Dropped" if action == 'drop' else "Reactivated"
+            elif action == 'link':
+                if name not in statuses:
+                    message = "Student not found"
+                elif not card_uid:
+                    message = "Missing card_uid"
+                elif cards.get(card_uid) == name:
+                    result, message = 'skipped', "Card already linked"
+                elif card_uid in cards:
+                    message = f"Card already linked to {cards[card_uid]}"
+                else:
+                    links.append((card_uid, name))
+                    cards[card_uid] = name
+                    result, message = 'ok', f"Linked card {card_uid}"
+            else:
+                message = f"Unknown action '{action}'"
+
+            results.append({'line': line_number, 'action': action, 'name': name,
+                            'result': result, 'message': message})
+
+        cursor.executemany(
+            "INSERT INTO students (name, image_path, status, last_updated) VALUES (?, ?, ?, ?)",
+            enrollments
+        )
+        # Reactivation also clears the absent count, like reactivate_student()
+        cursor.executemany("""
+            UPDATE students
+            SET status = ?,
+                absent_count = CASE WHEN ? THEN 0 ELSE absent_count END,
+                last_updated = ?
+            WHERE name = ?
+        """, status_changes)
+        cursor.executemany(
+            "INSERT INTO rfid_cards (card_uid, student_name) VALUES (?, ?)",
+            links
+        )
+        conn.commit()
+
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Database error, no roster changes were applied: {e}")
+        return None
+    finally:
+        conn.close()
+
+    if report_file:
+        with open(report_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['line', 'action', 'name', 'result', 'message'])
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        from tabulate import tabulate
+        problems = [r for r in results if r['result'] != 'ok']
+        if problems:
+            print("\n" + tabulate([list(r.values()) for r in problems],
+                                  headers=["Line", "Action", "Name", "Result", "Message"], tablefmt="grid"))
+
+    elapsed = (datetime.now() - started).total_seconds()
+    counts = {outcome: sum(1 for r in results if r['result'] == outcome) for outcome in ('ok', 'skipped', 'error')}
+    print(f"\nProcessed {len(results)} roster rows in {elapsed:.2f}s: "
+          f"{counts['ok']} applied, {counts['skipped']} skipped, {counts['error']} errors")
+    if report_file:
+        print(f"Per-row results written to {report_file}")
+    return results
+
+def export_attendance(start_date=None, end_date=None, format='csv', incremental=False):
+    """Export attendance data to CSV, Excel or a month-partitioned Parquet dataset"""
+    if format.lower() == 'parquet':
+        return export_attendance_parquet(start_date, end_date, incremental=incremental)
+    
     conn = connect_db()
     if not conn:
         return
@@ -222,21 +469,10 @@ def export_attendance(start_date=None, end_date=None, format='csv'):
             start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
         
         # Query attendance data
-        query = """
-            SELECT 
-                a.student_name as Name, 
-                a.date as Date, 
-                a.time as Time, 
-                a.status as Status
-            FROM 
-                attendance a
-            WHERE 
-                a.date BETWEEN ? AND ?
-            ORDER BY 
-                a.date DESC, a.student_name
-        """
+        query = EXPORT_RANGE_SQL.format(source=attendance_source(conn, start_date, end_date))
         
         # Use pandas to handle the export
+        import pandas as pd
         df = pd.read_sql_query(query, conn, params=(start_date, end_date))
         
         if df.empty:
@@ -252,21 +488,539 @@ def export_attendance(start_date=None, end_date=None, format='csv'):
             export_file = f"{filename}.xlsx"
             df.to_excel(export_file, index=False)
         else:
-            print(f"Unsupported export format: {format}. Use 'csv' or 'excel'.")
+            print(f"Unsupported export format: {format}. Use 'csv', 'excel' or 'parquet'.")
             return
             
         print(f"Attendance data exported to {export_file}")
-        
+
     except Exception as e:
         print(f"Error exporting data: {e}")
     finally:
         conn.close()
 
+def export_attendance_parquet(start_date=None, end_date=None, incremental=False):
+    """
+    Export attendance data to a Parquet dataset partitioned by month.
+
+    Each month is written to its own file (parquet_dir/month=YYYY-MM/attendance.parquet)
+    with typed columns; status and method are dictionary encoded. The date range
+    is widened to whole months. In incremental mode only the newest existing
+    partition and the months after it are rewritten, so older partitions are
+    never re-read or re-written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("pyarrow not available. Install with 'pip install pyarrow'")
+        return
+
+    conn = connect_db()
+    if not conn:
+        return
+
+    try:
+        if not end_date:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+
+        existing_months = []
+        if os.path.isdir(parquet_dir):
+            existing_months = sorted(
+                entry[len('month='):] for entry in os.listdir(parquet_dir)
+                if entry.startswith('month=')
+                and os.path.exists(os.path.join(parquet_dir, entry, 'attendance.parquet'))
+            )
+
+        if incremental and not start_date:
+            # The newest partition may still be receiving rows, so start from it
+            start_date = f"{existing_months[-1]}-01" if existing_months else '0000-01-01'
+        elif not start_date:
+            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+
+        # Partitions always hold whole months, so widen the range to month boundaries
+        start_date = f"{start_date[:7]}-01"
+        end_date = f"{end_date[:7]}-31"
+
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT
+                s.id,
+                a.date,
+                CAST(strftime('%s', a.date || ' ' || a.time) AS INTEGER),
+                lower(a.status),
+                COALESCE(a.method, 'face')
+            FROM
+                {attendance_source(conn, start_date, end_date)} a
+            LEFT JOIN
+                students s ON s.name = a.student_name
+            WHERE
+                a.date BETWEEN ? AND ?
+            ORDER BY
+                a.date, a.time
+        """, (start_date, end_date))
+        rows = cursor.fetchall()
+
+        if not rows:
+            print(f"No attendance data found between {start_date} and {end_date}")
+            return
+
+        # Group rows by month so each partition is built in a single pass
+        months = {}
+        for row in rows:
+            months.setdefault(row[1][:7], []).append(row)
+
+        schema = pa.schema([
+            ('student_id', pa.int32()),
+            ('date', pa.date32()),
+            ('epoch_time', pa.int64()),
+            ('status', pa.dictionary(pa.int8(), pa.string())),
+            ('method', pa.dictionary(pa.int8(), pa.string())),
+        ])
+
+        written = 0
+        for month, month_rows in sorted(months.items()):
+            student_ids, dates, epochs, statuses, methods = zip(*month_rows)
+            table = pa.table([
+                pa.array(student_ids, type=pa.int32()),
+                pa.array([datetime.strptime(d, '%Y-%m-%d').date() for d in dates], type=pa.date32()),
+                pa.array(epochs, type=pa.int64()),
+                pa.array(statuses, type=pa.string()).dictionary_encode(),
+                pa.array(methods, type=pa.string()).dictionary_encode(),
+            ], schema=schema)
+
+            partition = os.path.join(parquet_dir, f"month={month}")
+            os.makedirs(partition, exist_ok=True)
+
+            # Write to a temporary file first so readers never see a partial partition
+            target = os.path.join(partition, 'attendance.parquet')
+            tmp_file = target + '.tmp'
+            pq.write_table(table, tmp_file, use_dictionary=['status', 'method'], compression='snappy')
+            os.replace(tmp_file, target)
+            written += 1
+
+        skipped = len([m for m in existing_months if m < min(months)]) if incremental else 0
+        print(f"Attendance data exported to {parquet_dir}/ "
+              f"({written} partitions written, {skipped} unchanged, {len(rows)} rows)")
+
+    except Exception as e:
+        print(f"Error exporting data: {e}")
+    finally:
+        conn.close()
+
+def _has_table(cursor, table_name):
+    """Check whether a table exists in the main database"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    return cursor.fetchone() is not None
+
+# SQLite attaches at most 10 databases to one connection (SQLITE_MAX_ATTACHED)
+MAX_ATTACHED = 10
+
+def attendance_source(conn, start_date, end_date):
+    """
+    Return a FROM-clause source covering attendance between start_date and end_date.
+
+    Archived terms that overlap the range are ATTACHed to the connection and
+    combined with the live table using UNION ALL. When no archive is needed the
+    plain attendance table is returned, so queries on the current term never
+    touch the archive files. Connections that outlive the query call
+    detach_archives() afterwards.
+    """
+    cursor = conn.cursor()
+    if not _has_table(cursor, 'archived_terms'):
+        return 'attendance'
+
+    cursor.execute("""
+        SELECT term, path
+        FROM archived_terms
+        WHERE start_date <= ? AND end_date >= ?
+        ORDER BY start_date
+    """, (end_date, start_date))
+    archives = cursor.fetchall()
+    if not archives:
+        return 'attendance'
+
+    cursor.execute("PRAGMA database_list")
+    attached = {row[1] for row in cursor.fetchall()} - {'main', 'temp'}
+
+    schemas = [('term_' + ''.join(c if c.isalnum() else '_' for c in term), archive_path)
+               for term, archive_path in archives]
+    others = attached - {schema for schema, _ in schemas}
+    if len(others) + len(schemas) > MAX_ATTACHED:
+        raise sqlite3.OperationalError(
+            f"{start_date} to {end_date} spans {len(schemas)} archived terms, but only "
+            f"{MAX_ATTACHED - len(others)} can be read at once; use a shorter range")
+
+    columns = ', '.join(ATTENDANCE_COLUMNS)
+    selects = [f"SELECT {columns} FROM main.attendance"]
+    for schema, archive_path in schemas:
+        if schema not in attached:
+            cursor.execute(f"ATTACH DATABASE ? AS {schema}", (archive_path,))
+        selects.append(f"SELECT {columns} FROM {schema}.attendance")
+
+    return "(" + " UNION ALL ".join(selects) + ")"
+
+def detach_archives(conn):
+    """DETACH the archived terms attendance_source() attached to conn"""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA database_list")
+    for schema in [row[1] for row in cursor.fetchall() if row[1].startswith('term_')]:
+        cursor.execute(f"DETACH DATABASE {schema}")
+
+def archive_term(term, start_date, end_date):
+    """
+    Move a closed term's attendance records into their own database file.
+
+    Rows dated between start_date and end_date are copied to
+    archive_dir/attendance_<term>.db, deleted from the live database and the
+    term is registered in archived_terms so reports can still reach it. The
+    live database is vacuumed afterwards to give the space back.
+    """
+    if end_date >= datetime.now().strftime('%Y-%m-%d'):
+        print(f"Term {term} is not closed yet (ends {end_date}). Only past terms can be archived.")
+        return False
+
+    conn = connect_db()
+    if not conn:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_terms (
+            term TEXT PRIMARY KEY,
+            start_date TEXT,
+            end_date TEXT,
+            path TEXT,
+            row_count INTEGER,
+            archived_at TEXT
+        )
+        ''')
+
+        cursor.execute("""
+            SELECT term FROM archived_terms
+            WHERE start_date <= ? AND end_date >= ? AND term != ?
+        """, (end_date, start_date, term))
+        overlapping = cursor.fetchone()
+        if overlapping:
+            print(f"Date range overlaps archived term {overlapping[0]}.")
+            return False
+
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(archive_dir, f"attendance_{term}.db")
+        columns = ', '.join(ATTENDANCE_COLUMNS)
+
+        cursor.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive.attendance (
+            id INTEGER PRIMARY KEY,
+            student_name TEXT,
+            date TEXT,
+            time TEXT,
+            status TEXT,
+            method TEXT DEFAULT 'face',
+            UNIQUE(student_name, date)
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS archive.idx_attendance_date ON attendance (date)")
+
+        change_log_seq = None
+        if _has_table(cursor, 'change_log'):
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+            change_log_seq = cursor.fetchone()[0]
+
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO archive.attendance ({columns})
+            SELECT {columns} FROM main.attendance WHERE date BETWEEN ? AND ?
+        """, (start_date, end_date))
+
+        # Rows already archived by an earlier run are ignored; any other clash would lose the live row
+        matches = ' AND '.join(f"a.{column} IS m.{column}" for column in ATTENDANCE_COLUMNS)
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM main.attendance m
+            WHERE m.date BETWEEN ? AND ?
+              AND NOT EXISTS (SELECT 1 FROM archive.attendance a WHERE {matches})
+        """, (start_date, end_date))
+        conflicting = cursor.fetchone()[0]
+        if conflicting:
+            conn.rollback()
+            print(f"{conflicting} attendance records clash with different records already in {archive_path}. "
+                  f"Nothing was archived.")
+            return False
+
+        cursor.execute("DELETE FROM main.attendance WHERE date BETWEEN ? AND ?", (start_date, end_date))
+        moved = cursor.rowcount
+
+        # Archiving does not change any record, so drop what the delete triggers logged
+        if change_log_seq is not None:
+            cursor.execute(
+                "DELETE FROM change_log WHERE seq > ? AND table_name = 'attendance' AND op = 'delete'",
+                (change_log_seq,)
+            )
+
+        cursor.execute("SELECT COUNT(*) FROM archive.attendance")
+        archived_rows = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO archived_terms (term, start_date, end_date, path, row_count, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(term) DO UPDATE SET
+                start_date = min(start_date, excluded.start_date),
+                end_date = max(end_date, excluded.end_date),
+                row_count = excluded.row_count,
+                archived_at = excluded.archived_at
+        """, (term, start_date, end_date, archive_path, archived_rows,
+              datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+        conn.commit()
+        cursor.execute("DETACH DATABASE archive")
+
+        # Compact the live database now that the term's rows are gone
+        cursor.execute("VACUUM")
+        print(f"Archived {moved} attendance records for term {term} to {archive_path}")
+        return True
+
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Database error: {e}")
+        return False
+    finally:
+        conn.close()
+
+def view_archived_terms():
+    """Display the archived terms and where their records live"""
+    conn = connect_db()
+    if not conn:
+        return
+
+    try:
+        cursor = conn.cursor()
+        if not _has_table(cursor, 'archived_terms'):
+            print("No terms have been archived.")
+            return
+
+        cursor.execute("""
+            SELECT term, start_date, end_date, row_count, path, archived_at
+            FROM archived_terms
+            ORDER BY start_date
+        """)
+        from tabulate import tabulate
+        headers = ["Term", "Start", "End", "Records", "File", "Archived"]
+        print("\n" + tabulate(cursor.fetchall(), headers=headers, tablefmt="grid"))
+
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+    finally:
+        conn.close()
+
+def ensure_change_log(conn):
+    """
+    Create the change_log and export_watermarks tables and the triggers that
+    record every insert, update and delete on the attendance table, as well
+    as student enrollments and status changes.
+
+    The triggers live in the database itself, so changes made by any writer
+    (face_recognition_final.py, mark_absent.py, this utility) are captured.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        payload TEXT,
+        changed_at TEXT DEFAULT (datetime('now', 'localtime'))
+    )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_change_log_table_seq ON change_log (table_name, seq)"
+    )
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS export_watermarks (
+        consumer TEXT PRIMARY KEY,
+        last_seq INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    )
+    ''')
+
+    # Row images are stored with each change so deleted rows can still be emitted
+    for op, trigger_event, row in (('insert', 'INSERT', 'NEW'),
+                                   ('update', 'UPDATE', 'NEW'),
+                                   ('delete', 'DELETE', 'OLD')):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS attendance_change_{op}
+        AFTER {trigger_event} ON attendance
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, op, payload)
+            VALUES ('attendance', {row}.id, '{op}', json_object(
+                'id', {row}.id,
+                'student_name', {row}.student_name,
+                'date', {row}.date,
+                'time', {row}.time,
+                'status', {row}.status,
+                'method', {row}.method
+            ));
+        END
+        ''')
+
+    # Enrollment and status changes (dropped/reactivated) are logged for replication
+    for op, trigger_event in (('insert', 'INSERT'),
+                              ('update', 'UPDATE OF status')):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_change_{op}
+        AFTER {trigger_event} ON students
+        {"WHEN OLD.status IS NOT NEW.status" if op == 'update' else ""}
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, op, payload)
+            VALUES ('students', NEW.id, '{op}', json_object(
+                'name', NEW.name,
+                'status', NEW.status,
+                'last_updated', NEW.last_updated
+            ));
+        END
+        ''')
+    conn.commit()
+
+def export_attendance_changes(consumer='registrar', format='ndjson', output=None):
+    """
+    Export attendance rows inserted, updated or deleted since the consumer's last run.
+
+    The highest change_log sequence number emitted is stored per consumer in
+    export_watermarks, so each run only reads the tail of the change log. The
+    first run for a consumer emits a snapshot of the whole attendance table.
+    Only the latest change per row is emitted. Use output='-' for stdout.
+    """
+    if format.lower() not in ('ndjson', 'csv'):
+        print(f"Unsupported change feed format: {format}. Use 'ndjson' or 'csv'.")
+        return
+
+    conn = connect_db()
+    if not conn:
+        return
+
+    try:
+        ensure_change_log(conn)
+        cursor = conn.cursor()
+
+        columns = ['id', 'student_name', 'date', 'time', 'status', 'method']
+
+        cursor.execute("SELECT last_seq FROM export_watermarks WHERE consumer = ?", (consumer,))
+        watermark = cursor.fetchone()
+
+        # Read the log tail and the new high-water mark in one read transaction
+        cursor.execute("BEGIN")
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+        high_water = cursor.fetchone()[0]
+
+        records = []
+        if watermark is None:
+            cursor.execute(f"SELECT {', '.join(columns)} FROM attendance ORDER BY id")
+            for row in cursor.fetchall():
+                record = {'seq': high_water, 'op': 'snapshot', 'changed_at': None}
+                record.update(zip(columns, row))
+                records.append(record)
+            last_seq = 0
+        else:
+            last_seq = watermark[0]
+            cursor.execute("""
+                SELECT seq, op, changed_at, payload
+                FROM change_log
+                WHERE seq IN (
+                    SELECT MAX(seq)
+                    FROM change_log
+                    WHERE table_name = 'attendance' AND seq > ? AND seq <= ?
+                    GROUP BY row_id
+                )
+                ORDER BY seq
+            """, (last_seq, high_water))
+            for seq, op, changed_at, payload in cursor.fetchall():
+                record = {'seq': seq, 'op': op, 'changed_at': changed_at}
+                record.update(json.loads(payload))
+                records.append(record)
+        conn.commit()
+
+        if not records:
+            print(f"No attendance changes for {consumer} since seq {last_seq}")
+        else:
+            if output is None:
+                extension = 'csv' if format.lower() == 'csv' else 'ndjson'
+                if watermark is None:
+                    output = f"attendance_changes_{consumer}_snapshot_{high_water}.{extension}"
+                else:
+                    output = f"attendance_changes_{consumer}_{last_seq + 1}_to_{high_water}.{extension}"
+
+            out = sys.stdout if output == '-' else open(output, 'w', newline='')
+            try:
+                if format.lower() == 'csv':
+                    writer = csv.DictWriter(out, fieldnames=['seq', 'op', 'changed_at'] + columns)
+                    writer.writeheader()
+                    writer.writerows(records)
+                else:
+                    for record in records:
+                        out.write(json.dumps(record) + '\n')
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+
+            if output != '-':
+                print(f"Exported {len(records)} attendance changes for {consumer} to {output}")
+
+        # Advance the watermark only after the feed was written successfully
+        cursor.execute("""
+            INSERT INTO export_watermarks (consumer, last_seq, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(consumer) DO UPDATE SET last_seq = excluded.last_seq, updated_at = excluded.updated_at
+        """, (consumer, high_water, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        conn.commit()
+
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error exporting attendance changes: {e}")
+    finally:
+        conn.close()
+
+def prune_change_log():
+    """
+    Delete the change_log entries every consumer has already read.
+
+    Entries up to the lowest last_seq in export_watermarks (the change feed
+    consumers and replication) are removed; the newest entry is always kept
+    so sequence numbers carry on from it. A consumer without a watermark
+    starts from a snapshot, and the dashboard rebuilds every page when
+    entries after its last build are gone. Returns the number deleted.
+    """
+    conn = connect_db()
+    if not conn:
+        return None
+
+    try:
+        ensure_change_log(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT consumer, last_seq FROM export_watermarks ORDER BY last_seq LIMIT 1")
+        lowest = cursor.fetchone()
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+        high_water = cursor.fetchone()[0]
+
+        cutoff = high_water - 1 if lowest is None else min(lowest[1], high_water - 1)
+        cursor.execute("DELETE FROM change_log WHERE seq <= ?", (cutoff,))
+        deleted = cursor.rowcount
+        conn.commit()
+
+        held = f" (held back by {lowest[0]} at seq {lowest[1]})" if lowest and lowest[1] < high_water - 1 else ""
+        print(f"Pruned {deleted} change log entries up to seq {max(cutoff, 0)}{held}")
+        return deleted
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Database error: {e}")
+        return None
+    finally:
+        conn.close()
+
 def generate_attendance_report(date=None):
     """Generate attendance report with visualization"""
     try:
         import matplotlib
         matplotlib.use('Agg')  # Non-interactive backend
+        import matplotlib.pyplot as plt
+        import pandas as pd
     except:
         print("Matplotlib not available. Install with 'pip install matplotlib'")
         return
@@ -280,12 +1034,12 @@ def generate_attendance_report(date=None):
             date = datetime.now().strftime('%Y-%m-%d')
             
         # Read attendance data
-        query = """
+        query = f"""
             SELECT 
                 a.status, 
                 COUNT(*) as count
             FROM 
-                attendance a
+                {attendance_source(conn, date, date)} a
             WHERE 
                 a.date = ?
             GROUP BY 
@@ -315,28 +1069,215 @@ def generate_attendance_report(date=None):
     finally:
         conn.close()
 
+# Figure reused by every chart a report worker renders
+_report_figure = None
+
+def _draw_attendance_pie(figure, date, statuses, counts):
+    """Draw the same pie chart as generate_attendance_report onto an existing figure"""
+    figure.clf()
+    axes = figure.add_subplot(1, 1, 1)
+    axes.pie(counts, labels=statuses, autopct='%1.1f%%', colors=['green', 'yellow', 'red'])
+    axes.set_title(f'Attendance Report for {date}')
+
+def _init_report_worker():
+    """Set up matplotlib once per worker process and create the reusable figure"""
+    global _report_figure
+    import matplotlib
+    matplotlib.use('Agg')  # Non-interactive backend
+    from matplotlib.figure import Figure
+    _report_figure = Figure(figsize=(8, 6))
+
+def _render_report(job):
+    """Render one day's pie chart to attendance_report_<date>.png"""
+    date, statuses, counts = job
+    if _report_figure is None:
+        _init_report_worker()
+    _draw_attendance_pie(_report_figure, date, statuses, counts)
+    report_file = f"attendance_report_{date}.png"
+    _report_figure.savefig(report_file)
+    return report_file
+
+def generate_attendance_reports(start_date, end_date, jobs=None, combined=None):
+    """
+    Generate attendance report charts for every date in a range.
+
+    All counts are read with a single grouped query. The charts are rendered
+    by a pool of worker processes, each reusing one figure, and can optionally
+    be collected into one multi-page PDF or an HTML summary page.
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')  # Non-interactive backend
+    except ImportError:
+        print("Matplotlib not available. Install with 'pip install matplotlib'")
+        return
+
+    conn = connect_db()
+    if not conn:
+        return
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT
+                a.date,
+                a.status,
+                COUNT(*)
+            FROM
+                {attendance_source(conn, start_date, end_date)} a
+            WHERE
+                a.date BETWEEN ? AND ?
+            GROUP BY
+                a.date, a.status
+            ORDER BY
+                a.date
+        """, (start_date, end_date))
+        rows = cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return
+    finally:
+        conn.close()
+
+    if not rows:
+        print(f"No attendance data found between {start_date} and {end_date}")
+        return
+
+    by_date = {}
+    for date, status, count in rows:
+        statuses, counts = by_date.setdefault(date, ([], []))
+        statuses.append(status)
+        counts.append(count)
+    report_jobs = [(date, statuses, counts) for date, (statuses, counts) in by_date.items()]
+
+    try:
+        started = datetime.now()
+        if jobs == 1 or len(report_jobs) == 1:
+            report_files = [_render_report(job) for job in report_jobs]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            workers = jobs or min(len(report_jobs), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_report_worker) as pool:
+                chunksize = max(1, len(report_jobs) // (workers * 4))
+                report_files = list(pool.map(_render_report, report_jobs, chunksize=chunksize))
+        elapsed = (datetime.now() - started).total_seconds()
+
+        print(f"Generated {len(report_files)} attendance reports in {elapsed:.2f}s "
+              f"({len(report_files) / max(elapsed, 1e-6):.1f} charts/s)")
+
+        summary_base = f"attendance_reports_{start_date}_to_{end_date}"
+        if combined == 'pdf':
+            from matplotlib.backends.backend_pdf import PdfPages
+            from matplotlib.figure import Figure
+            figure = Figure(figsize=(8, 6))
+            summary_file = f"{summary_base}.pdf"
+            with PdfPages(summary_file) as pdf:
+                for date, statuses, counts in report_jobs:
+                    _draw_attendance_pie(figure, date, statuses, counts)
+                    pdf.savefig(figure)
+            print(f"Combined PDF report generated: {summary_file}")
+        elif combined == 'html':
+            import html
+            summary_file = f"{summary_base}.html"
+            with open(summary_file, 'w', encoding='utf-8') as f:
+                f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+                        f"<title>Attendance {start_date} to {end_date}</title></head><body>\n")
+                f.write(f"<h1>Attendance Reports {start_date} to {end_date}</h1>\n")
+                for (date, statuses, counts), report_file in zip(report_jobs, report_files):
+                    summary = ', '.join(f"{html.escape(str(s))}: {c}" for s, c in zip(statuses, counts))
+                    f.write(f"<h2>{date}</h2>\n<p>{summary}</p>\n"
+                            f"<img src=\"{html.escape(report_file)}\" alt=\"Attendance report for {date}\">\n")
+                f.write("</body></html>\n")
+            print(f"HTML summary generated: {summary_file}")
+
+    except Exception as e:
+        print(f"Error generating reports: {e}")
+
+def build_parser():
+    """Build the command line parser with one subcommand per utility"""
+    parser = argparse.ArgumentParser(
+        prog='db_utils.py',
+        description="Attendance Database Utility"
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+
+    command = subparsers.add_parser('students', help="View all students and their status")
+    command.set_defaults(func=lambda args: view_students())
+
+    command = subparsers.add_parser('attendance', help="View attendance for a date (YYYY-MM-DD) or today")
+    command.add_argument('date', nargs='?')
+    command.set_defaults(func=lambda args: view_attendance(args.date))
+
+    command = subparsers.add_parser('reset', help="Reset absent count for a student or all students")
+    command.add_argument('student', nargs='?')
+    command.set_defaults(func=lambda args: reset_absent_count(args.student))
+
+    command = subparsers.add_parser('reset_today', help="Reset all attendance records for today")
+    command.set_defaults(func=lambda args: reset_today_attendance())
+
+    command = subparsers.add_parser('drop', help="Mark a student as dropped")
+    command.add_argument('name')
+    command.set_defaults(func=lambda args: mark_student_dropped(args.name))
+
+    command = subparsers.add_parser('reactivate', help="Reactivate a dropped student")
+    command.add_argument('name')
+    command.set_defaults(func=lambda args: reactivate_student(args.name))
+
+    command = subparsers.add_parser('bulk', help="Apply enroll/drop/reactivate/link changes from a CSV in one transaction")
+    command.add_argument('file', nargs='?', default='-', help="CSV file with a name column, or '-' for stdin")
+    command.add_argument('--action', choices=['enroll', 'drop', 'reactivate', 'link'],
+                         help="Action for rows without an action column")
+    command.add_argument('--report', help="Write the per-row results to this CSV file")
+    command.set_defaults(func=lambda args: bulk_roster(args.file, args.action, args.report))
+
+    command = subparsers.add_parser('export', help="Export attendance between dates (default: last 30 days)")
+    command.add_argument('start', nargs='?')
+    command.add_argument('end', nargs='?')
+    command.add_argument('format', nargs='?', default='csv', choices=['csv', 'excel', 'parquet'])
+    command.set_defaults(func=lambda args: export_attendance(args.start, args.end, args.format))
+
+    command = subparsers.add_parser('export_parquet',
+                                    help="Incrementally update the Parquet dataset in attendance_parquet/")
+    command.set_defaults(func=lambda args: export_attendance(format='parquet', incremental=True))
+
+    command = subparsers.add_parser('changes', help="Export attendance changes since the consumer's last run")
+    command.add_argument('consumer', nargs='?', default='registrar')
+    command.add_argument('format', nargs='?', default='ndjson', choices=['ndjson', 'csv'])
+    command.add_argument('output', nargs='?', help="Output file, or '-' for stdout")
+    command.set_defaults(func=lambda args: export_attendance_changes(args.consumer, args.format, args.output))
+
+    command = subparsers.add_parser('prune_changes',
+                                    help="Delete change log entries that every consumer has already read")
+    command.set_defaults(func=lambda args: prune_change_log())
+
+    command = subparsers.add_parser('report', help="Generate attendance report for a date (or today)")
+    command.add_argument('date', nargs='?')
+    command.set_defaults(func=lambda args: generate_attendance_report(args.date))
+
+    command = subparsers.add_parser('reports', help="Generate report charts for every date in a range")
+    command.add_argument('start')
+    command.add_argument('end')
+    command.add_argument('--jobs', type=int, help="Number of rendering processes (default: one per CPU)")
+    command.add_argument('--combined', choices=['pdf', 'html'], help="Also produce one combined PDF or HTML summary")
+    command.set_defaults(func=lambda args: generate_attendance_reports(args.start, args.end, args.jobs, args.combined))
+
+    command = subparsers.add_parser('archive', help="Move a closed term's records into archives/attendance_<term>.db")
+    command.add_argument('term')
+    command.add_argument('start')
+    command.add_argument('end')
+    command.set_defaults(func=lambda args: archive_term(args.term, args.start, args.end))
+
+    command = subparsers.add_parser('terms', help="List archived terms")
+    command.set_defaults(func=lambda args: view_archived_terms())
+
+    command = subparsers.add_parser('help', help="Display this help message")
+    command.set_defaults(func=lambda args: show_help())
+
+    return parser
+
 def show_help():
     """Display help message"""
-    help_text = """
-    Attendance Database Utility
-
-    Usage: python db_utils.py [command] [options]
-
-    Commands:
-      students            - View all students and their status
-      attendance [date]   - View attendance for a specific date (YYYY-MM-DD format)
-                           or today if no date specified
-      reset [student]     - Reset absent count for a student or all students
-      reset_today         - Reset all attendance records for today
-      drop [name]        - Mark a student as dropped
-      reactivate [name]   - Reactivate a dropped student
-      export [start] [end] [format] 
-                         - Export attendance data between dates (default: last 30 days)
-                           Format can be 'csv' or 'excel'
-      report [date]      - Generate attendance report for date (or today)
-      help               - Display this help message
-    """
-    print(help_text)
+    build_parser().print_help()
 
 def reset_today_attendance():
     """Reset all attendance records for today"""
@@ -364,47 +1305,10 @@ def reset_today_attendance():
             conn.close()
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
+    args = build_parser().parse_args()
+
+    if not args.command:
         show_help()
         sys.exit(1)
-        
-    command = sys.argv[1].lower()
-    
-    if command == "students":
-        view_students()
-    elif command == "attendance":
-        if len(sys.argv) > 2:
-            view_attendance(sys.argv[2])
-        else:
-            view_attendance()
-    elif command == "reset":
-        if len(sys.argv) > 2:
-            reset_absent_count(sys.argv[2])
-        else:
-            reset_absent_count()
-    elif command == "reset_today":
-        reset_today_attendance()
-    elif command == "drop":
-        if len(sys.argv) > 2:
-            mark_student_dropped(sys.argv[2])
-        else:
-            print("Error: Please provide a student name")
-    elif command == "reactivate":
-        if len(sys.argv) > 2:
-            reactivate_student(sys.argv[2])
-        else:
-            print("Error: Please provide a student name")
-    elif command == "export":
-        if len(sys.argv) > 3:
-            export_attendance(sys.argv[2], sys.argv[3])
-        else:
-            export_attendance()
-    elif command == "report":
-        if len(sys.argv) > 2:
-            generate_attendance_report(sys.argv[2])
-        else:
-            generate_attendance_report()
-    else:
-        show_help() 
\ No newline at end of file
+
+    args.func(args)
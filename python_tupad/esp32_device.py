@@ -0,0 +1,336 @@
+import time
+import threading
+from collections import deque
+
+import requests
+
+from metrics import FEEDBACK_SKIPPED, FEEDBACK_QUEUE, DEVICE_REQUESTS, DEVICE_FAILURES
+from structured_logging import get_logger
+
+log = get_logger('device')
+
+# An identical buzzer command within this many seconds is sent only once
+DEDUP_WINDOW = 1.0
+
+# Minimum seconds between two OLED updates; the newest state is sent when the interval is over
+OLED_MIN_INTERVAL = 0.3
+
+# Buzzer commands waiting to be sent; more are dropped rather than queued
+QUEUE_SIZE = 32
+
+# Seconds to wait for the ESP32-CAM to answer a feedback request
+REQUEST_TIMEOUT = 2.0
+
+# Action types understood by the batched /command endpoint
+COMMAND_ACTIONS = ('oled', 'buzzer', 'control')
+
+class OledCoalescer:
+    """
+    Remember what the OLED shows so only real changes are sent.
+
+    The rendered state is the list of text lines together with the clear
+    flag; an update that would draw the same lines the same way again is
+    redundant, but a clear after lines were shown is not. Updates are also
+    spaced at least min_interval apart.
+    """
+
+    def __init__(self, min_interval=OLED_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self.shown = None
+        self.last_sent = float('-inf')
+        self.sent = 0
+        self.unchanged = 0
+        self.superseded = 0
+
+    @staticmethod
+    def render(payload):
+        return bool(payload.get('clear')), tuple(str(line) for line in payload.get('lines', []))
+
+    def is_shown(self, payload):
+        return self.render(payload) == self.shown
+
+    def due_in(self, now):
+        """Seconds until the next update may be sent"""
+        return max(0.0, self.last_sent + self.min_interval - now)
+
+    def mark_sent(self, payload, now, ok=True):
+        # After a failed update the display state is unknown, so the next one is always sent
+        self.shown = self.render(payload) if ok else None
+        self.last_sent = now
+        self.sent += 1
+
+    def invalidate(self):
+        """Forget the display state, e.g. after the device was reconnected"""
+        self.shown = None
+
+    def stats(self):
+        return {'sent': self.sent, 'unchanged': self.unchanged, 'superseded': self.superseded}
+
+class FeedbackDispatcher:
+    """
+    Send OLED and buzzer commands to the ESP32-CAM from a background thread.
+
+    oled() and buzzer() only queue the command and return immediately.
+    Buzzer commands are kept in order in a bounded queue and identical ones
+    within DEDUP_WINDOW are skipped. OLED updates go through an
+    OledCoalescer: only the newest pending payload is kept, it is dropped
+    if the display already shows those lines, and it waits for the minimum
+    refresh interval. send is called on the dispatcher thread with a list
+    of ('buzzer', status) / ('oled', payload) actions, buzzers first, and
+    may return one success flag per action.
+    """
+
+    def __init__(self, send, dedup_window=DEDUP_WINDOW, queue_size=QUEUE_SIZE, oled_interval=OLED_MIN_INTERVAL):
+        self.send = send
+        self.coalescer = OledCoalescer(oled_interval)
+        self.dedup_window = dedup_window
+        self.condition = threading.Condition()
+        self.buzzers = deque()
+        self.queue_size = queue_size
+        self.pending_oled = None
+        self.recent = {}
+        self.busy = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name='feedback', daemon=True)
+            self.thread.start()
+        return self
+
+    def _duplicate(self, key, now):
+        last = self.recent.get(key)
+        if last is not None and now - last < self.dedup_window:
+            return True
+        self.recent[key] = now
+        return False
+
+    def oled(self, payload):
+        with self.condition:
+            if self.pending_oled is not None:
+                self.coalescer.superseded += 1
+                FEEDBACK_SKIPPED.inc(kind='oled', reason='superseded')
+                self.pending_oled = None
+            if self.coalescer.is_shown(payload):
+                self.coalescer.unchanged += 1
+                FEEDBACK_SKIPPED.inc(kind='oled', reason='unchanged')
+                return False
+            self.pending_oled = payload
+            self.condition.notify()
+        return True
+
+    def invalidate_oled(self):
+        with self.condition:
+            self.coalescer.invalidate()
+
+    def buzzer(self, status):
+        with self.condition:
+            if self._duplicate(('buzzer', status), time.monotonic()):
+                FEEDBACK_SKIPPED.inc(kind='buzzer', reason='duplicate')
+                return False
+            if len(self.buzzers) >= self.queue_size:
+                FEEDBACK_SKIPPED.inc(kind='buzzer', reason='queue_full')
+                return False
+            self.buzzers.append(status)
+            FEEDBACK_QUEUE.set(len(self.buzzers))
+            self.condition.notify()
+        return True
+
+    def _take(self, include_oled):
+        actions = [('buzzer', status) for status in self.buzzers]
+        self.buzzers.clear()
+        if include_oled and self.pending_oled is not None:
+            actions.append(('oled', self.pending_oled))
+            self.pending_oled = None
+        FEEDBACK_QUEUE.set(0)
+        return actions
+
+    def _wait_for_work(self):
+        """Block until buzzers are queued or a pending OLED update is due; None when stopped"""
+        while True:
+            if not self.running and not self.buzzers and self.pending_oled is None:
+                return None
+            wait = None
+            oled_due = False
+            if self.pending_oled is not None:
+                wait = self.coalescer.due_in(time.monotonic())
+                oled_due = wait == 0 or not self.running
+            if self.buzzers or oled_due:
+                return self._take(oled_due)
+            self.condition.wait(wait)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                actions = self._wait_for_work()
+                if actions is None:
+                    return
+                self.busy = True
+                if len(self.recent) > 256:
+                    cutoff = time.monotonic() - self.dedup_window
+                    self.recent = {k: t for k, t in self.recent.items() if t >= cutoff}
+            results = None
+            try:
+                results = self.send(actions)
+            except Exception as e:
+                log.error("Device feedback failed: %s", e)
+                # Treated as failed for every OLED action, so the next update is not skipped as unchanged
+                results = False
+            finally:
+                with self.condition:
+                    for index, (kind, payload) in enumerate(actions):
+                        if kind == 'oled':
+                            ok = results[index] if isinstance(results, (list, tuple)) else results is not False
+                            self.coalescer.mark_sent(payload, time.monotonic(), bool(ok))
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been sent; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.busy or self.buzzers or self.pending_oled is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.thread is None:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """Send what is still queued, then end the thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        stats = self.coalescer.stats()
+        print(f"OLED updates: {stats['sent']} sent, {stats['unchanged']} unchanged and "
+              f"{stats['superseded']} superseded updates suppressed")
+
+class DeviceClient:
+    """
+    HTTP client for the ESP32-CAM's OLED, buzzer and camera control endpoints.
+
+    send() takes a list of ('oled', payload), ('buzzer', status) and
+    ('control', {'var': ..., 'val': ...}) actions and returns one success
+    flag per action. Firmware that advertises GET /command gets the whole
+    list in a single POST /command; older firmware gets one request per
+    action on /oled and /buzzer. The firmware changes camera settings only
+    through /command, so control actions fail on older firmware.
+    """
+
+    def __init__(self, address, timeout=REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.set_address(address)
+
+    def set_address(self, address):
+        """Point the client at another device; its endpoints are probed again"""
+        self.base_url = f"http://{address}"
+        self.batched = None
+
+    def supports_command(self):
+        """True if the firmware answers GET /command; remembered until the address changes"""
+        if self.batched is None:
+            try:
+                response = self.session.get(f"{self.base_url}/command", timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                # Unreachable right now, so ask again next time
+                return False
+            try:
+                self.batched = response.status_code == 200 and 'oled' in response.json().get('actions', [])
+            except ValueError:
+                self.batched = False
+            log.info("ESP32-CAM %s the batched /command endpoint",
+                     "supports" if self.batched else "does not support")
+        return self.batched
+
+    def send(self, actions):
+        if not actions:
+            return []
+        if self.supports_command():
+            results = self.command(actions)
+            if results is not None:
+                return results
+        return [self.send_one(kind, value) for kind, value in actions]
+
+    def command(self, actions):
+        """POST all actions to /command; None if the endpoint is missing and the caller should fall back"""
+        body = {'actions': [command_action(kind, value) for kind, value in actions]}
+        response = self._request('command', 'post', '/command', json=body)
+        if response is None:
+            return [False] * len(actions)
+        if response.status_code == 404:
+            # Firmware was replaced by one without /command
+            self.batched = False
+            return None
+        if response.status_code != 200:
+            return [False] * len(actions)
+        try:
+            results = [bool(result.get('ok')) for result in response.json()['results']]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return [True] * len(actions)
+        for (kind, _), ok in zip(actions, results):
+            if not ok:
+                DEVICE_FAILURES.inc(endpoint=kind, reason='rejected')
+        return results + [False] * (len(actions) - len(results))
+
+    def send_one(self, kind, value):
+        if kind == 'oled':
+            return self.oled(value)
+        if kind == 'buzzer':
+            return self.buzzer(value)
+        if kind == 'control':
+            # No other endpoint changes camera settings
+            return False
+        raise ValueError(f"Unknown device action {kind!r}")
+
+    def oled(self, payload):
+        return self._ok(self._request('oled', 'post', '/oled', json=payload))
+
+    def buzzer(self, status):
+        log.debug("Sending buzzer '%s' to %s", status, self.base_url)
+        return self._ok(self._request('buzzer', 'post', '/buzzer', json={'status': status}))
+
+    def control(self, var, val):
+        """Change a camera setting such as 'quality' through the /command control action"""
+        return self.send([('control', {'var': var, 'val': val})])[0]
+
+    def _request(self, endpoint, method, path, **kwargs):
+        """Make one request with metrics and logging; None if it failed to complete"""
+        try:
+            with DEVICE_REQUESTS.time(endpoint=endpoint):
+                response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.exceptions.ConnectionError:
+            DEVICE_FAILURES.inc(endpoint=endpoint, reason='connection')
+            log.warning("Could not connect to ESP32-CAM %s endpoint at %s", endpoint, self.base_url + path)
+            return None
+        except requests.exceptions.Timeout:
+            DEVICE_FAILURES.inc(endpoint=endpoint, reason='timeout')
+            log.warning("ESP32-CAM %s request timed out", endpoint)
+            return None
+        except Exception as e:
+            DEVICE_FAILURES.inc(endpoint=endpoint, reason='error')
+            log.error("Error sending %s request to ESP32-CAM: %s", endpoint, e)
+            return None
+        if response.status_code != 200 and not (endpoint == 'command' and response.status_code == 404):
+            DEVICE_FAILURES.inc(endpoint=endpoint, reason=f"http_{response.status_code}")
+            log.warning("ESP32-CAM %s request failed: HTTP %s %s", endpoint, response.status_code, response.text[:80])
+        return response
+
+    @staticmethod
+    def _ok(response):
+        return response is not None and response.status_code == 200
+
+def command_action(kind, value):
+    """One ('oled' | 'buzzer' | 'control', value) action as a /command JSON object"""
+    if kind == 'oled':
+        return {'type': 'oled', 'clear': bool(value.get('clear')), 'lines': list(value.get('lines', []))}
+    if kind == 'buzzer':
+        return {'type': 'buzzer', 'status': value}
+    if kind == 'control':
+        return {'type': 'control', 'var': value['var'], 'val': int(value['val'])}
+    raise ValueError(f"Unknown device action {kind!r}")
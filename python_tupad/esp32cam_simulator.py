@@ -0,0 +1,639 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Defaults for a simulated device
+HOST = '127.0.0.1'
+PORT = 8081
+FRAMES_DIR = 'image_folder'
+STREAM_FPS = 10
+MAX_VIDEO_FRAMES = 300
+
+# Same multipart boundary as the firmware's stream handler
+PART_BOUNDARY = "123456789000000000000987654321"
+
+# How long a simulated RFID read waits for a card, like the firmware's 5 second scan window
+RFID_SCAN_SECONDS = 5
+
+# Taps the firmware keeps for GET /rfid/taps (TAP_QUEUE_SIZE in the sketch)
+TAP_QUEUE_SIZE = 8
+
+# Actions accepted by POST /command, as advertised by GET /command
+COMMAND_ACTIONS = ('oled', 'buzzer', 'control')
+BUZZER_STATUSES = ('present', 'late', 'absent', 'test')
+
+# Sizes accepted by /capture?size=WxH, as in the firmware's captureSizes table
+CAPTURE_SIZES = ('160x120', '320x240', '400x296', '640x480', '800x600', '1024x768', '1280x1024', '1600x1200')
+
+# Card slots in the firmware's EEPROM list (MAX_CARDS) and the longest name it keeps
+MAX_CARDS = 10
+CARD_NAME_LENGTH = 31
+
+def load_frames(frames_dir=None, video=None, max_frames=MAX_VIDEO_FRAMES, recording=None):
+    """Return a list of JPEG-encoded frames from a folder of images, a recorded video or a frame recording"""
+    frames = []
+    if recording:
+        from frame_recorder import read_frames
+        return [jpeg for _, jpeg in read_frames(recording)]
+
+    if video:
+        import cv2
+        capture = cv2.VideoCapture(video)
+        while len(frames) < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            ok, jpeg = cv2.imencode('.jpg', frame)
+            if ok:
+                frames.append(jpeg.tobytes())
+        capture.release()
+        return frames
+
+    for filename in sorted(os.listdir(frames_dir)):
+        file_path = os.path.join(frames_dir, filename)
+        if filename.lower().endswith(('.jpg', '.jpeg')):
+            with open(file_path, 'rb') as f:
+                frames.append(f.read())
+        elif filename.lower().endswith(('.png', '.jfif', '.bmp')):
+            # Non-JPEG images need OpenCV to re-encode them
+            import cv2
+            image = cv2.imread(file_path)
+            if image is not None:
+                frames.append(cv2.imencode('.jpg', image)[1].tobytes())
+    return frames
+
+def parse_uid(text):
+    """'DE:AD:BE:EF' -> [222, 173, 190, 239]"""
+    return [int(part, 16) for part in text.replace(' ', ':').split(':') if part]
+
+def jpeg_quality(quality):
+    """OV2640 'quality' (0-63, lower is better) as an OpenCV JPEG quality: 10 -> 85, 12 -> 82, 30 -> 55"""
+    return max(5, 100 - quality * 3 // 2)
+
+class DeviceSimulator:
+    """
+    State and fault injection for one simulated ESP32-CAM.
+
+    latency and jitter are in seconds and are added to every request.
+    error_rate is the share of requests answered with HTTP 500 and drop_rate
+    the share whose connection is closed without a response. card_rate is
+    the chance that an RFID scan finds a card when none has been queued
+    through POST /sim/tap. Taps made while no scan is waiting are kept for
+    GET /rfid/taps, as the firmware reads cards on its own; tap_queue=False
+    simulates older firmware without that endpoint. batched=False simulates
+    older firmware without the /command endpoint. /capture?size=WxH switches the resolution like the
+    firmware (frames are resized with OpenCV), taking switch_delay seconds;
+    resized frames are encoded at the JPEG quality set by a /command control action.
+    bandwidth (kbit/s, 0 for unlimited) adds the time to send each captured
+    frame; it and latency can be changed while running with POST /sim/link.
+    """
+
+    def __init__(self, frames, name='esp32cam-sim', latency=0.0, jitter=0.0, error_rate=0.0,
+                 drop_rate=0.0, fps=STREAM_FPS, card_rate=0.0, cards=None, seed=None, verbose=False,
+                 batched=True, switch_delay=0.0, bandwidth=0.0, tap_queue=True):
+        if not frames:
+            raise ValueError("No frames to serve")
+        self.frames = frames
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.fps = fps
+        self.card_rate = card_rate
+        self.verbose = verbose
+        self.batched = batched
+        self.tap_queue = tap_queue
+        self.switch_delay = switch_delay
+        self.bandwidth = bandwidth
+        self.capture_size = None
+        self.sized_frames = {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.frame_index = 0
+        self.oled_lines = []
+        self.settings = {'framesize': 6, 'quality': 12, 'brightness': 0, 'contrast': 0, 'saturation': 0,
+                         'special_effect': 0, 'wb_mode': 0, 'awb': 1, 'awb_gain': 1, 'gainceiling': 0}
+        self.cards = [{'name': name, 'uid': uid, 'active': True} for name, uid in (cards or [])]
+        self.tapped = []
+        self.scanning = 0
+        self.taps = deque(maxlen=TAP_QUEUE_SIZE)
+        self.last_tap_seq = 0
+        self.stats = {}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def next_frame(self):
+        with self.lock:
+            frame = self.frames[self.frame_index % len(self.frames)]
+            self.frame_index += 1
+            return frame
+
+    def sized_frame(self, size=None):
+        """
+        Next frame at the requested size; the size stays selected for later
+        captures, like the sensor's. Switching to a larger size repeats the
+        last scene, as a detail frame taken right after a probe would.
+        """
+        zoom = False
+        if size in CAPTURE_SIZES and size != self.capture_size:
+            zoom = self.capture_size is not None and \
+                int(size.split('x')[0]) > int(self.capture_size.split('x')[0])
+            self.capture_size = size
+            if self.switch_delay:
+                time.sleep(self.switch_delay)
+        with self.lock:
+            if zoom and self.frame_index:
+                index = (self.frame_index - 1) % len(self.frames)
+            else:
+                index = self.frame_index % len(self.frames)
+                self.frame_index += 1
+            size = self.capture_size
+            quality = self.settings['quality']
+            frame = self.sized_frames.get((index, size, quality))
+        if frame is None:
+            frame = self.frames[index]
+            if size:
+                import cv2
+                import numpy as np
+                width, height = (int(part) for part in size.split('x'))
+                img = cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), cv2.IMREAD_COLOR)
+                # Crop to the sensor's aspect ratio first so faces are not stretched
+                rows, cols = img.shape[:2]
+                keep_rows, keep_cols = min(rows, cols * height // width), min(cols, rows * width // height)
+                top, left = (rows - keep_rows) // 2, (cols - keep_cols) // 2
+                img = img[top:top + keep_rows, left:left + keep_cols]
+                img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+                frame = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality(quality)])[1].tobytes()
+            with self.lock:
+                self.sized_frames[(index, size, quality)] = frame
+        return frame
+
+    def transfer(self, body):
+        """Sleep for the time the link takes to carry body"""
+        if self.bandwidth > 0:
+            time.sleep(len(body) * 8 / (self.bandwidth * 1000))
+
+    def delay(self):
+        """Sleep for latency +/- jitter"""
+        pause = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if pause > 0:
+            time.sleep(pause)
+
+    def fault(self):
+        """Return 'drop', 'error' or None for the next request"""
+        roll = self.rng.random()
+        if roll < self.drop_rate:
+            return 'drop'
+        if roll < self.drop_rate + self.error_rate:
+            return 'error'
+        return None
+
+    def show_oled(self, data):
+        """Apply an OLED payload; returns (HTTP status, message) like the firmware"""
+        if data.get('clear'):
+            self.oled_lines = []
+            return 200, "Display cleared"
+        lines = data.get('lines') or []
+        if not lines:
+            return 400, "No text lines provided"
+        self.oled_lines = [str(line) for line in lines[:6]]
+        if self.verbose:
+            print(f"[{self.name}] OLED: {' | '.join(self.oled_lines)}")
+        return 200, "Display updated"
+
+    def play_buzzer(self, status):
+        if status not in BUZZER_STATUSES:
+            return 400, "Unknown status"
+        if self.verbose:
+            print(f"[{self.name}] Buzzer: {status}")
+        return 200, "Buzzer sound played"
+
+    def apply_setting(self, var, val):
+        if var is None or val is None:
+            return 400, "Missing var or val"
+        try:
+            self.settings[var] = int(val)
+        except (TypeError, ValueError):
+            return 400, "Invalid value"
+        return 200, ""
+
+    def add_card(self, name, uid):
+        """Register a card like the firmware: reuse a removed card's slot, refuse duplicates and a full list"""
+        uid = list(uid[:4])
+        with self.lock:
+            if self.find_card(uid):
+                return 400, "Card already exists"
+            card = {'name': str(name)[:CARD_NAME_LENGTH], 'uid': uid, 'active': True}
+            for index, existing in enumerate(self.cards):
+                if not existing['active']:
+                    self.cards[index] = card
+                    return 200, "Card added successfully"
+            if len(self.cards) >= MAX_CARDS:
+                return 500, "Failed to add card"
+            self.cards.append(card)
+        return 200, "Card added successfully"
+
+    def remove_card(self, uid):
+        card = self.find_card(uid)
+        if not card:
+            return 404, "Card not found"
+        card['active'] = False
+        return 200, "Card deactivated"
+
+    def find_card(self, uid):
+        for card in self.cards:
+            if card['active'] and card['uid'][:4] == uid[:4]:
+                return card
+        return None
+
+    def tap(self, uid):
+        """A card held to the reader: read by a waiting scan, else kept for /rfid/taps"""
+        with self.lock:
+            if self.tap_queue and not self.scanning:
+                self.last_tap_seq += 1
+                self.taps.append((self.last_tap_seq, list(uid), time.monotonic()))
+            else:
+                self.tapped.append(list(uid))
+
+    def taps_after(self, after):
+        """Sequence number of the newest tap and the kept taps after after, as GET /rfid/taps reports them"""
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_tap_seq
+            if after > last:
+                after = 0
+            taps = [{'seq': seq, 'uid': uid, 'age_ms': int((now - read_at) * 1000)}
+                    for seq, uid, read_at in self.taps if seq > after]
+        return last, taps
+
+    def read_card(self):
+        """UID of a queued tap, a random card with probability card_rate, or None"""
+        with self.lock:
+            if self.tapped:
+                return self.tapped.pop(0)
+        if self.card_rate and self.rng.random() < self.card_rate:
+            active = [card for card in self.cards if card['active']]
+            if active and self.rng.random() < 0.9:
+                return list(self.rng.choice(active)['uid'])
+            return [self.rng.randrange(256) for _ in range(4)]
+        return None
+
+    def wait_for_card(self):
+        """Poll for a card like the firmware does, giving up after RFID_SCAN_SECONDS"""
+        deadline = time.monotonic() + RFID_SCAN_SECONDS
+        with self.lock:
+            self.scanning += 1
+        try:
+            while True:
+                uid = self.read_card()
+                if uid or time.monotonic() >= deadline:
+                    return uid
+                time.sleep(0.05)
+        finally:
+            with self.lock:
+                self.scanning -= 1
+
+class SimulatorRequestHandler(BaseHTTPRequestHandler):
+    device = None
+
+    def send_body(self, status, body, content_type='text/plain'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, status=200):
+        self.send_body(status, json.dumps(data), 'application/json')
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'null')
+        except ValueError:
+            return None
+
+    def handle_request(self, method):
+        device = self.device
+        parts = urlsplit(self.path)
+        route = (method, parts.path.rstrip('/') or '/')
+        device.count(f"{method} {route[1]}")
+
+        if route[1].startswith('/sim/'):
+            return self.simulator_route(route, parse_qs(parts.query))
+
+        device.delay()
+        fault = device.fault()
+        if fault == 'drop':
+            device.count('dropped')
+            self.close_connection = True
+            self.connection.close()
+            return
+        if fault == 'error':
+            device.count('errors')
+            return self.send_body(500, "500 Internal Server Error")
+
+        handler = {
+            ('GET', '/'): self.index,
+            ('GET', '/capture'): lambda: self.capture(parse_qs(parts.query).get('size', [None])[0]),
+            ('GET', '/stream'): self.stream,
+            ('GET', '/oled'): self.oled_test,
+            ('POST', '/oled'): self.oled,
+            ('POST', '/buzzer'): self.buzzer,
+            ('GET', '/command'): lambda: self.send_json({'version': 1, 'actions': list(COMMAND_ACTIONS)}),
+            ('POST', '/command'): self.run_command,
+            ('POST', '/rfid'): self.rfid,
+            ('GET', '/rfid/scan'): self.rfid_scan,
+            ('GET', '/rfid/taps'): lambda: self.rfid_taps(parse_qs(parts.query).get('after', ['0'])[0]),
+            ('GET', '/rfid/list'): self.rfid_list,
+            ('POST', '/rfid/attendance'): self.rfid_attendance,
+            ('GET', '/status'): lambda: self.send_json(device.settings),
+        }.get(route)
+        if route[1] == '/command' and not device.batched:
+            handler = None
+        if route[1] == '/rfid/taps' and not device.tap_queue:
+            handler = None
+        if handler is None:
+            return self.send_body(404, "Nothing matches the given URI")
+        handler()
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def index(self):
+        self.send_body(200, f"<html><body><h1>ESP32-CAM Simulator</h1><p>{self.device.name}</p></body></html>",
+                       'text/html')
+
+    def capture(self, size=None):
+        frame = self.device.sized_frame(size)
+        self.device.transfer(frame)
+        self.send_body(200, frame, 'image/jpeg')
+
+    def stream(self):
+        """MJPEG stream at the configured frame rate until the client disconnects"""
+        self.send_response(200)
+        self.send_header('Content-Type', f"multipart/x-mixed-replace;boundary={PART_BOUNDARY}")
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        interval = 1.0 / self.device.fps if self.device.fps > 0 else 0
+        try:
+            while True:
+                started = time.perf_counter()
+                frame = self.device.next_frame()
+                self.wfile.write(f"\r\n--{PART_BOUNDARY}\r\n".encode())
+                self.wfile.write(f"Content-Type: image/jpeg\r\nContent-Length: {len(frame)}\r\n\r\n".encode())
+                self.wfile.write(frame)
+                self.wfile.flush()
+                self.device.count('stream frames')
+                time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def oled_test(self):
+        self.device.oled_lines = ["Test Message", "GET Request", "Received"]
+        self.send_body(200, "OLED test message displayed")
+
+    def oled(self):
+        data = self.read_json()
+        if not isinstance(data, dict):
+            return self.send_body(400, "Invalid JSON format")
+        self.send_body(*self.device.show_oled(data))
+
+    def buzzer(self):
+        data = self.read_json()
+        if not isinstance(data, dict):
+            return self.send_body(400, "Invalid JSON format")
+        self.send_body(*self.device.play_buzzer(data.get('status')))
+
+    def run_command(self):
+        """Run an ordered list of OLED, buzzer and control actions; one result per action"""
+        data = self.read_json()
+        if not isinstance(data, dict) or not isinstance(data.get('actions'), list):
+            return self.send_body(400, "Invalid JSON format")
+        device = self.device
+        results = []
+        for action in data['actions']:
+            kind = action.get('type') if isinstance(action, dict) else None
+            if kind == 'oled':
+                status, message = device.show_oled(action)
+            elif kind == 'buzzer':
+                status, message = device.play_buzzer(action.get('status'))
+            elif kind == 'control':
+                status, message = device.apply_setting(action.get('var'), action.get('val'))
+            else:
+                status, message = 400, "Unknown action type"
+            device.count(f"command {kind}")
+            result = {'ok': status == 200}
+            if status != 200:
+                result['error'] = message
+            results.append(result)
+        self.send_json({'results': results})
+
+    def rfid(self):
+        data = self.read_json()
+        if not isinstance(data, dict):
+            return self.send_body(400, "Invalid JSON format")
+        action = data.get('action')
+        device = self.device
+        if not action:
+            return self.send_body(400, "No action specified")
+
+        if action == 'add':
+            if not data.get('name') or not data.get('uid'):
+                return self.send_body(400, "Missing name or UID")
+            return self.send_body(*device.add_card(data['name'], data['uid']))
+        if action == 'remove':
+            if not data.get('uid'):
+                return self.send_body(400, "Missing UID")
+            return self.send_body(*device.remove_card(data['uid']))
+        if action == 'batch':
+            return self.rfid_batch(data.get('changes') or [])
+        if action == 'list':
+            return self.rfid_list()
+        if action == 'scan':
+            uid = device.read_card()
+            if not uid:
+                return self.send_body(404, "No card present")
+            return self.send_json({'uid': uid})
+        self.send_body(400, "Unknown action")
+
+    def rfid_batch(self, changes):
+        """Several add/remove changes with one result each, like the firmware's batch action"""
+        device = self.device
+        results = []
+        for change in changes:
+            change = change if isinstance(change, dict) else {}
+            if not change.get('uid'):
+                status, message = 400, "Missing UID"
+            elif change.get('action') == 'add':
+                status, message = device.add_card(change.get('name'), change['uid']) if change.get('name') \
+                    else (400, "Missing name")
+                if status == 500:
+                    message = "No free slot"
+            elif change.get('action') == 'remove':
+                status, message = device.remove_card(change['uid'])
+            else:
+                status, message = 400, "Unknown action"
+            device.count(f"rfid batch {change.get('action')}")
+            result = {'ok': status == 200}
+            if status != 200:
+                result['error'] = message
+            results.append(result)
+        free = MAX_CARDS - sum(1 for card in device.cards if card['active'])
+        self.send_json({'results': results, 'free': free})
+
+    def rfid_scan(self):
+        uid = self.device.wait_for_card()
+        if not uid:
+            return self.send_json({'error': "No card present"})
+        card = self.device.find_card(uid)
+        response = {'uid': uid}
+        if card:
+            response.update(name=card['name'], known=True, status='registered')
+        else:
+            response.update(known=False, status='unknown')
+        self.send_json(response)
+
+    def rfid_taps(self, after):
+        try:
+            after = int(after)
+        except ValueError:
+            after = 0
+        last, taps = self.device.taps_after(after)
+        self.send_json({'last': last, 'reader': True, 'taps': taps})
+
+    def rfid_list(self):
+        cards = [{'name': card['name'], 'uid': card['uid'][:4]} for card in self.device.cards if card['active']]
+        self.send_json({'capacity': MAX_CARDS, 'cards': cards})
+
+    def rfid_attendance(self):
+        uid = self.device.wait_for_card()
+        if not uid:
+            return self.send_body(404, "No card present for attendance")
+        card = self.device.find_card(uid)
+        if not card:
+            return self.send_body(404, "Unknown card - cannot mark attendance")
+        self.device.oled_lines = ["RFID Attendance", card['name'], "Marked PRESENT"]
+        self.send_body(200, "Attendance marked successfully")
+
+    def simulator_route(self, route, params):
+        """Test hooks that are not part of the firmware"""
+        device = self.device
+        if route == ('POST', '/sim/tap'):
+            data = self.read_json() or {}
+            uid = data.get('uid') or []
+            if isinstance(uid, str):
+                uid = parse_uid(uid)
+            if not uid:
+                return self.send_body(400, "Missing UID")
+            device.tap(uid)
+            return self.send_body(200, "Card queued")
+        if route == ('POST', '/sim/link'):
+            # Degrade or restore the simulated Wi-Fi link: {"latency": ms, "bandwidth": kbit/s}
+            data = self.read_json() or {}
+            if 'latency' in data:
+                device.latency = float(data['latency']) / 1000
+            if 'bandwidth' in data:
+                device.bandwidth = float(data['bandwidth'])
+            return self.send_json({'latency': device.latency * 1000, 'bandwidth': device.bandwidth})
+        if route == ('GET', '/sim/stats'):
+            with device.lock:
+                return self.send_json({'name': device.name, 'requests': dict(device.stats),
+                                       'oled': device.oled_lines, 'settings': device.settings})
+        self.send_body(404, "Nothing matches the given URI")
+
+    def log_message(self, format, *args):
+        if self.device.verbose:
+            super().log_message(format, *args)
+
+def create_simulator(device, host=HOST, port=PORT):
+    """Build the HTTP server for a DeviceSimulator; call serve_forever() on the result"""
+    handler = type('Handler', (SimulatorRequestHandler,), {'device': device})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def load_cards(path):
+    """Cards file: JSON list of {"name": ..., "uid": "DE:AD:BE:EF" or [222, 173, 190, 239]}"""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    return [(entry['name'], parse_uid(entry['uid']) if isinstance(entry['uid'], str) else entry['uid'])
+            for entry in entries]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate one or more ESP32-CAM devices for offline testing")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT, help="Port of the first instance")
+    parser.add_argument('--instances', type=int, default=1, help="Devices to run on consecutive ports")
+    parser.add_argument('--frames', default=FRAMES_DIR, help="Folder of images to serve")
+    parser.add_argument('--video', help="Recorded video to serve instead of --frames (requires OpenCV)")
+    parser.add_argument('--recording', help="frame_recorder.py recording to serve instead of --frames")
+    parser.add_argument('--fps', type=float, default=STREAM_FPS, help="MJPEG /stream frame rate")
+    parser.add_argument('--latency', type=float, default=0, help="Added latency per request in ms")
+    parser.add_argument('--jitter', type=float, default=0, help="Latency jitter (+/-) in ms")
+    parser.add_argument('--error-rate', type=float, default=0, help="Share of requests answered with HTTP 500")
+    parser.add_argument('--drop-rate', type=float, default=0, help="Share of connections closed without a response")
+    parser.add_argument('--card-rate', type=float, default=0, help="Chance that an RFID scan finds a card")
+    parser.add_argument('--cards', help="JSON file of registered RFID cards")
+    parser.add_argument('--switch-delay', type=float, default=0,
+                        help="Time to switch resolution on /capture?size=WxH, in ms")
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help="Link speed for captured frames in kbit/s (0 for unlimited)")
+    parser.add_argument('--no-command', action='store_true', help="Act like firmware without the batched /command endpoint")
+    parser.add_argument('--no-tap-queue', action='store_true', help="Act like firmware without GET /rfid/taps")
+    parser.add_argument('--seed', type=int, help="Random seed for repeatable fault injection")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log requests, OLED text and buzzer sounds")
+    args = parser.parse_args()
+
+    try:
+        frames = load_frames(args.frames, args.video, recording=args.recording)
+        cards = load_cards(args.cards) if args.cards else []
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Error loading simulator data: {e}")
+        sys.exit(1)
+    if not frames:
+        print(f"No frames found in {args.recording or args.video or args.frames}")
+        sys.exit(1)
+
+    servers = []
+    for i in range(args.instances):
+        device = DeviceSimulator(
+            frames[i % len(frames):] + frames[:i % len(frames)],
+            name=f"esp32cam-sim-{i + 1}", latency=args.latency / 1000, jitter=args.jitter / 1000,
+            error_rate=args.error_rate, drop_rate=args.drop_rate, fps=args.fps, card_rate=args.card_rate,
+            cards=cards, seed=None if args.seed is None else args.seed + i, verbose=args.verbose,
+            batched=not args.no_command, switch_delay=args.switch_delay / 1000, bandwidth=args.bandwidth,
+            tap_queue=not args.no_tap_queue,
+        )
+        server = create_simulator(device, args.host, args.port + i)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        print(f"{device.name}: http://{args.host}:{server.server_address[1]}/ ({len(frames)} frames)")
+
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print()
+    for server in servers:
+        server.shutdown()
+        device = server.RequestHandlerClass.device
+        print(f"{device.name}: {json.dumps(device.stats, sort_keys=True)}")
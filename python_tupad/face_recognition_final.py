@@ -6,20 +6,34 @@ from datetime import datetime, time
 import requests
 import time as tm
 import sqlite3
-import json
 import socket
 import subprocess
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import pygame
 
-# Initialize pygame mixer for sound effects
-pygame.mixer.init()
+# Database access and attendance time rules
+from attendance_db import (db_file, PRESENT_START, PRESENT_END, LATE_END, ALLOWED_DAYS,
+                           is_attendance_time_valid, init_database, link_rfid_card,
+                           lookup_rfid_card, markAttendance, process_absent_students)
+from frame_recorder import FrameRecorder, ReplaySource
+from recognition_pipeline import decode_jpeg, flip_frame, match_face, encode_reference_images
+from metrics import (start_metrics_server, FRAMES_CAPTURED, FRAMES_DROPPED, FRAMES_PROCESSED, FACES_DETECTED,
+                     FACE_MATCHES, FACE_UNKNOWN, STAGE_SECONDS, DB_WRITE_SECONDS, CAMERA_RETRIES,
+                     DEVICE_REQUESTS, DEVICE_FAILURES, CAMERA_AVAILABLE, KNOWN_FACES)
+from profiler import LoopProfiler, install_signal_handlers, start_control_server
+from structured_logging import setup_logging, get_logger
+from esp32_device import FeedbackDispatcher, DeviceClient
+from rfid_listener import RfidListener, start_push_server
+from rfid_sync import RfidSync, uid_bytes
+from capture_policy import TwoTierCapture, PROBE_SIZE, DETAIL_SIZE, sized_url
+from camera_tuner import CameraTuner, TARGET_FPS, TUNE_INTERVAL
 
-# Check/create sounds directory
+# Hot-path messages go through a rate-limited, queued logger (LOG_LEVEL, LOG_FILE for JSON lines)
+log = get_logger('recognition')
+
+# Directory for the generated beep sounds
 sounds_dir = './sounds'
-if not os.path.exists(sounds_dir):
-    os.makedirs(sounds_dir)
-    print(f"Created sounds directory at {sounds_dir}")
 
 # Generate simple beep sounds if they don't exist
 def ensure_sound_files_exist():
@@ -74,31 +88,37 @@ def ensure_sound_files_exist():
                                          '02001000' + '64617461' + '00000000'))
                 print(f"Created empty sound file: {filepath}")
 
-# Try to ensure sound files exist
-try:
-    ensure_sound_files_exist()
-except Exception as e:
-    print(f"Warning: Could not create sound files: {e}")
+# Initialize pygame mixer for sound effects and make sure the beep files exist
+def setup_sounds():
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        print(f"Warning: Could not initialize sound mixer: {e}")
+
+    # Check/create sounds directory
+    if not os.path.exists(sounds_dir):
+        os.makedirs(sounds_dir)
+        print(f"Created sounds directory at {sounds_dir}")
+
+    # Try to ensure sound files exist
+    try:
+        ensure_sound_files_exist()
+    except Exception as e:
+        print(f"Warning: Could not create sound files: {e}")
 
 # Path for reference images
 path = 'C:\python\image_folder'
 
-# ESP32-CAM IP address (confirmed working)
-ESP32_IP = "192.168.0.156"
-url = f'http://{ESP32_IP}/capture'  # Use /capture endpoint for single image
-oled_url = f'http://{ESP32_IP}/oled'  # Endpoint for sending data to OLED
-buzzer_url = f'http://{ESP32_IP}/buzzer'  # Endpoint for buzzer sounds
-
-# Database file path
-db_file = 'attendance.db'
+# Face encodings of the reference images, reused while an image file is unchanged
+ENCODINGS_CACHE = 'encodings_cache.npz'
 
-# Time thresholds for attendance status
-PRESENT_START = time(12, 20)
-PRESENT_END = time(12, 35)
-LATE_END = time(13, 50)
+# Set BUZZER_SELF_TEST=1 to play every buzzer pattern at startup (takes several seconds)
+BUZZER_SELF_TEST = os.environ.get('BUZZER_SELF_TEST') == '1'
 
-# Allowed weekdays: Monday (0), Thursday (3)
-ALLOWED_DAYS = [0, 3, 5, 6]
+# ESP32-CAM IP address (confirmed working); set ESP32_IP=127.0.0.1:8081 to use esp32cam_simulator.py
+ESP32_IP = os.environ.get('ESP32_IP', "192.168.0.156")
+url = f'http://{ESP32_IP}/capture'  # Use /capture endpoint for single image
+buzzer_url = f'http://{ESP32_IP}/buzzer'  # Endpoint for buzzer sounds
 
 # Variable to track if we're in a valid attendance time window
 attendance_time_valid = False
@@ -106,18 +126,67 @@ attendance_time_valid = False
 # Variable to track if camera is available (default to False until tested)
 camera_available = False
 
-# Function to check if current time is within valid attendance window
-def is_attendance_time_valid():
-    current_datetime = datetime.now()
-    current_time = current_datetime.time()
-    current_day = current_datetime.weekday()
-    
-    # First check if it's an allowed day
-    if current_day not in ALLOWED_DAYS:
-        return False
-    
-    # Then check if time is within attendance window
-    return PRESENT_START <= current_time <= LATE_END
+# Optional frame recording and replay (see frame_recorder.py):
+# FRAME_RECORD=file appends every captured frame to a recording,
+# FRAME_REPLAY=file uses a recording instead of the camera (FRAME_REPLAY_SPEED=0 for max speed)
+frame_recorder = None
+frame_replay = None
+
+def open_frame_sources():
+    global frame_recorder, frame_replay
+    if os.environ.get('FRAME_RECORD'):
+        frame_recorder = FrameRecorder(os.environ['FRAME_RECORD'])
+    if os.environ.get('FRAME_REPLAY'):
+        frame_replay = ReplaySource(os.environ['FRAME_REPLAY'], speed=float(os.environ.get('FRAME_REPLAY_SPEED', 1)) or None)
+        # A recording has one size per frame, so it is replayed through the single-frame path
+        capture_policy.sized = False
+
+# Two-tier capture (see capture_policy.py): faces are looked for on small CAPTURE_PROBE_SIZE frames and a
+# CAPTURE_DETAIL_SIZE frame is fetched only when there is one. An empty CAPTURE_PROBE_SIZE fetches every
+# frame at the camera's own size, as firmware without /capture?size= does anyway.
+CAPTURE_PROBE_SIZE = os.environ.get('CAPTURE_PROBE_SIZE', PROBE_SIZE)
+CAPTURE_DETAIL_SIZE = os.environ.get('CAPTURE_DETAIL_SIZE', DETAIL_SIZE)
+
+# The detail (or single-frame) size and the JPEG quality are tuned to CAMERA_TARGET_FPS at startup, every
+# CAMERA_TUNE_INTERVAL seconds and when fetches slow down (see camera_tuner.py); 0 disables tuning
+CAMERA_TARGET_FPS = float(os.environ.get('CAMERA_TARGET_FPS', TARGET_FPS))
+CAMERA_TUNE_INTERVAL = float(os.environ.get('CAMERA_TUNE_INTERVAL', TUNE_INTERVAL))
+
+# Prometheus-format metrics on http://127.0.0.1:METRICS_PORT/metrics (METRICS_PORT=0 disables; see metrics.py)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9108))
+
+# On-demand profiling of the main loop, written to ./profiles (see profiler.py):
+# 'p'/'m' keys, SIGUSR1/SIGUSR2, or commands on the control socket at PROFILE_PORT (0 disables)
+PROFILE_PORT = int(os.environ.get('PROFILE_PORT', 9109))
+
+# RFID taps are handled in the background (see rfid_listener.py): the firmware reads cards on its
+# own and the taps are polled from GET /rfid/taps, which answers at once (RFID_POLL=0 disables;
+# older firmware without it only reads cards on 'f'). Scan events can also be pushed to
+# http://RFID_PUSH_HOST:RFID_PUSH_PORT/rfid/event (0 disables); set RFID_PUSH_HOST to 0.0.0.0 for
+# a reader bridge on another machine, the endpoint has no authentication.
+RFID_PUSH_HOST = os.environ.get('RFID_PUSH_HOST', '127.0.0.1')
+RFID_PUSH_PORT = int(os.environ.get('RFID_PUSH_PORT', 9110))
+RFID_POLL = os.environ.get('RFID_POLL', '1') == '1'
+
+# The device's own RFID card list is reconciled with the database every RFID_SYNC_INTERVAL seconds
+# and after 'n'/'k' (see rfid_sync.py), so cards registered either way work in both; 0 disables
+RFID_SYNC_INTERVAL = float(os.environ.get('RFID_SYNC_INTERVAL', 300))
+loop_profiler = LoopProfiler()
+
+def start_services():
+    """Logging thread, metrics endpoint, profiling controls and the RFID listener"""
+    setup_logging()
+    feedback.start()
+    if METRICS_PORT:
+        start_metrics_server(port=METRICS_PORT)
+    install_signal_handlers(loop_profiler)
+    if PROFILE_PORT:
+        start_control_server(loop_profiler, port=PROFILE_PORT)
+    rfid_listener.start(poll=RFID_POLL)
+    if RFID_PUSH_PORT:
+        start_push_server(rfid_listener, RFID_PUSH_HOST, RFID_PUSH_PORT)
+    if RFID_SYNC_INTERVAL:
+        rfid_sync.start(RFID_SYNC_INTERVAL)
 
 # Function to find ESP32-CAM on the network
 def find_esp32cam():
@@ -276,7 +345,7 @@ def verify_esp32cam(ip):
 
 # Function to test and fix ESP32 connection
 def test_and_fix_esp32_connection():
-    global ESP32_IP, url, oled_url, buzzer_url
+    global ESP32_IP, url, buzzer_url
     
     print("\n--- Testing ESP32-CAM Connection ---")
     
@@ -302,8 +371,11 @@ def test_and_fix_esp32_connection():
             # Update global variables
             ESP32_IP = new_ip
             url = f'http://{ESP32_IP}/capture'
-            oled_url = f'http://{ESP32_IP}/oled'
             buzzer_url = f'http://{ESP32_IP}/buzzer'
+            device.set_address(ESP32_IP)
+            rfid_listener.set_address(ESP32_IP)
+            rfid_sync.set_address(ESP32_IP)
+            camera_control.set_address(ESP32_IP)
             
             print(f"Updated ESP32-CAM IP to {ESP32_IP}")
             return True
@@ -331,8 +403,11 @@ def test_and_fix_esp32_connection():
         new_ip = input("Enter ESP32-CAM IP address: ")
         ESP32_IP = new_ip
         url = f'http://{ESP32_IP}/capture'
-        oled_url = f'http://{ESP32_IP}/oled'
         buzzer_url = f'http://{ESP32_IP}/buzzer'
+        device.set_address(ESP32_IP)
+        rfid_listener.set_address(ESP32_IP)
+        rfid_sync.set_address(ESP32_IP)
+        camera_control.set_address(ESP32_IP)
         print(f"Updated ESP32-CAM IP to {ESP32_IP}")
         
         # Check if user wants to test with a different endpoint
@@ -348,92 +423,112 @@ def test_and_fix_esp32_connection():
         print("Exiting program")
         exit()
 
-# Function to send data to OLED display with improved error handling
+# Function to send data to OLED display; the request is made by the feedback thread
 def update_oled_display(text_lines, clear=False, show_smiley=False):
-    """Send data to OLED display with improved error handling"""
+    """Queue an OLED update without waiting for the ESP32-CAM; False if the display already shows it"""
     
     # If camera is not available, just log the message but don't try to send
     if not camera_available:
-        print(f"OLED update skipped (camera not available): {text_lines}")
-        return False
-        
-    try:
-        # print(f"Updating OLED display with {len(text_lines)} lines")
-        
-        # Add smiley face if requested
-        if show_smiley:
-            # Add smiley bitmap at the end
-            text_lines.append(":)")  # Add smiley at the bottom
-        
-        payload = {
-            'clear': clear,
-            'lines': text_lines[:4]  # Limit to 4 lines for small OLED displays
-        }
-        
-        response = requests.post(oled_url, json=payload, timeout=2)
-        
-        if response.status_code == 200:
-            # print("OLED display updated successfully")
-            return True
-        else:
-            print(f"Failed to update OLED display. HTTP status code: {response.status_code}")
-            print(f"Response content: {response.text}")
-            return False
-    except requests.exceptions.ConnectionError:
-        print(f"Error: Could not connect to ESP32-CAM OLED endpoint at {oled_url}")
-        return False
-    except requests.exceptions.Timeout:
-        print("Error: OLED update request timed out")
-        return False
-    except Exception as e:
-        print(f"Unexpected error updating OLED: {str(e)}")
+        log.debug("OLED update skipped (camera not available): %s", text_lines)
         return False
+    
+    # Add smiley face if requested
+    if show_smiley:
+        # Add smiley bitmap at the end
+        text_lines.append(":)")  # Add smiley at the bottom
+    
+    payload = {
+        'clear': clear,
+        'lines': text_lines[:4]  # Limit to 4 lines for small OLED displays
+    }
+    return feedback.oled(payload)
 
-# Function to get image from ESP32-CAM with improved error handling
-def get_image_from_camera():
-    if not camera_available:
-        print("Cannot get image - camera not available")
+# Decode a JPEG from the camera (or a recording) into the upright BGR image
+def decode_camera_image(content):
+    with STAGE_SECONDS.time(stage='decode'):
+        img = decode_jpeg(content)
+    
+    if img is None:
+        FRAMES_DROPPED.inc(reason='decode')
+        log.warning("Failed to decode image from ESP32-CAM")
         return False, None
+    
+    # Flip the image upside down
+    with STAGE_SECONDS.time(stage='flip'):
+        return True, flip_frame(img)
+
+# Fetch one JPEG from the ESP32-CAM (or the replayed recording); size such as '320x240' or None
+def fetch_camera_frame(size=None):
+    if frame_replay:
+        success, content, _ = frame_replay.read()
+        if not success:
+            return None
+        FRAMES_CAPTURED.inc()
+        return content
+    
+    if not camera_available:
+        log.warning("Cannot get image - camera not available")
+        return None
         
     try:
         # print(f"Attempting to get image from {url}")
-        img_resp = requests.get(url, timeout=5)
+        started = tm.perf_counter()
+        with DEVICE_REQUESTS.time(endpoint='capture'):
+            img_resp = requests.get(sized_url(url, size) if size else url, timeout=5)
         
         if img_resp.status_code == 200:
             # print("Successfully received image from camera")
-            img_arr = np.array(bytearray(img_resp.content), dtype=np.uint8)
-            img = cv2.imdecode(img_arr, -1)
-            
-            if img is None:
-                print("Error: Failed to decode image from ESP32-CAM")
-                return False, None
-            
-            # Flip the image upside down
-            img = cv2.flip(img, -1)  # -1 means flip both horizontally and vertically
-                
-            # print(f"Image dimensions: {img.shape}")
-            return True, img
+            FRAMES_CAPTURED.inc()
+            camera_tuner.observe(size, tm.perf_counter() - started)
+            return img_resp.content
         else:
-            print(f"Error: Failed to get image. HTTP status code: {img_resp.status_code}")
-            print(f"Response content: {img_resp.text[:200]}")  # Print first 200 chars of response
-            print("\nAvailable endpoints:")
-            print("1. /capture - Get single image")
-            print("2. /stream - Get video stream")
-            print("3. /oled - Control OLED display")
-            return False, None
+            DEVICE_FAILURES.inc(endpoint='capture', reason=f"http_{img_resp.status_code}")
+            FRAMES_DROPPED.inc(reason='capture')
+            log.warning("Failed to get image: HTTP %s %s (expected endpoints: /capture, /stream, /oled)",
+                        img_resp.status_code, img_resp.text[:200])
+            return None
     except requests.exceptions.ConnectionError:
-        print(f"Error: Could not connect to ESP32-CAM at {ESP32_IP}")
-        print("Please check:")
-        print("1. ESP32-CAM is powered on")
-        print("2. ESP32-CAM is connected to the same network")
-        print("3. No firewall is blocking the connection")
-        return False, None
+        DEVICE_FAILURES.inc(endpoint='capture', reason='connection')
+        FRAMES_DROPPED.inc(reason='capture')
+        log.warning("Could not connect to ESP32-CAM at %s; check power, network and firewall", ESP32_IP)
+        return None
     except requests.exceptions.Timeout:
-        print("Error: Request timed out. Camera might be busy or not responding")
-        return False, None
+        DEVICE_FAILURES.inc(endpoint='capture', reason='timeout')
+        FRAMES_DROPPED.inc(reason='capture')
+        log.warning("Camera request timed out; it might be busy or not responding")
+        return None
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        DEVICE_FAILURES.inc(endpoint='capture', reason='error')
+        FRAMES_DROPPED.inc(reason='capture')
+        log.error("Unexpected error getting image: %s", e)
+        return None
+
+# Function to get image from ESP32-CAM with improved error handling
+def get_image_from_camera():
+    content = fetch_camera_frame()
+    if content is None:
         return False, None
+    if frame_recorder and not frame_replay:
+        frame_recorder.write(content)
+    return decode_camera_image(content)
+
+# Capture a frame and find the faces on it, fetching a high-resolution frame only for faces
+def capture_faces():
+    img, locations, encodings = capture_policy.capture()
+    if img is None:
+        if capture_policy.content is not None:
+            FRAMES_DROPPED.inc(reason='decode')
+            log.warning("Failed to decode image from ESP32-CAM")
+        return False, None, [], []
+    if frame_recorder and not frame_replay:
+        frame_recorder.write(capture_policy.content)
+    return True, img, locations, encodings
+
+capture_policy = TwoTierCapture(fetch_camera_frame, CAPTURE_PROBE_SIZE, CAPTURE_DETAIL_SIZE,
+                                stage=lambda name: STAGE_SECONDS.time(stage=name))
+# Its own client, as the feedback thread uses the other one's session
+camera_control = DeviceClient(ESP32_IP)
+camera_tuner = CameraTuner(capture_policy, camera_control.control, CAMERA_TARGET_FPS, CAMERA_TUNE_INTERVAL)
 
 # Create a fallback image for when the camera is not available
 def create_status_image(message1="Camera Not Available", message2=None, message3=None):
@@ -465,30 +560,18 @@ def create_status_image(message1="Camera Not Available", message2=None, message3
 
 # Function to play buzzer sound based on attendance status
 def play_buzzer_sound(status):
-    """Play different sounds based on attendance status"""
-    try:
-        status = status.lower() if status else ""
-        
-        # Only play sound on ESP32-CAM, not locally
-        if camera_available:
-            try:
-                print(f"Sending buzzer command to ESP32-CAM at {buzzer_url}")
-                print(f"Status: {status}")
-                response = requests.post(buzzer_url, json={"status": status}, timeout=2)
-                print(f"Buzzer response status code: {response.status_code}")
-                print(f"Buzzer response content: {response.text}")
-                if response.status_code != 200:
-                    print(f"Failed to play buzzer sound on ESP32-CAM: {response.status_code}")
-                    print(f"Response content: {response.text}")
-            except requests.exceptions.ConnectionError:
-                print(f"Connection error: Could not connect to ESP32-CAM at {buzzer_url}")
-                print("Please check if ESP32-CAM is powered on and connected to the network")
-            except requests.exceptions.Timeout:
-                print("Timeout error: ESP32-CAM did not respond in time")
-            except Exception as e:
-                print(f"Error playing buzzer sound on ESP32-CAM: {str(e)}")
-    except Exception as e:
-        print(f"Sound error: {e}")
+    """Queue the buzzer pattern for an attendance status"""
+    status = status.lower() if status else ""
+    
+    # Only play sound on ESP32-CAM, not locally
+    if camera_available:
+        feedback.buzzer(status)
+
+# OLED and buzzer requests go out from the feedback thread so recognition never waits on the
+# ESP32-CAM; everything due is sent in one /command request when the firmware supports it.
+# OLED updates are only sent when the text changes, at most every OLED_MIN_INTERVAL seconds
+device = DeviceClient(ESP32_IP)
+feedback = FeedbackDispatcher(device.send)
 
 # Function to test buzzer directly
 def test_buzzer_direct():
@@ -521,260 +604,34 @@ def test_buzzer_direct():
     
     print("Buzzer test complete")
 
-# Try to ensure ESP32-CAM connection is working
-camera_available = test_and_fix_esp32_connection()
-
-# Initialize database
-def init_database():
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file, timeout=20)  # Add timeout to prevent locks
-        cursor = conn.cursor()
-        
-        # Create students table if not exists
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            id INTEGER PRIMARY KEY,
-            name TEXT UNIQUE,
-            image_path TEXT,
-            status TEXT DEFAULT 'active',
-            absent_count INTEGER DEFAULT 0,
-            consecutive_absences INTEGER DEFAULT 0,
-            last_updated TEXT
-        )
-        ''')
-        
-        # Create attendance table if not exists
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY,
-            student_name TEXT,
-            date TEXT,
-            time TEXT,
-            status TEXT,
-            method TEXT DEFAULT 'face',
-            UNIQUE(student_name, date)
-        )
-        ''')
-        
-        # Create RFID cards table if not exists
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS rfid_cards (
-            id INTEGER PRIMARY KEY,
-            card_uid TEXT UNIQUE,
-            student_name TEXT,
-            active BOOLEAN DEFAULT 1,
-            FOREIGN KEY (student_name) REFERENCES students(name)
-        )
-        ''')
-        
-        # Check if consecutive_absences column exists in students table
-        cursor.execute("PRAGMA table_info(students)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Add consecutive_absences column if it doesn't exist
-        if 'consecutive_absences' not in columns:
-            print("Adding consecutive_absences column to students table...")
-            cursor.execute('ALTER TABLE students ADD COLUMN consecutive_absences INTEGER DEFAULT 0')
-        
-        # Check if method column exists in attendance table
-        cursor.execute("PRAGMA table_info(attendance)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Add method column if it doesn't exist
-        if 'method' not in columns:
-            print("Adding method column to attendance table...")
-            cursor.execute('ALTER TABLE attendance ADD COLUMN method TEXT DEFAULT "face"')
-        
-        conn.commit()
-        print("Database initialized successfully")
-        
-        # Add all students from image_folder to the database if they don't exist
-        if os.path.exists(path):
-            for filename in os.listdir(path):
-                if filename.endswith(('.jpg', '.jpeg', '.png', '.jfif')):
-                    name = os.path.splitext(filename)[0]
-                    image_path = os.path.join(path, filename)
-                    
-                    # Check if student exists
-                    cursor.execute("SELECT id FROM students WHERE name=?", (name,))
-                    if cursor.fetchone() is None:
-                        # Add student to database
-                        cursor.execute(
-                            "INSERT INTO students (name, image_path, status, last_updated) VALUES (?, ?, ?, ?)",
-                            (name, image_path, 'active', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                        )
-                        print(f"Added student: {name}")
-            
-            conn.commit()
-            
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-# Function to link RFID card with student
-def link_rfid_card(student_name, card_uid):
-    """Link an RFID card with an existing student"""
-    try:
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        
-        # Check if student exists
-        cursor.execute("SELECT id FROM students WHERE name=?", (student_name,))
-        if cursor.fetchone() is None:
-            print(f"Student {student_name} not found")
-            return False
-            
-        # Check if card is already registered
-        cursor.execute("SELECT student_name FROM rfid_cards WHERE card_uid=?", (card_uid,))
-        existing = cursor.fetchone()
-        if existing:
-            if existing[0] == student_name:
-                print(f"Card already linked to {student_name}")
-                return True
-            else:
-                print(f"Card already linked to another student: {existing[0]}")
-                return False
-        
-        # Link card to student
-        cursor.execute(
-            "INSERT INTO rfid_cards (card_uid, student_name) VALUES (?, ?)",
-            (card_uid, student_name)
-        )
-        conn.commit()
-        print(f"Linked RFID card {card_uid} to {student_name}")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"Database error linking RFID card: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
+# Make sure the ESP32-CAM connection is working and fetch a test image
+def probe_camera():
+    global camera_available
+    # A replayed recording needs no camera
+    camera_available = True if frame_replay else test_and_fix_esp32_connection()
 
-# Function to get student name from RFID card
-def get_student_from_rfid(card_uid):
-    """Get student name associated with an RFID card"""
-    try:
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT student_name FROM rfid_cards WHERE card_uid=? AND active=1",
-            (card_uid,)
-        )
-        result = cursor.fetchone()
-        
-        if result:
-            return result[0]
-        return None
-        
-    except sqlite3.Error as e:
-        print(f"Database error getting student from RFID: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
-
-# Update markAttendance to handle database locks
-def markAttendance(name, method="face"):
-    conn = None
-    try:
-        # Check if we're in a valid attendance time window
-        if not is_attendance_time_valid():
-            print(f"Attendance not recorded for {name} - outside valid hours")
-            return "Outside attendance hours"
-            
-        current_datetime = datetime.now()
-        current_time = current_datetime.time()
-        current_date = current_datetime.strftime('%Y-%m-%d')
-        
-        # Set status based on time
-        status = "Unknown"
-        if PRESENT_START <= current_time <= PRESENT_END:
-            status = "Present"
-        elif PRESENT_END < current_time <= LATE_END:
-            status = "Late"
+    print("Testing camera connection...")
+    if camera_available:
+        success, test_img = get_image_from_camera()
+        if success:
+            print(f"Camera connection successful! Image dimensions: {test_img.shape}")
+            if CAMERA_TUNE_INTERVAL and not frame_replay:
+                camera_tuner.tune('startup', verbose=True)
         else:
-            return "Outside attendance hours"
-        
-        # Connect to database with timeout and retry logic
-        max_retries = 3
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                conn = sqlite3.connect(db_file, timeout=20)
-                cursor = conn.cursor()
-                
-                # First check if student is active
-                cursor.execute("SELECT status FROM students WHERE name=?", (name,))
-                student_result = cursor.fetchone()
-                
-                if not student_result:
-                    print(f"Student {name} not found in database")
-                    return "Student not found"
-                    
-                if student_result[0] != 'active':
-                    print(f"Student {name} is not active (status: {student_result[0]})")
-                    return "Student not active"
-                
-                # Check if this student already has an attendance record for today
-                cursor.execute(
-                    "SELECT status FROM attendance WHERE student_name=? AND date=?", 
-                    (name, current_date)
-                )
-                result = cursor.fetchone()
-                
-                if result:
-                    # Already recorded today, don't update
-                    print(f"{name} already marked as {result[0]} for today ({current_date})")
-                    return None
-                else:
-                    # Record new attendance
-                    cursor.execute(
-                        "INSERT INTO attendance (student_name, date, time, status, method) VALUES (?, ?, ?, ?, ?)",
-                        (name, current_date, current_datetime.strftime('%H:%M:%S'), status, method)
-                    )
-                    
-                    # Reset absence count for this student if they're present
-                    if status in ["Present", "Late"]:
-                        cursor.execute(
-                            "UPDATE students SET consecutive_absences = 0 WHERE name = ?",
-                            (name,)
-                        )
-                    
-                    conn.commit()
-                    print(f"Marked {name} as {status} at {current_datetime.strftime('%H:%M:%S')} using {method}")
-                    return status
-                    
-            except sqlite3.Error as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    print(f"Database error (attempt {retry_count}/{max_retries}): {e}")
-                    tm.sleep(1)  # Use tm.sleep instead of time.sleep
-                else:
-                    print(f"Error in markAttendance after {max_retries} attempts: {e}")
-                    return "Error"
-            finally:
-                if conn:
-                    conn.close()
-                    conn = None
-                    
-    except Exception as e:
-        print(f"Unexpected error in markAttendance: {e}")
-        return "Error"
-    finally:
-        if conn:
-            conn.close()
+            print("Camera connection failed on test! Check ESP32-CAM settings.")
+            camera_available = False
+    else:
+        print("Camera not available, continuing without face recognition capability.")
+    CAMERA_AVAILABLE.set(int(camera_available))
+    return camera_available
 
 # Update markRfidAttendance to use the new database functions
 def markRfidAttendance(studentName):
     try:
         # Check if we're in a valid attendance time window
         if not is_attendance_time_valid():
-            print(f"RFID attendance not recorded for {studentName} - outside valid hours")
+            log.info("RFID attendance not recorded for %s - outside valid hours", studentName,
+                     extra={'key': ('rfid_outside', studentName), 'student': studentName})
             update_oled_display([
                 "RFID Attendance",
                 studentName,
@@ -784,7 +641,8 @@ def markRfidAttendance(studentName):
             return "Outside attendance hours"
             
         # Mark attendance using the common function
-        status = markAttendance(studentName, method="rfid")
+        with DB_WRITE_SECONDS.time(method='rfid'):
+            status = markAttendance(studentName, method="rfid")
         
         if status:
             # Update OLED with attendance confirmation
@@ -800,7 +658,7 @@ def markRfidAttendance(studentName):
             
         return status
     except Exception as e:
-        print(f"Error in markRfidAttendance: {e}")
+        log.error("Error in markRfidAttendance: %s", e)
         update_oled_display([
             "RFID Error",
             "Database issue",
@@ -809,62 +667,116 @@ def markRfidAttendance(studentName):
         ])
         return "Error"
 
-# Initialize database
-init_database()
+# Handle one RFID tap (runs on the RFID worker thread, alongside face recognition)
+def handle_rfid_tap(card_uid, device_name=None):
+    # Cards linked in the database (looked up in memory) take precedence over the name stored on the device
+    card = lookup_rfid_card(card_uid)
+    student_name = card[0] if card else device_name
+    if card and card[1] not in ('active', None):
+        log.info("RFID card of %s ignored - student is %s", student_name, card[1],
+                 extra={'key': ('rfid_inactive', card_uid), 'student': student_name})
+        update_oled_display([
+            "RFID Attendance",
+            student_name,
+            f"Student {card[1]}",
+            datetime.now().strftime('%H:%M:%S')
+        ])
+        play_buzzer_sound("absent")
+        return None
+    if not student_name:
+        log.info("Unknown RFID card %s", card_uid, extra={'key': ('rfid_unknown', card_uid)})
+        update_oled_display([
+            "Unknown RFID Card",
+            card_uid,
+            "Please register first",
+            datetime.now().strftime('%H:%M:%S')
+        ])
+        play_buzzer_sound("absent")
+        return None
+    return markRfidAttendance(student_name)
+
+# RFID taps from the device (polled or pushed) are queued and recorded by a background worker
+rfid_listener = RfidListener(handle_rfid_tap, ESP32_IP)
+
+# Keeps the device's card list and the rfid_cards table in step
+rfid_sync = RfidSync(ESP32_IP)
+
+# Wait for the card of a student in the background ('n' and 'k'); on_card(student_name, card_uid) registers it
+def wait_for_rfid_card(title, student_name, on_card):
+    def claimed(card_uid, device_name):
+        if card_uid is None:
+            print(f"No RFID card scanned for {student_name}")
+            update_oled_display([title, "No card scanned", "Try again", ""])
+            return
+        try:
+            on_card(student_name, card_uid)
+        except Exception as e:
+            print(f"Error registering RFID card: {e}")
+            update_oled_display(["RFID Error", "Connection failed", str(e)[:16], "Try again"])
+
+    if not rfid_listener.claim(claimed):
+        print("Already waiting for an RFID card")
+        return
+    print(f"Please scan RFID card for {student_name}...")
+    update_oled_display([title, "Scan card for:", student_name, "Waiting..."])
+
+# Register a card on the ESP32-CAM under the student's name
+def add_device_rfid_card(student_name, card_uid):
+    response = requests.post(
+        f'http://{ESP32_IP}/rfid',
+        json={'action': 'add', 'name': student_name, 'uid': uid_bytes(card_uid)},
+        timeout=10
+    )
+    if response.status_code == 200:
+        print(f"RFID card registered for {student_name}")
+        rfid_sync.request()
+        update_oled_display(["RFID Card Added", f"For: {student_name}", "Success!", ""])
+    else:
+        print(f"Failed to register RFID card. Status code: {response.status_code}")
+        update_oled_display(["RFID Error", f"Status: {response.status_code}", "Check ESP32-CAM", "firmware"])
+
+# Link a card to the student in the database
+def link_student_rfid_card(student_name, card_uid):
+    if link_rfid_card(student_name, card_uid):
+        print(f"RFID card linked to {student_name}")
+        rfid_sync.request()
+        update_oled_display(["RFID Card Linked", f"To: {student_name}", "Success!", ""])
+    else:
+        print("Failed to link RFID card")
+        update_oled_display(["RFID Error", "Link failed", "Check student name", "and try again"])
 
 # Attendance file in current directory (simplest approach) - for backwards compatibility
 attendance_file = 'Attendance.txt'
 
-# Create Attendance file if it doesn't exist (for backwards compatibility)
-if not os.path.isfile(attendance_file):
-    with open(attendance_file, 'w') as f:
-        f.write('Name,Time')
-    print(f"Created attendance file: {attendance_file}")
-
-# Initialize with a test image
-print("Testing camera connection...")
-if camera_available:
-    success, test_img = get_image_from_camera()
-    if success:
-        print(f"Camera connection successful! Image dimensions: {test_img.shape}")
+def prepare_database():
+    init_database(path)
+
+    # Create Attendance file if it doesn't exist (for backwards compatibility)
+    if not os.path.isfile(attendance_file):
+        with open(attendance_file, 'w') as f:
+            f.write('Name,Time')
+        print(f"Created attendance file: {attendance_file}")
+
+# List reference images as (name, file path)
+def list_reference_images(path):
+    references = []
+    if os.path.exists(path):
+        myList = os.listdir(path)
+        print(f"Found {len(myList)} reference images...")
+        for cl in sorted(myList):
+            if cl.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.jfif')):
+                references.append((os.path.splitext(cl)[0], os.path.join(path, cl)))
+        print(f"Names: {[name for name, _ in references]}")
     else:
-        print("Camera connection failed on test! Check ESP32-CAM settings.")
-        camera_available = False
-else:
-    print("Camera not available, continuing without face recognition capability.")
-
-# Test buzzer functionality at startup
-print("Testing buzzer connection...")
-test_buzzer_direct()
-
-# Main loop - modified to use active students
-print("Starting face recognition. Press 'q' to exit, 'a' to process absences, 'r' to refresh encodings.")
-print("Press 'd' to toggle detailed display on OLED, 'c' to clear OLED, 's' to show stats.")
-print("Press 'f' to scan RFID card, 'l' to list RFID cards, 'n' to add new RFID card.")
-print(f"Valid attendance window: {PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')} on days {ALLOWED_DAYS}")
-
-# Load reference images
-images = []
-classNames = []
-if os.path.exists(path):
-    myList = os.listdir(path)
-    print(f"Loading {len(myList)} reference images...")
-    for cl in myList:
-        curImg = cv2.imread(f'{path}/{cl}')
-        if curImg is not None:
-            images.append(curImg)
-            classNames.append(os.path.splitext(cl)[0])
-    print(f"Loaded {len(images)} images successfully")
-    print(f"Names: {classNames}")
-else:
-    print(f"WARNING: Reference images folder not found: {path}")
-    print("Please create the folder and add face images for recognition")
+        print(f"WARNING: Reference images folder not found: {path}")
+        print("Please create the folder and add face images for recognition")
+    return references
 
 # Function to find face encodings with stricter matching
-def findEncodings(images, names):
+def findEncodings(references):
     """
-    Create face encodings for the provided images.
-    Only encode faces for active students.
+    Create face encodings for the provided (name, file path) references.
+    Only encode faces for active students; unchanged images come from ENCODINGS_CACHE.
     """
     encodeList = []
     activeNames = []
@@ -872,763 +784,583 @@ def findEncodings(images, names):
     # Connect to database to check student status
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
+    active = []
     
-    for i, (img, name) in enumerate(zip(images, names)):
-        try:
-            # Check if student is active
-            cursor.execute("SELECT status FROM students WHERE name=?", (name,))
-            result = cursor.fetchone()
-            
-            if result and result[0] == 'active':
-                # Only encode active students
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                # Get all face encodings in the image
-                face_encodings = face_recognition.face_encodings(img)
-                if face_encodings:
-                    # Use the first face found in the reference image
-                    encodeList.append(face_encodings[0])
-                    activeNames.append(name)
-                    print(f"Encoded {name} (active)")
-                else:
-                    print(f"No face found in reference image for {name}")
-            else:
-                print(f"Skipping {name} (not active)")
-        except Exception as e:
-            print(f"Error encoding image for {name}: {e}")
+    for name, file_path in references:
+        # Check if student is active
+        cursor.execute("SELECT status FROM students WHERE name=?", (name,))
+        result = cursor.fetchone()
+        
+        if result and result[0] == 'active':
+            active.append((name, file_path))
+        else:
+            print(f"Skipping {name} (not active)")
     
     conn.close()
-    return encodeList, activeNames
 
-# Update process_absent_students to handle database locks
-def process_absent_students():
-    """Process students who were absent today and update their absent count"""
-    conn = None
     try:
-        # Connect to database with timeout
-        conn = sqlite3.connect(db_file, timeout=20)
-        cursor = conn.cursor()
-        
-        # Get current date
-        current_date = datetime.now().strftime('%Y-%m-%d')
-        
-        # Get all active students
-        cursor.execute("SELECT name FROM students WHERE status='active'")
-        active_students = cursor.fetchall()
-        
-        # Get students who attended today
-        cursor.execute("SELECT student_name FROM attendance WHERE date=?", (current_date,))
-        attended_students = [record[0] for record in cursor.fetchall()]
-        
-        # Process absent students
-        for student in active_students:
-            name = student[0]
-            if name not in attended_students:
-                # Student was absent today
-                print(f"Student {name} was absent today")
-                
-                # Record absence
-                cursor.execute(
-                    "INSERT OR IGNORE INTO attendance (student_name, date, time, status) VALUES (?, ?, ?, ?)",
-                    (name, current_date, "00:00:00", "absent")
-                )
-                
-                # Increment absent count and consecutive absences
-                cursor.execute("""
-                    UPDATE students 
-                    SET absent_count = absent_count + 1,
-                        consecutive_absences = consecutive_absences + 1 
-                    WHERE name=?
-                """, (name,))
-                
-                # Check if student should be dropped
-                cursor.execute("SELECT consecutive_absences FROM students WHERE name=?", (name,))
-                consecutive_absences = cursor.fetchone()[0]
-                
-                if consecutive_absences >= 3:
-                    # Mark student as dropped
-                    cursor.execute("UPDATE students SET status='dropped' WHERE name=?", (name,))
-                    print(f"Student {name} has been dropped due to {consecutive_absences} consecutive absences")
-        
-        conn.commit()
-        
-    except sqlite3.Error as e:
-        print(f"Database error processing absences: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-# Check if we have any images to use for recognition
-if len(images) == 0:
-    print("ERROR: No valid reference images found. Please add images to the folder.")
-    exit()
-
-# Encode known faces (only active students)
-print("Encoding reference faces...")
-encodeListKnown, activeClassNames = findEncodings(images, classNames)
-print(f'Encoding complete. {len(encodeListKnown)} active faces encoded.')
-
-# Update OLED display on startup
-print("Initializing OLED display...")
-update_oled_display(["Face Recognition", "System Starting...", f"{len(encodeListKnown)} faces", "encoded"], clear=True)
-
-# Initialize display toggle state
-detailed_display = True  # Start with detailed display enabled
-running = True
-last_capture_time = 0
-capture_interval = 0.5  # 500ms between captures
-last_face_time = 0
-face_display_interval = 2  # Show face info for 2 seconds
-connection_retry_count = 0
-max_retry_count = 5  # Maximum number of retries before trying to fix connection
-
-# Clear OLED display on startup
-update_oled_display(["Face Recognition", "System Starting...", f"{len(encodeListKnown)} faces", "encoded"], clear=True)
-
-while running:
-    current_time = tm.time()
+        encodings = encode_reference_images([file_path for _, file_path in active], ENCODINGS_CACHE)
+    except Exception as e:
+        print(f"Error encoding reference images: {e}")
+        return encodeList, activeNames
+
+    for (name, _), encoding in zip(active, encodings):
+        if encoding is not None:
+            # Use the first face found in the reference image
+            encodeList.append(encoding)
+            activeNames.append(name)
+            print(f"Encoded {name} (active)")
+        else:
+            print(f"No face found in reference image for {name}")
+    
+    return encodeList, activeNames
+
+def startup():
+    """
+    Run the startup phases and return (references, encodings, names).
+
+    Sound setup, the camera probe, the database migration and the gallery
+    listing are independent and run concurrently; encoding starts as soon as
+    the database and gallery are ready. Each phase's duration is reported.
+    """
+    timings = {}
+    started = tm.perf_counter()
+
+    def timed(name, func, *args):
+        phase_start = tm.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[name] = tm.perf_counter() - phase_start
+
+    timed('services', start_services)
+    timed('frame sources', open_frame_sources)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        sounds = pool.submit(timed, 'sounds', setup_sounds)
+        camera = pool.submit(timed, 'camera', probe_camera)
+        database = pool.submit(timed, 'database', prepare_database)
+        gallery = pool.submit(timed, 'gallery', list_reference_images, path)
+
+        database.result()
+        references = gallery.result()
+        # Check if we have any images to use for recognition
+        if len(references) == 0:
+            print("ERROR: No valid reference images found. Please add images to the folder.")
+            exit()
+
+        # Encode known faces (only active students)
+        print("Encoding reference faces...")
+        encodeListKnown, activeClassNames = timed('encoding', findEncodings, references)
+        print(f'Encoding complete. {len(encodeListKnown)} active faces encoded.')
+        camera.result()
+        sounds.result()
+
+    # Test buzzer functionality at startup
+    if BUZZER_SELF_TEST:
+        print("Testing buzzer connection...")
+        timed('buzzer self-test', test_buzzer_direct)
+
+    print("Startup phases: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    print(f"Startup complete in {tm.perf_counter() - started:.2f}s")
+    return references, encodeListKnown, activeClassNames
+
+def main():
+    global camera_available, attendance_time_valid
+    process_start = tm.perf_counter()
+    references, encodeListKnown, activeClassNames = startup()
+    KNOWN_FACES.set(len(encodeListKnown))
+
+    # Main loop - modified to use active students
+    print("Starting face recognition. Press 'q' to exit, 'a' to process absences, 'r' to refresh encodings.")
+    print("Press 'd' to toggle detailed display on OLED, 'c' to clear OLED, 's' to show stats.")
+    print("Press 'f' to scan RFID card, 'l' to list RFID cards, 'n' to add new RFID card.")
+    if RFID_POLL:
+        print("RFID cards are read in the background when the firmware supports it.")
+    print("Press 'p' to profile the next 200 loop iterations, 'm' to trace memory allocations.")
+    print(f"Valid attendance window: {PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')} on days {ALLOWED_DAYS}")
+
+    # Update OLED display on startup
+    print("Initializing OLED display...")
+    update_oled_display(["Face Recognition", "System Starting...", f"{len(encodeListKnown)} faces", "encoded"], clear=True)
+
+    # Initialize display toggle state
+    detailed_display = True  # Start with detailed display enabled
+    running = True
+    last_capture_time = 0
+    capture_interval = 0.5  # 500ms between captures
+    last_face_time = 0
+    face_display_interval = 2  # Show face info for 2 seconds
+    connection_retry_count = 0
+    max_retry_count = 5  # Maximum number of retries before trying to fix connection
+    first_recognition = None  # Seconds from start to the first matched face
+
+    while running:
+        loop_profiler.tick()
+        current_time = tm.time()
     
-    # Check if we're in a valid attendance time window
-    attendance_time_valid = is_attendance_time_valid()
+        # Check if we're in a valid attendance time window
+        attendance_time_valid = is_attendance_time_valid()
     
-    # If camera is not available, show status image but continue running
-    if not camera_available:
-        # Update status image every 1 second
-        if current_time - last_capture_time >= 1.0:
-            last_capture_time = current_time
+        # If camera is not available, show status image but continue running
+        if not camera_available:
+            # Update status image every 1 second
+            if current_time - last_capture_time >= 1.0:
+                last_capture_time = current_time
             
-            if attendance_time_valid:
-                timeframe_msg = f"Valid attendance: {PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')}"
-            else:
-                timeframe_msg = "Outside attendance hours"
+                if attendance_time_valid:
+                    timeframe_msg = f"Valid attendance: {PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')}"
+                else:
+                    timeframe_msg = "Outside attendance hours"
                 
-            img = create_status_image(
-                "Camera Not Available", 
-                f"ESP32-CAM at {ESP32_IP} not responding",
-                timeframe_msg
-            )
-            cv2.imshow('ESP32-CAM Face Recognition', img)
+                img = create_status_image(
+                    "Camera Not Available", 
+                    f"ESP32-CAM at {ESP32_IP} not responding",
+                    timeframe_msg
+                )
+                cv2.imshow('ESP32-CAM Face Recognition', img)
     
-    # Only capture new image if enough time has passed and camera is available
-    elif current_time - last_capture_time >= capture_interval:
-        # Get image from ESP32-CAM
-        success, img = get_image_from_camera()
-        last_capture_time = current_time
+        # Only capture new image if enough time has passed and camera is available
+        elif current_time - last_capture_time >= capture_interval:
+            # Re-tune the frame size and JPEG quality while nobody is in view
+            tune_reason = CAMERA_TUNE_INTERVAL and not frame_replay and camera_tuner.due(current_time - last_face_time)
+            if tune_reason:
+                camera_tuner.tune(tune_reason)
+
+            # Get image from ESP32-CAM
+            success, img, facesCurFrame, encodesCurFrame = capture_faces()
+            last_capture_time = current_time
         
-        if not success:
-            print(f"Failed to get image from ESP32-CAM at {url}. Retrying...")
-            connection_retry_count += 1
+            if not success:
+                if frame_replay:
+                    print(f"Replayed {frame_replay.count} frames from {frame_replay.path}")
+                    break
+                log.warning("Failed to get image from ESP32-CAM at %s. Retrying...", url)
+                connection_retry_count += 1
+                CAMERA_RETRIES.inc()
             
-            if connection_retry_count >= max_retry_count:
-                print(f"Multiple connection failures ({connection_retry_count}). Attempting to fix connection...")
-                camera_available = test_and_fix_esp32_connection()
-                connection_retry_count = 0
-                if not camera_available:
-                    print("Camera connection could not be fixed. Continuing without camera.")
-                    # Create a blank image to show error message
-                    img = np.zeros((480, 640, 3), dtype=np.uint8)
-                    cv2.putText(img, "ESP32-CAM not available", (80, 220), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    cv2.putText(img, "Press 'q' to exit or 'r' to retry", (80, 260), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    cv2.imshow('ESP32-CAM Face Recognition', img)
+                if connection_retry_count >= max_retry_count:
+                    log.warning("Multiple connection failures (%d). Attempting to fix connection...", connection_retry_count)
+                    camera_available = test_and_fix_esp32_connection()
+                    CAMERA_AVAILABLE.set(int(camera_available))
+                    # The device may have rebooted, so resend the display even if unchanged
+                    feedback.invalidate_oled()
+                    connection_retry_count = 0
+                    if not camera_available:
+                        log.warning("Camera connection could not be fixed. Continuing without camera.")
+                        # Create a blank image to show error message
+                        img = np.zeros((480, 640, 3), dtype=np.uint8)
+                        cv2.putText(img, "ESP32-CAM not available", (80, 220), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                        cv2.putText(img, "Press 'q' to exit or 'r' to retry", (80, 260), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                        cv2.imshow('ESP32-CAM Face Recognition', img)
             
-            tm.sleep(2)
-            continue
+                tm.sleep(2)
+                continue
         
-        # Ensure img is not None before processing
-        if img is None:
-            print("Image is None. Retrying...")
-            tm.sleep(2)
-            continue
-        
-        # Process the image (scale down for faster processing)
-        imgS = cv2.resize(img, (0, 0), None, 0.25, 0.25)
-        imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)
-
-        # Standard HOG-based model
-        facesCurFrame = face_recognition.face_locations(imgS)
+            # Ensure img is not None before processing
+            if img is None:
+                log.warning("Image is None. Retrying...")
+                tm.sleep(2)
+                continue
         
-        # If faces were found, display count
-        face_count = len(facesCurFrame)
-        if face_count > 0:
-            print(f"Found {face_count} faces")
-            last_face_time = current_time
+            # Faces were located (and encoded) by capture_faces; locations are on img
+            FRAMES_PROCESSED.inc()
         
-        # Get face encodings for the found faces
-        encodesCurFrame = face_recognition.face_encodings(imgS, facesCurFrame)
+            # If faces were found, display count
+            face_count = len(facesCurFrame)
+            if face_count > 0:
+                FACES_DETECTED.inc(face_count)
+                log.info("Found %d faces", face_count)
+                last_face_time = current_time
 
-        # Initialize recognized names for this frame
-        recognized_names = []
-        recognized_statuses = []
+            # Initialize recognized names for this frame
+            recognized_names = []
+            recognized_statuses = []
         
-        # Initialize newly_recognized list outside the if block
-        newly_recognized = []  # Track newly recognized faces for buzzer
+            # Initialize newly_recognized list outside the if block
+            newly_recognized = []  # Track newly recognized faces for buzzer
         
-        # Only attempt to mark attendance if in valid time window
-        if attendance_time_valid:
-            # Compare with known faces (active students only)
-            for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
-                # Use face_distance to get the actual distance values
-                face_distances = face_recognition.face_distance(encodeListKnown, encodeFace)
+            # Only attempt to mark attendance if in valid time window
+            if attendance_time_valid:
+                # Compare with known faces (active students only)
+                for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
+                    # Closest known face and its distance
+                    with STAGE_SECONDS.time(stage='match'):
+                        matchIndex, min_distance = match_face(encodeListKnown, encodeFace)
                 
-                # Only consider it a match if the distance is very small (more strict matching)
-                if len(face_distances) > 0:
-                    matchIndex = np.argmin(face_distances)
-                    min_distance = face_distances[matchIndex]
+                    # Only consider it a match if the distance is very small (more strict matching)
+                    if min_distance is not None:
                     
-                    # Only match if the distance is very small (more strict threshold)
-                    if min_distance < 0.4:  # Lower threshold for stricter matching
-                        name = activeClassNames[matchIndex].upper()
-                        recognized_names.append(activeClassNames[matchIndex])
+                        # Only match if the distance is below MATCH_THRESHOLD (stricter than the default)
+                        if matchIndex is not None:
+                            FACE_MATCHES.inc()
+                            if first_recognition is None:
+                                first_recognition = tm.perf_counter() - process_start
+                                log.info("First recognition %.2fs after start", first_recognition)
+                            name = activeClassNames[matchIndex].upper()
+                            recognized_names.append(activeClassNames[matchIndex])
                         
-                        # Get current attendance status from database
-                        conn = sqlite3.connect(db_file)
-                        cursor = conn.cursor()
-                        current_date = datetime.now().strftime('%Y-%m-%d')
-                        cursor.execute(
-                            "SELECT status FROM attendance WHERE student_name=? AND date=?", 
-                            (activeClassNames[matchIndex], current_date)
-                        )
-                        result = cursor.fetchone()
-                        previously_recorded = result is not None
+                            # Get current attendance status from database
+                            conn = sqlite3.connect(db_file)
+                            cursor = conn.cursor()
+                            current_date = datetime.now().strftime('%Y-%m-%d')
+                            cursor.execute(
+                                "SELECT status FROM attendance WHERE student_name=? AND date=?", 
+                                (activeClassNames[matchIndex], current_date)
+                            )
+                            result = cursor.fetchone()
+                            previously_recorded = result is not None
                         
-                        status = result[0] if result else "Not recorded"
-                        # Simplify status messages
-                        if "too late" in status.lower():
-                            status = "Absent"
-                        elif "too early" in status.lower():
-                            status = "Absent"
-                        recognized_statuses.append(status)
-                        conn.close()
+                            status = result[0] if result else "Not recorded"
+                            # Simplify status messages
+                            if "too late" in status.lower():
+                                status = "Absent"
+                            elif "too early" in status.lower():
+                                status = "Absent"
+                            recognized_statuses.append(status)
+                            conn.close()
                         
-                        # Mark face on image
-                        y1, x2, y2, x1 = faceLoc
-                        y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
-                        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 255, 0), cv2.FILLED)
-                        cv2.putText(img, f"{name}", (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
-                        cv2.putText(img, f"Status: {status}", (x1 + 6, y2 + 20), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
+                            # Mark face on image
+                            y1, x2, y2, x1 = faceLoc
+                            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                            cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 255, 0), cv2.FILLED)
+                            cv2.putText(img, f"{name}", (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
+                            cv2.putText(img, f"Status: {status}", (x1 + 6, y2 + 20), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
                         
-                        # Track if this is a newly recognized person to trigger buzzer
-                        new_status = markAttendance(activeClassNames[matchIndex])
-                        if new_status and not previously_recorded:
-                            print(f"New attendance recorded for {activeClassNames[matchIndex]} with status: {new_status}")
-                            # Play buzzer sound
-                            play_buzzer_sound(new_status)
-                            # Add a small delay to ensure sound is played
-                            tm.sleep(0.1)
-                            newly_recognized.append((activeClassNames[matchIndex], new_status))
-                        elif new_status:
-                            print(f"Attendance already recorded for {activeClassNames[matchIndex]} with status: {status}")
+                            # Track if this is a newly recognized person to trigger buzzer
+                            with DB_WRITE_SECONDS.time(method='face'):
+                                new_status = markAttendance(activeClassNames[matchIndex])
+                            if new_status and not previously_recorded:
+                                log.info("New attendance recorded for %s with status: %s", activeClassNames[matchIndex], new_status,
+                                         extra={'key': ('recorded', activeClassNames[matchIndex]),
+                                                'student': activeClassNames[matchIndex], 'status': new_status})
+                                # The buzzer sounds once, for newly_recognized below
+                                newly_recognized.append((activeClassNames[matchIndex], new_status))
+                            elif new_status:
+                                log.info("Attendance already recorded for %s with status: %s", activeClassNames[matchIndex], status,
+                                         extra={'key': ('already', activeClassNames[matchIndex]),
+                                                'student': activeClassNames[matchIndex], 'status': status})
+                            else:
+                                log.info("No new attendance recorded for %s", activeClassNames[matchIndex],
+                                         extra={'key': ('not_recorded', activeClassNames[matchIndex]),
+                                                'student': activeClassNames[matchIndex]})
                         else:
-                            print(f"No new attendance recorded for {activeClassNames[matchIndex]}")
-                    else:
-                        # Face found but not matching any known face closely enough
-                        y1, x2, y2, x1 = faceLoc
-                        y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
-                        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)  # Red rectangle for unknown face
-                        cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 0, 255), cv2.FILLED)
-                        cv2.putText(img, "Unknown", (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
-                        cv2.putText(img, f"Distance: {min_distance:.2f}", (x1 + 6, y2 + 20), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
-        else:
-            # If not in valid time window, just mark faces for display purposes
-            for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
-                matches = face_recognition.compare_faces(encodeListKnown, encodeFace)
-                faceDis = face_recognition.face_distance(encodeListKnown, encodeFace)
+                            # Face found but not matching any known face closely enough
+                            FACE_UNKNOWN.inc()
+                            y1, x2, y2, x1 = faceLoc
+                            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)  # Red rectangle for unknown face
+                            cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 0, 255), cv2.FILLED)
+                            cv2.putText(img, "Unknown", (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
+                            cv2.putText(img, f"Distance: {min_distance:.2f}", (x1 + 6, y2 + 20), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
+            else:
+                # If not in valid time window, just mark faces for display purposes
+                for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
+                    matches = face_recognition.compare_faces(encodeListKnown, encodeFace)
+                    faceDis = face_recognition.face_distance(encodeListKnown, encodeFace)
                 
-                # If we have matches and active students
-                if len(faceDis) > 0:
-                    matchIndex = np.argmin(faceDis)
+                    # If we have matches and active students
+                    if len(faceDis) > 0:
+                        matchIndex = np.argmin(faceDis)
                     
-                    if matches[matchIndex]:
-                        name = activeClassNames[matchIndex].upper()
-                        recognized_names.append(activeClassNames[matchIndex])
-                        recognized_statuses.append("Outside attendance hours")
+                        if matches[matchIndex]:
+                            name = activeClassNames[matchIndex].upper()
+                            recognized_names.append(activeClassNames[matchIndex])
+                            recognized_statuses.append("Outside attendance hours")
                         
-                        # Mark face on image
-                        y1, x2, y2, x1 = faceLoc
-                        y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
-                        cv2.rectangle(img, (x1, y1), (x2, y2), (255, 165, 0), 2)  # Orange color for outside hours
-                        cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (255, 165, 0), cv2.FILLED)
-                        cv2.putText(img, f"{name}", (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
-                        cv2.putText(img, "Outside attendance hours", (x1 + 6, y2 + 20), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
+                            # Mark face on image
+                            y1, x2, y2, x1 = faceLoc
+                            cv2.rectangle(img, (x1, y1), (x2, y2), (255, 165, 0), 2)  # Orange color for outside hours
+                            cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (255, 165, 0), cv2.FILLED)
+                            cv2.putText(img, f"{name}", (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
+                            cv2.putText(img, "Outside attendance hours", (x1 + 6, y2 + 20), cv2.FONT_HERSHEY_COMPLEX, 0.5, (255, 255, 255), 1)
             
-            # If outside the valid time window, add info on the image
-            current_time_str = datetime.now().strftime('%H:%M:%S')
-            cv2.putText(img, f"NO ATTENDANCE: {current_time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            cv2.putText(img, f"Valid hours: {PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                # If outside the valid time window, add info on the image
+                current_time_str = datetime.now().strftime('%H:%M:%S')
+                cv2.putText(img, f"NO ATTENDANCE: {current_time_str}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                cv2.putText(img, f"Valid hours: {PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
-        # Play buzzer sound for any newly recognized individuals
-        for name, status in newly_recognized:
-            print(f"New recognition: {name} with status {status}")
-            play_buzzer_sound(status)
-            # Add a small delay to ensure sound is played
-            tm.sleep(0.1)
+            # Play buzzer sound for any newly recognized individuals
+            for name, status in newly_recognized:
+                log.info("New recognition: %s with status %s", name, status,
+                         extra={'key': ('recognition', name), 'student': name, 'status': status})
+                play_buzzer_sound(status)
         
-        # Update OLED display based on face detection
-        if recognized_names and (current_time - last_face_time < face_display_interval):
-            # Prepare display text with name and status
-            current_time_str = datetime.now().strftime('%H:%M:%S')
-            current_date_str = datetime.now().strftime('%Y-%m-%d')
-            oled_lines = []
+            # Update OLED display based on face detection
+            if recognized_names and (current_time - last_face_time < face_display_interval):
+                # Prepare display text with name and status
+                current_time_str = datetime.now().strftime('%H:%M:%S')
+                current_date_str = datetime.now().strftime('%Y-%m-%d')
+                oled_lines = []
             
-            # Add first recognized person's info
-            if len(recognized_names) > 0:
-                oled_lines.append(f"{recognized_names[0]}")
-                if attendance_time_valid:
-                    oled_lines.append(f"{recognized_statuses[0]}")
-                else:
-                    oled_lines.append("Outside valid hours")
-                oled_lines.append(f"{current_time_str}")
-                oled_lines.append(f"{current_date_str}")
+                # Add first recognized person's info
+                if len(recognized_names) > 0:
+                    oled_lines.append(f"{recognized_names[0]}")
+                    if attendance_time_valid:
+                        oled_lines.append(f"{recognized_statuses[0]}")
+                    else:
+                        oled_lines.append("Outside valid hours")
+                    oled_lines.append(f"{current_time_str}")
+                    oled_lines.append(f"{current_date_str}")
             
-            # Update OLED with smiley face
-            update_oled_display(oled_lines, show_smiley=attendance_time_valid)
-        elif face_count > 0 and not recognized_names and (current_time - last_face_time < face_display_interval):
-            # Update OLED for unrecognized faces
-            update_oled_display([
-                "Unknown face",
-                datetime.now().strftime('%H:%M:%S'),
-                datetime.now().strftime('%Y-%m-%d'),
-                "No match found"
-            ])
-        elif current_time - last_face_time >= face_display_interval:
-            # Show default status when no recent faces
-            if attendance_time_valid:
+                # Update OLED with smiley face
+                update_oled_display(oled_lines, show_smiley=attendance_time_valid)
+            elif face_count > 0 and not recognized_names and (current_time - last_face_time < face_display_interval):
+                # Update OLED for unrecognized faces
                 update_oled_display([
-                    "Face Recognition",
-                    "System Ready",
-                    f"{len(encodeListKnown)} faces",
-                    "in database"
-                ])
-            else:
-                update_oled_display([
-                    "Outside Valid Hours",
-                    f"{PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')}",
-                    "Attendance not",
-                    "being recorded"
+                    "Unknown face",
+                    datetime.now().strftime('%H:%M:%S'),
+                    datetime.now().strftime('%Y-%m-%d'),
+                    "No match found"
                 ])
+            elif current_time - last_face_time >= face_display_interval:
+                # Show default status when no recent faces
+                if attendance_time_valid:
+                    update_oled_display([
+                        "Face Recognition",
+                        "System Ready",
+                        f"{len(encodeListKnown)} faces",
+                        "in database"
+                    ])
+                else:
+                    update_oled_display([
+                        "Outside Valid Hours",
+                        f"{PRESENT_START.strftime('%H:%M')} - {LATE_END.strftime('%H:%M')}",
+                        "Attendance not",
+                        "being recorded"
+                    ])
         
-        # Show the image with face recognition
-        cv2.imshow('ESP32-CAM Face Recognition', img)
+            # Show the image with face recognition
+            cv2.imshow('ESP32-CAM Face Recognition', img)
     
-    # Handle key presses with a longer wait time
-    key = cv2.waitKey(100) & 0xFF  # Wait 100ms for key press
-    if key != 255:  # If a key was pressed
-        print(f"Key pressed: {chr(key)}")
-        if key == ord('q'):
-            print("Quitting...")
-            update_oled_display(["System", "Shutting down...", "Goodbye!", ""], clear=True)
-            running = False
-        elif key == ord('a'):
-            # Process absences - only allow this after the valid attendance window
-            current_datetime = datetime.now()
-            current_time = current_datetime.time()
+        # Handle key presses with a longer wait time
+        key = cv2.waitKey(100) & 0xFF  # Wait 100ms for key press
+        if key != 255:  # If a key was pressed
+            log.debug("Key pressed: %s", chr(key))
+            if key == ord('q'):
+                print("Quitting...")
+                update_oled_display(["System", "Shutting down...", "Goodbye!", ""], clear=True)
+                running = False
+            elif key == ord('a'):
+                # Process absences - only allow this after the valid attendance window
+                current_datetime = datetime.now()
+                current_time = current_datetime.time()
             
-            if current_time <= LATE_END:
-                print(f"Cannot process absences until after {LATE_END.strftime('%H:%M')}.")
-                update_oled_display([
-                    "Cannot process",
-                    "absences yet",
-                    f"Wait until after",
-                    f"{LATE_END.strftime('%H:%M')}"
-                ])
-            else:
-                # Process absences for today
-                print("Processing absent students...")
-                process_absent_students()
-                update_oled_display([
-                    "Absences Processed",
-                    "Students marked",
-                    "as absent",
-                    datetime.now().strftime('%H:%M:%S')
-                ])
-        elif key == ord('r'):
-            print("Attempting to reconnect to camera and refresh encodings...")
-            # Try to fix camera connection first
-            camera_available = test_and_fix_esp32_connection()
-            if camera_available:
-                update_oled_display(["Refreshing", "student database", "Please wait...", ""])
-                # Refresh encodings if camera is available
-                encodeListKnown, activeClassNames = findEncodings(images, classNames)
-                print(f'Re-encoding complete. {len(encodeListKnown)} active faces encoded.')
-                update_oled_display(["Refresh complete", f"{len(encodeListKnown)} faces", "encoded", ""])
-            else:
-                update_oled_display(["Camera unavailable", "Continuing without", "face recognition", ""])
-        elif key == ord('d'):
-            detailed_display = not detailed_display
-            if detailed_display:
-                update_oled_display(["Detailed display", "ENABLED", "", ""])
-            else:
-                update_oled_display(["Detailed display", "DISABLED", "", ""])
-        elif key == ord('c'):
-            print("Clearing OLED display...")
-            update_oled_display([], clear=True)
-        elif key == ord('s'):
-            print("Showing system stats...")
-            # Get current date and time
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            current_time = datetime.now().strftime('%H:%M:%S')
+                if current_time <= LATE_END:
+                    print(f"Cannot process absences until after {LATE_END.strftime('%H:%M')}.")
+                    update_oled_display([
+                        "Cannot process",
+                        "absences yet",
+                        f"Wait until after",
+                        f"{LATE_END.strftime('%H:%M')}"
+                    ])
+                else:
+                    # Process absences for today
+                    print("Processing absent students...")
+                    process_absent_students()
+                    update_oled_display([
+                        "Absences Processed",
+                        "Students marked",
+                        "as absent",
+                        datetime.now().strftime('%H:%M:%S')
+                    ])
+            elif key == ord('r'):
+                print("Attempting to reconnect to camera and refresh encodings...")
+                # Try to fix camera connection first
+                camera_available = test_and_fix_esp32_connection()
+                CAMERA_AVAILABLE.set(int(camera_available))
+                feedback.invalidate_oled()
+                if camera_available:
+                    update_oled_display(["Refreshing", "student database", "Please wait...", ""])
+                    # Refresh encodings if camera is available
+                    encodeListKnown, activeClassNames = findEncodings(references)
+                    KNOWN_FACES.set(len(encodeListKnown))
+                    print(f'Re-encoding complete. {len(encodeListKnown)} active faces encoded.')
+                    update_oled_display(["Refresh complete", f"{len(encodeListKnown)} faces", "encoded", ""])
+                else:
+                    update_oled_display(["Camera unavailable", "Continuing without", "face recognition", ""])
+            elif key == ord('d'):
+                detailed_display = not detailed_display
+                if detailed_display:
+                    update_oled_display(["Detailed display", "ENABLED", "", ""])
+                else:
+                    update_oled_display(["Detailed display", "DISABLED", "", ""])
+            elif key == ord('c'):
+                print("Clearing OLED display...")
+                update_oled_display([], clear=True)
+            elif key == ord('s'):
+                print("Showing system stats...")
+                # Get current date and time
+                current_date = datetime.now().strftime('%Y-%m-%d')
+                current_time = datetime.now().strftime('%H:%M:%S')
             
-            # Connect to database to get attendance stats
-            conn = sqlite3.connect(db_file)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM attendance WHERE date=? AND status='present'", (current_date,))
-            present_count = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM attendance WHERE date=? AND status='late'", (current_date,))
-            late_count = cursor.fetchone()[0]
-            conn.close()
+                # Connect to database to get attendance stats
+                conn = sqlite3.connect(db_file)
+                cursor = conn.cursor()
+                cursor.execute("SELECT COUNT(*) FROM attendance WHERE date=? AND status='present'", (current_date,))
+                present_count = cursor.fetchone()[0]
+                cursor.execute("SELECT COUNT(*) FROM attendance WHERE date=? AND status='late'", (current_date,))
+                late_count = cursor.fetchone()[0]
+                conn.close()
             
-            # Update OLED with stats
-            update_oled_display([
-                f"Date: {current_date}",
-                f"Time: {current_time}",
-                f"Present: {present_count}",
-                f"Late: {late_count}"
-            ])
-        elif key == ord('f'):
-            print("Scanning RFID card...")
-            if camera_available:
-                # Get student name from RFID scan
-                try:
-                    # Try to get student name from ESP32-CAM
-                    response = requests.get(f'http://{ESP32_IP}/rfid/scan', timeout=5)
-                    if response.status_code == 200:
-                        data = response.json()
-                        if 'name' in data:
-                            student_name = data['name']
-                            markRfidAttendance(student_name)
+                # Update OLED with stats
+                update_oled_display([
+                    f"Date: {current_date}",
+                    f"Time: {current_time}",
+                    f"Present: {present_count}",
+                    f"Late: {late_count}"
+                ])
+            elif key == ord('f'):
+                if camera_available:
+                    # The scan waits for a card on a background thread; the tap is recorded by the RFID worker
+                    if rfid_listener.scan_once():
+                        print("Waiting for an RFID card...")
+                        update_oled_display(["RFID Attendance", "Tap your card", "", ""])
+                    else:
+                        print("RFID cards are already being read in the background")
+                else:
+                    print("Cannot scan RFID - ESP32-CAM not available")
+                    img = create_status_image(
+                        "RFID Not Available", 
+                        "ESP32-CAM connection required", 
+                        "Press 'r' to reconnect camera"
+                    )
+                    cv2.imshow('ESP32-CAM Face Recognition', img)
+            elif key == ord('l'):
+                print("Listing RFID cards...")
+                if camera_available:
+                    try:
+                        # Get list of registered RFID cards from ESP32-CAM
+                        response = requests.get(f'http://{ESP32_IP}/rfid/list', timeout=5)
+                        if response.status_code == 200:
+                            data = response.json()
+                            if 'cards' in data and data['cards']:
+                                print("Registered RFID cards:")
+                                for i, card in enumerate(data['cards']):
+                                    print(f"{i+1}. {card.get('name', 'Unknown')} - {card.get('uid', 'No ID')}")
+                            
+                                # Display first few cards on OLED
+                                cards = data['cards'][:4]  # Limit to 4 cards for OLED display
+                                oled_lines = ["RFID Cards:"]
+                                for card in cards:
+                                    oled_lines.append(f"{card.get('name', 'Unknown')}")
+                                update_oled_display(oled_lines)
+                            else:
+                                print("No RFID cards registered")
+                                update_oled_display([
+                                    "No RFID Cards",
+                                    "Registered",
+                                    "Use 'n' to add",
+                                    "new cards"
+                                ])
                         else:
-                            print("No student name found in RFID response")
+                            print(f"Failed to list RFID cards. Status code: {response.status_code}")
                             update_oled_display([
                                 "RFID Error",
-                                "No student name",
-                                "found",
-                                "Try again"
+                                f"Status: {response.status_code}",
+                                "Check ESP32-CAM",
+                                "firmware"
                             ])
-                    else:
-                        print(f"RFID scan failed with status code: {response.status_code}")
+                    except Exception as e:
+                        print(f"Error listing RFID cards: {e}")
                         update_oled_display([
                             "RFID Error",
-                            f"Status: {response.status_code}",
-                            "Check ESP32-CAM",
-                            "firmware"
+                            "Connection failed",
+                            str(e)[:16],
+                            "Try again"
                         ])
-                except Exception as e:
-                    print(f"Error scanning RFID card: {e}")
-                    update_oled_display([
-                        "RFID Error",
-                        "Connection failed",
-                        str(e)[:16],
-                        "Try again"
-                    ])
-            else:
-                print("Cannot scan RFID - ESP32-CAM not available")
-                img = create_status_image(
-                    "RFID Not Available", 
-                    "ESP32-CAM connection required", 
-                    "Press 'r' to reconnect camera"
-                )
-                cv2.imshow('ESP32-CAM Face Recognition', img)
-        elif key == ord('l'):
-            print("Listing RFID cards...")
-            if camera_available:
-                try:
-                    # Get list of registered RFID cards from ESP32-CAM
-                    response = requests.get(f'http://{ESP32_IP}/rfid/list', timeout=5)
-                    if response.status_code == 200:
-                        data = response.json()
-                        if 'cards' in data and data['cards']:
-                            print("Registered RFID cards:")
-                            for i, card in enumerate(data['cards']):
-                                print(f"{i+1}. {card.get('name', 'Unknown')} - {card.get('uid', 'No ID')}")
-                            
-                            # Display first few cards on OLED
-                            cards = data['cards'][:4]  # Limit to 4 cards for OLED display
-                            oled_lines = ["RFID Cards:"]
-                            for card in cards:
-                                oled_lines.append(f"{card.get('name', 'Unknown')}")
-                            update_oled_display(oled_lines)
-                        else:
-                            print("No RFID cards registered")
+                else:
+                    print("Cannot list RFID cards - ESP32-CAM not available")
+                    img = create_status_image(
+                        "RFID Not Available", 
+                        "ESP32-CAM connection required", 
+                        "Press 'r' to reconnect camera"
+                    )
+                    cv2.imshow('ESP32-CAM Face Recognition', img)
+            elif key == ord('n'):
+                print("Adding new RFID card...")
+                if camera_available:
+                    try:
+                        # First, get the student name
+                        student_name = input("Enter student name: ")
+                        if not student_name:
+                            print("No student name provided")
                             update_oled_display([
-                                "No RFID Cards",
-                                "Registered",
-                                "Use 'n' to add",
-                                "new cards"
+                                "Add RFID Card",
+                                "No name provided",
+                                "Operation",
+                                "cancelled"
                             ])
-                    else:
-                        print(f"Failed to list RFID cards. Status code: {response.status_code}")
-                        update_oled_display([
-                            "RFID Error",
-                            f"Status: {response.status_code}",
-                            "Check ESP32-CAM",
-                            "firmware"
-                        ])
-                except Exception as e:
-                    print(f"Error listing RFID cards: {e}")
-                    update_oled_display([
-                        "RFID Error",
-                        "Connection failed",
-                        str(e)[:16],
-                        "Try again"
-                    ])
-            else:
-                print("Cannot list RFID cards - ESP32-CAM not available")
-                img = create_status_image(
-                    "RFID Not Available", 
-                    "ESP32-CAM connection required", 
-                    "Press 'r' to reconnect camera"
-                )
-                cv2.imshow('ESP32-CAM Face Recognition', img)
-        elif key == ord('n'):
-            print("Adding new RFID card...")
-            if camera_available:
-                try:
-                    # First, get the student name
-                    student_name = input("Enter student name: ")
-                    if not student_name:
-                        print("No student name provided")
-                        update_oled_display([
-                            "Add RFID Card",
-                            "No name provided",
-                            "Operation",
-                            "cancelled"
-                        ])
-                        continue
+                            continue
                     
-                    # Then, scan the RFID card
-                    print(f"Please scan RFID card for {student_name}...")
-                    update_oled_display([
-                        "Add RFID Card",
-                        f"Scan card for:",
-                        student_name,
-                        "Waiting..."
-                    ])
-                    
-                    # First scan to get the UID
-                    scan_response = requests.get(f'http://{ESP32_IP}/rfid/scan', timeout=10)
-                    if scan_response.status_code != 200:
-                        print("Failed to scan RFID card")
-                        update_oled_display([
-                            "RFID Error",
-                            "Scan failed",
-                            "Try again",
-                            ""
-                        ])
-                        continue
-                    
-                    scan_data = scan_response.json()
-                    if 'uid' not in scan_data:
-                        print("No UID in scan response")
+                        # The card is read and registered in the background, so the camera keeps running meanwhile
+                        wait_for_rfid_card("Add RFID Card", student_name, add_device_rfid_card)
+                    except Exception as e:
+                        print(f"Error adding RFID card: {e}")
                         update_oled_display([
                             "RFID Error",
-                            "No UID found",
-                            "Try again",
-                            ""
+                            "Connection failed",
+                            str(e)[:16],
+                            "Try again"
                         ])
-                        continue
-                    
-                    # Register the card with the ESP32-CAM
-                    register_data = {
-                        'action': 'add',
-                        'name': student_name,
-                        'uid': scan_data['uid']
-                    }
-                    
-                    response = requests.post(
-                        f'http://{ESP32_IP}/rfid',
-                        json=register_data,
-                        timeout=10
+                else:
+                    print("Cannot add RFID cards - ESP32-CAM not available")
+                    img = create_status_image(
+                        "RFID Not Available", 
+                        "ESP32-CAM connection required", 
+                        "Press 'r' to reconnect camera"
                     )
+                    cv2.imshow('ESP32-CAM Face Recognition', img)
+            elif key == ord('p'):
+                print(loop_profiler.request('cprofile'))
+            elif key == ord('m'):
+                print(loop_profiler.request('tracemalloc'))
+            elif key == ord('k'):
+                print("Linking RFID card to student...")
+                if camera_available:
+                    try:
+                        # First, get the student name
+                        student_name = input("Enter student name to link card: ")
+                        if not student_name:
+                            print("No student name provided")
+                            update_oled_display([
+                                "Link RFID Card",
+                                "No name provided",
+                                "Operation",
+                                "cancelled"
+                            ])
+                            continue
                     
-                    if response.status_code == 200:
-                        print(f"RFID card registered for {student_name}")
-                        update_oled_display([
-                            "RFID Card Added",
-                            f"For: {student_name}",
-                            "Success!",
-                            ""
-                        ])
-                    else:
-                        print(f"Failed to register RFID card. Status code: {response.status_code}")
-                        update_oled_display([
-                            "RFID Error",
-                            f"Status: {response.status_code}",
-                            "Check ESP32-CAM",
-                            "firmware"
-                        ])
-                except Exception as e:
-                    print(f"Error adding RFID card: {e}")
-                    update_oled_display([
-                        "RFID Error",
-                        "Connection failed",
-                        str(e)[:16],
-                        "Try again"
-                    ])
-            else:
-                print("Cannot add RFID cards - ESP32-CAM not available")
-                img = create_status_image(
-                    "RFID Not Available", 
-                    "ESP32-CAM connection required", 
-                    "Press 'r' to reconnect camera"
-                )
-                cv2.imshow('ESP32-CAM Face Recognition', img)
-        elif key == ord('k'):
-            print("Linking RFID card to student...")
-            if camera_available:
-                try:
-                    # First, get the student name
-                    student_name = input("Enter student name to link card: ")
-                    if not student_name:
-                        print("No student name provided")
-                        update_oled_display([
-                            "Link RFID Card",
-                            "No name provided",
-                            "Operation",
-                            "cancelled"
-                        ])
-                        continue
-                    
-                    # Then, scan the RFID card
-                    print(f"Please scan RFID card for {student_name}...")
-                    update_oled_display([
-                        "Link RFID Card",
-                        f"Scan card for:",
-                        student_name,
-                        "Waiting..."
-                    ])
-                    
-                    # Scan to get the UID
-                    scan_response = requests.get(f'http://{ESP32_IP}/rfid/scan', timeout=10)
-                    if scan_response.status_code != 200:
-                        print("Failed to scan RFID card")
-                        update_oled_display([
-                            "RFID Error",
-                            "Scan failed",
-                            "Try again",
-                            ""
-                        ])
-                        continue
-                    
-                    scan_data = scan_response.json()
-                    if 'uid' not in scan_data:
-                        print("No UID in scan response")
-                        update_oled_display([
-                            "RFID Error",
-                            "No UID found",
-                            "Try again",
-                            ""
-                        ])
-                        continue
-                    
-                    # Convert UID array to string
-                    card_uid = '-'.join([f"{b:02x}" for b in scan_data['uid']])
-                    
-                    # Link the card to the student
-                    if link_rfid_card(student_name, card_uid):
-                        print(f"RFID card linked to {student_name}")
-                        update_oled_display([
-                            "RFID Card Linked",
-                            f"To: {student_name}",
-                            "Success!",
-                            ""
-                        ])
-                    else:
-                        print("Failed to link RFID card")
+                        # The card is read and linked in the background, so the camera keeps running meanwhile
+                        wait_for_rfid_card("Link RFID Card", student_name, link_student_rfid_card)
+                    except Exception as e:
+                        print(f"Error linking RFID card: {e}")
                         update_oled_display([
                             "RFID Error",
-                            "Link failed",
-                            "Check student name",
-                            "and try again"
+                            "Connection failed",
+                            str(e)[:16],
+                            "Try again"
                         ])
-                except Exception as e:
-                    print(f"Error linking RFID card: {e}")
-                    update_oled_display([
-                        "RFID Error",
-                        "Connection failed",
-                        str(e)[:16],
-                        "Try again"
-                    ])
-            else:
-                print("Cannot link RFID cards - ESP32-CAM not available")
-                img = create_status_image(
-                    "RFID Not Available", 
-                    "ESP32-CAM connection required", 
-                    "Press 'r' to reconnect camera"
-                )
-                cv2.imshow('ESP32-CAM Face Recognition', img)
+                else:
+                    print("Cannot link RFID cards - ESP32-CAM not available")
+                    img = create_status_image(
+                        "RFID Not Available", 
+                        "ESP32-CAM connection required", 
+                        "Press 'r' to reconnect camera"
+                    )
+                    cv2.imshow('ESP32-CAM Face Recognition', img)
 
-# Clean up
-cv2.destroyAllWindows()
-print("Program ended")
+    # Clean up
+    loop_profiler.finish()
+    rfid_listener.stop()
+    rfid_sync.stop()
+    feedback.stop()
+    cv2.destroyAllWindows()
+    if capture_policy.summary():
+        print(capture_policy.summary())
+    if frame_recorder:
+        frame_recorder.close()
+        print(f"Recorded {frame_recorder.frames} frames to {frame_recorder.path}")
+    print("Program ended")
 
-# Function to mark attendance with RFID
-def mark_rfid_attendance():
-    """Mark attendance using RFID reader"""
-    if not camera_available:
-        print("Cannot mark RFID attendance - ESP32-CAM not available")
-        update_oled_display([
-            "RFID Unavailable", 
-            "Camera not connected",
-            "Reconnect ESP32-CAM",
-            "Try again"
-        ])
-        return False
-        
-    rfid_attendance_url = f'http://{ESP32_IP}/rfid/scan'
-    
-    try:
-        print("Checking for RFID attendance...")
-        response = requests.get(rfid_attendance_url, timeout=5)
-        
-        if response.status_code == 200:
-            print("RFID scan successful")
-            
-            # Get student name from the response
-            try:
-                data = response.json()
-                if 'name' in data:
-                    student_name = data['name']
-                    attendance_status = markRfidAttendance(student_name)
-                    if attendance_status:
-                        print(f"RFID attendance recorded for {student_name} with status: {attendance_status}")
-                        return True
-                    else:
-                        print(f"No new attendance recorded for {student_name}")
-                        return False
-                else:
-                    print("No student name found in RFID response")
-                    update_oled_display([
-                        "RFID Error", 
-                        "No student name",
-                        "found",
-                        "Try again"
-                    ])
-                    return False
-            except Exception as e:
-                print(f"Error parsing RFID response: {str(e)}")
-                update_oled_display([
-                    "RFID Error", 
-                    "Invalid response",
-                    str(e)[:16],
-                    "Try again"
-                ])
-                return False
-        else:
-            print(f"Failed to scan RFID. Status code: {response.status_code}")
-            update_oled_display([
-                "RFID Error", 
-                f"Status: {response.status_code}",
-                "Check ESP32-CAM",
-                "firmware"
-            ])
-            return False
-    except Exception as e:
-        print(f"Error with RFID scan: {str(e)}")
-        update_oled_display([
-            "RFID Error", 
-            "Connection failed",
-            str(e)[:16],
-            "Check connection"
-        ])
-        return False
- 
+if __name__ == "__main__":
+    main()
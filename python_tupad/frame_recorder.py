@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import struct
+import argparse
+
+import requests
+
+# Container layout: MAGIC, then one record per frame of
+# RECORD_HEADER (capture timestamp as float64 seconds, JPEG length as uint32) + raw JPEG bytes.
+# Frames are only ever appended; a record cut short by a crash is ignored on read and cut off
+# before the next frames are appended.
+MAGIC = b'TUPADFR1'
+RECORD_HEADER = struct.Struct('<dI')
+
+# Defaults for the record command
+CAPTURE_URL = 'http://192.168.0.156/capture'
+CAPTURE_INTERVAL = 0.5  # Same pacing as the recognition loop
+
+class FrameRecorder:
+    """Append JPEG frames and their capture timestamps to a recording file"""
+
+    def __init__(self, path):
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            with open(path, 'r+b') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a frame recording")
+                # Frames appended after a torn record would be unreadable, so drop it first
+                f.truncate(complete_length(f))
+        self.file = open(path, 'ab')
+        if new_file:
+            self.file.write(MAGIC)
+        self.frames = 0
+
+    def write(self, jpeg, timestamp=None):
+        self.file.write(RECORD_HEADER.pack(time.time() if timestamp is None else timestamp, len(jpeg)))
+        self.file.write(jpeg)
+        self.file.flush()
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def complete_length(f):
+    """Offset just past the last complete record, read from a file positioned after MAGIC"""
+    end = f.seek(0, os.SEEK_END)
+    offset = len(MAGIC)
+    while True:
+        f.seek(offset)
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return offset
+        _, length = RECORD_HEADER.unpack(header)
+        if offset + RECORD_HEADER.size + length > end:
+            return offset
+        offset += RECORD_HEADER.size + length
+
+def read_frames(path):
+    """Yield (timestamp, jpeg_bytes) for every complete frame in a recording"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, length = RECORD_HEADER.unpack(header)
+            jpeg = f.read(length)
+            if len(jpeg) < length:
+                return
+            yield timestamp, jpeg
+
+class ReplaySource:
+    """
+    Play a recording back as a camera.
+
+    With speed=1.0 frames are released at the recorded pace (2.0 is twice
+    as fast) and with speed=None as fast as they are read. read() returns
+    (success, jpeg_bytes, timestamp) and (False, None, None) once the
+    recording is exhausted, unless loop is set.
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.frames = read_frames(path)
+        self.first_timestamp = None
+        self.started = None
+        self.count = 0
+
+    def read(self):
+        try:
+            timestamp, jpeg = next(self.frames)
+        except StopIteration:
+            if not self.loop or self.count == 0:
+                return False, None, None
+            self.frames = read_frames(self.path)
+            self.first_timestamp = None
+            timestamp, jpeg = next(self.frames)
+
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+            self.started = time.perf_counter()
+        elif self.speed:
+            due = self.started + (timestamp - self.first_timestamp) / self.speed
+            pause = due - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+
+        self.count += 1
+        return True, jpeg, timestamp
+
+    def __iter__(self):
+        while True:
+            success, jpeg, timestamp = self.read()
+            if not success:
+                return
+            yield timestamp, jpeg
+
+def record(url, output, interval=CAPTURE_INTERVAL, duration=None, max_frames=None):
+    """Poll the camera's /capture endpoint and append every frame to output"""
+    started = time.time()
+    failures = 0
+    with FrameRecorder(output) as recorder:
+        print(f"Recording {url} to {output} every {interval}s. Press Ctrl+C to stop.")
+        try:
+            while (duration is None or time.time() - started < duration) and \
+                    (max_frames is None or recorder.frames < max_frames):
+                tick = time.time()
+                try:
+                    response = requests.get(url, timeout=5)
+                    if response.status_code == 200:
+                        recorder.write(response.content, tick)
+                    else:
+                        failures += 1
+                except requests.exceptions.RequestException:
+                    failures += 1
+                time.sleep(max(0.0, interval - (time.time() - tick)))
+        except KeyboardInterrupt:
+            pass
+        print(f"Recorded {recorder.frames} frames ({failures} failed captures)")
+    return recorder.frames
+
+def recording_info(path):
+    count, size, first, last = 0, 0, None, None
+    for timestamp, jpeg in read_frames(path):
+        count += 1
+        size += len(jpeg)
+        first = timestamp if first is None else first
+        last = timestamp
+    if not count:
+        print(f"{path}: no frames")
+        return
+    span = last - first
+    print(f"{path}: {count} frames, {span:.1f}s "
+          f"({(count - 1) / span if span else 0:.2f} fps), {size / count / 1024:.1f} KiB per frame")
+    print(f"From {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first))} "
+          f"to {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last))}")
+
+def export_frames(path, output_dir):
+    """Write every frame as <index>_<timestamp>.jpg"""
+    os.makedirs(output_dir, exist_ok=True)
+    count = 0
+    for timestamp, jpeg in read_frames(path):
+        with open(os.path.join(output_dir, f"{count:06d}_{timestamp:.3f}.jpg"), 'wb') as f:
+            f.write(jpeg)
+        count += 1
+    print(f"Exported {count} frames to {output_dir}")
+
+def import_frames(input_dir, output, interval=CAPTURE_INTERVAL):
+    """Build a recording from a folder of JPEGs, spaced interval seconds apart"""
+    names = sorted(n for n in os.listdir(input_dir) if n.lower().endswith(('.jpg', '.jpeg')))
+    timestamp = time.time()
+    with FrameRecorder(output) as recorder:
+        for name in names:
+            with open(os.path.join(input_dir, name), 'rb') as f:
+                recorder.write(f.read(), timestamp)
+            timestamp += interval
+    print(f"Imported {len(names)} frames into {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record camera frames and inspect recordings")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="Record frames from the camera")
+    record_parser.add_argument('output')
+    record_parser.add_argument('--url', default=CAPTURE_URL, help="Camera /capture URL")
+    record_parser.add_argument('--interval', type=float, default=CAPTURE_INTERVAL, help="Seconds between captures")
+    record_parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    record_parser.add_argument('--frames', type=int, help="Stop after this many frames")
+
+    info_parser = subparsers.add_parser('info', help="Show frame count and timing of a recording")
+    info_parser.add_argument('recording')
+
+    export_parser = subparsers.add_parser('export', help="Write a recording's frames as JPEG files")
+    export_parser.add_argument('recording')
+    export_parser.add_argument('output_dir')
+
+    import_parser = subparsers.add_parser('import', help="Build a recording from a folder of JPEG files")
+    import_parser.add_argument('input_dir')
+    import_parser.add_argument('output')
+    import_parser.add_argument('--interval', type=float, default=CAPTURE_INTERVAL)
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'record':
+            record(args.url, args.output, args.interval, args.duration, args.frames)
+        elif args.command == 'info':
+            recording_info(args.recording)
+        elif args.command == 'export':
+            export_frames(args.recording, args.output_dir)
+        elif args.command == 'import':
+            import_frames(args.input_dir, args.output, args.interval)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,171 @@
+import os
+import sys
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+import attendance_db
+from attendance_db import PRESENT_START, PRESENT_END, LATE_END, ALLOWED_DAYS, init_database
+
+# Defaults for a university-sized roster
+STUDENTS = 2000
+TERMS = 2
+WEEKS_PER_TERM = 18
+BREAK_WEEKS = 3
+CARD_RATIO = 0.8        # Share of students with a linked RFID card
+RFID_SHARE = 0.3        # Share of card holders' check-ins done by card
+
+# Attendance profiles: (share of students, absent probability, late probability)
+PROFILES = [
+    (0.70, 0.03, 0.10),   # Regular attenders
+    (0.22, 0.08, 0.22),   # Average
+    (0.08, 0.22, 0.30),   # At risk of being dropped
+]
+
+FIRST_NAMES = ['Arlon', 'Eadric', 'Jarl', 'Jhuvic', 'Lanz', 'Maria', 'Jose', 'Angela', 'Mark', 'Kristine',
+               'John', 'Patricia', 'Carlo', 'Bea', 'Miguel', 'Sofia', 'Rafael', 'Camille', 'Paolo', 'Andrea',
+               'Gabriel', 'Nicole', 'Joshua', 'Alyssa', 'Christian', 'Jasmine', 'Daniel', 'Erika', 'Kevin', 'Lea']
+LAST_NAMES = ['Ylasco', 'Belen', 'Madamba', 'Esteves', 'Acuna', 'Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia',
+              'Mendoza', 'Torres', 'Flores', 'Villanueva', 'Ramos', 'Castillo', 'Aquino', 'Navarro', 'Dela Cruz',
+              'Gonzales', 'Lopez', 'Rivera', 'Domingo', 'Salazar', 'Pascual', 'Valdez', 'Mercado', 'Soriano']
+
+def _student_names(count, rng):
+    names = set()
+    while len(names) < count:
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}. {rng.choice(LAST_NAMES)}"
+        if name in names:
+            name = f"{name} {len(names)}"
+        names.add(name)
+    return sorted(names)
+
+def _clock(start, end, rng):
+    """Random HH:MM:SS between two datetime.time values"""
+    low = start.hour * 3600 + start.minute * 60
+    high = end.hour * 3600 + end.minute * 60
+    seconds = rng.randint(low, high)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def class_days(terms, weeks_per_term, break_weeks, last_day):
+    """Return [(term, [dates])] for consecutive terms ending on last_day, on ALLOWED_DAYS only"""
+    span = timedelta(weeks=weeks_per_term)
+    step = timedelta(weeks=weeks_per_term + break_weeks)
+    first_start = last_day - span * terms - timedelta(weeks=break_weeks) * (terms - 1) + timedelta(days=1)
+    result = []
+    for term in range(terms):
+        start = first_start + step * term
+        dates = []
+        for offset in range(span.days):
+            day = start + timedelta(days=offset)
+            if day.weekday() in ALLOWED_DAYS:
+                dates.append(day.strftime('%Y-%m-%d'))
+        result.append((f"term-{term + 1}", dates))
+    return result
+
+def generate_dataset(output, students=STUDENTS, terms=TERMS, weeks_per_term=WEEKS_PER_TERM, seed=42):
+    """
+    Create a synthetic attendance database for benchmarking.
+
+    Each student gets an attendance profile. Every class day they are marked
+    Present, Late or absent with the profile's probabilities, at times inside
+    the real PRESENT/LATE windows. Absences count towards the same
+    three-consecutive-absences drop rule the recognition script applies, and
+    dropped students get no further records.
+    """
+    if os.path.exists(output):
+        print(f"{output} already exists; remove it or choose another --output.")
+        return None
+
+    rng = random.Random(seed)
+    attendance_db.db_file = output
+    init_database()
+
+    names = _student_names(students, rng)
+    weights = [share for share, _, _ in PROFILES]
+    profiles = {name: rng.choices(PROFILES, weights)[0] for name in names}
+    cards = {name: ':'.join(f"{rng.randrange(256):02X}" for _ in range(4))
+             for name in names if rng.random() < CARD_RATIO}
+
+    absent_count = dict.fromkeys(names, 0)
+    consecutive = dict.fromkeys(names, 0)
+    dropped = set()
+    schedule = class_days(terms, weeks_per_term, BREAK_WEEKS, datetime.now() - timedelta(days=1))
+
+    conn = sqlite3.connect(output)
+    try:
+        cursor = conn.cursor()
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.executemany(
+            "INSERT INTO students (name, image_path, status, last_updated) VALUES (?, ?, 'active', ?)",
+            [(name, os.path.join('image_folder', f"{name}.jpg"), now) for name in names]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO rfid_cards (card_uid, student_name) VALUES (?, ?)",
+            [(uid, name) for name, uid in cards.items()]
+        )
+
+        records = 0
+        for term, dates in schedule:
+            for date in dates:
+                rows = []
+                for name in names:
+                    if name in dropped:
+                        continue
+                    _, p_absent, p_late = profiles[name]
+                    roll = rng.random()
+                    if roll < p_absent:
+                        rows.append((name, date, '00:00:00', 'absent', 'face'))
+                        absent_count[name] += 1
+                        consecutive[name] += 1
+                        if consecutive[name] >= 3:
+                            dropped.add(name)
+                        continue
+
+                    consecutive[name] = 0
+                    method = 'rfid' if name in cards and rng.random() < RFID_SHARE else 'face'
+                    if roll < p_absent + p_late:
+                        rows.append((name, date, _clock(PRESENT_END, LATE_END, rng), 'Late', method))
+                    else:
+                        rows.append((name, date, _clock(PRESENT_START, PRESENT_END, rng), 'Present', method))
+                cursor.executemany(
+                    "INSERT INTO attendance (student_name, date, time, status, method) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                records += len(rows)
+
+        cursor.executemany(
+            "UPDATE students SET absent_count = ?, consecutive_absences = ?, status = ? WHERE name = ?",
+            [(absent_count[name], consecutive[name], 'dropped' if name in dropped else 'active', name)
+             for name in names]
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return None
+    finally:
+        conn.close()
+
+    days = sum(len(dates) for _, dates in schedule)
+    print(f"Generated {output}: {students} students ({len(dropped)} dropped), {len(cards)} RFID cards, "
+          f"{terms} terms / {days} class days, {records} attendance records")
+    return {
+        'students': students,
+        'terms': [{'term': term, 'start': dates[0], 'end': dates[-1], 'days': len(dates)}
+                  for term, dates in schedule if dates],
+        'class_days': days,
+        'records': records,
+        'rfid_cards': len(cards),
+        'dropped': len(dropped),
+        'seed': seed,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic attendance database for benchmarking")
+    parser.add_argument('--output', default='attendance_synthetic.db', help="Database file to create")
+    parser.add_argument('--students', type=int, default=STUDENTS)
+    parser.add_argument('--terms', type=int, default=TERMS)
+    parser.add_argument('--weeks', type=int, default=WEEKS_PER_TERM, help="Weeks per term")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sys.exit(0 if generate_dataset(args.output, args.students, args.terms, args.weeks, args.seed) else 1)
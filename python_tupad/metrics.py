@@ -0,0 +1,267 @@
+import sys
+import time
+import bisect
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Defaults for the local metrics endpoint
+HOST = '127.0.0.1'
+PORT = 9108
+
+# Histogram buckets in seconds, from a fast SQLite write up to a stalled camera request
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base for a named metric with optional label names; one value per label combination"""
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        if not self.label_names:
+            # Unlabelled metrics are exported as zero before their first update
+            self.values[()] = self._initial()
+
+    def _initial(self):
+        return 0
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_label_text(self.label_names, key)} {_number(value)}" for key, value in items]
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets, plus their sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labels)
+
+    def _initial(self):
+        # Per-bucket (non-cumulative) counts with a final +Inf slot, sum, count
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = self._initial()
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def get(self, **labels):
+        """(count, sum) for one label combination"""
+        state = self.values.get(self._key(labels))
+        return (state[2], state[1]) if state else (0, 0.0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self.values.items())
+        lines = []
+        names = self.label_names + ('le',)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_label_text(names, key + (_number(bound),))} {cumulative}")
+            labels = _label_text(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class _Timer:
+    """Context manager that observes the elapsed wall-clock seconds"""
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+# Registry shared by the recognition script and its helper modules
+REGISTRY = Registry()
+
+FRAMES_CAPTURED = REGISTRY.counter('tupad_frames_captured_total', "Frames received from the camera or a replay")
+FRAMES_DROPPED = REGISTRY.counter('tupad_frames_dropped_total', "Frames lost to capture or decode failures",
+                                  ('reason',))
+FRAMES_PROCESSED = REGISTRY.counter('tupad_frames_processed_total', "Frames run through face recognition")
+FACES_DETECTED = REGISTRY.counter('tupad_faces_detected_total', "Faces located in processed frames")
+FACE_MATCHES = REGISTRY.counter('tupad_face_matches_total', "Faces matched to a known student")
+FACE_UNKNOWN = REGISTRY.counter('tupad_face_unknown_total', "Faces that matched no known student closely enough")
+STAGE_SECONDS = REGISTRY.histogram('tupad_stage_seconds', "Time spent in each recognition stage", ('stage',))
+DB_WRITE_SECONDS = REGISTRY.histogram('tupad_db_write_seconds', "Time to record one check-in", ('method',))
+CAMERA_RETRIES = REGISTRY.counter('tupad_camera_retries_total', "Capture retries after a failed frame")
+DEVICE_REQUESTS = REGISTRY.histogram('tupad_device_request_seconds', "ESP32-CAM request latency", ('endpoint',))
+DEVICE_FAILURES = REGISTRY.counter('tupad_device_failures_total', "Failed ESP32-CAM requests",
+                                   ('endpoint', 'reason'))
+FEEDBACK_SKIPPED = REGISTRY.counter('tupad_feedback_skipped_total', "OLED and buzzer commands not sent to the device",
+                                    ('kind', 'reason'))
+FEEDBACK_QUEUE = REGISTRY.gauge('tupad_feedback_queue', "Buzzer commands waiting for the feedback thread")
+RFID_TAPS = REGISTRY.counter('tupad_rfid_taps_total', "RFID card taps received, by source and what happened to them",
+                            ('source', 'result'))
+RFID_SYNC_CHANGES = REGISTRY.counter('tupad_rfid_sync_changes_total', "RFID card changes made by rfid_sync.py",
+                                    ('direction', 'result'))
+CAMERA_AVAILABLE = REGISTRY.gauge('tupad_camera_available', "1 while the camera is reachable")
+CAMERA_TUNES = REGISTRY.counter('tupad_camera_tunes_total', "Frame size and JPEG quality tunes by camera_tuner.py",
+                               ('reason',))
+KNOWN_FACES = REGISTRY.gauge('tupad_known_faces', "Active student faces currently encoded")
+START_TIME = REGISTRY.gauge('tupad_start_time_seconds', "Unix time the process started")
+START_TIME.set(time.time())
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            body, status = b"Not found\n", 404
+        else:
+            body, status = self.registry.render().encode('utf-8'), 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def create_server(host=HOST, port=PORT, registry=REGISTRY):
+    """Build the /metrics HTTP server; call serve_forever() on the result"""
+    handler = type('Handler', (MetricsRequestHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_metrics_server(host=HOST, port=PORT, registry=REGISTRY):
+    """Serve /metrics from a daemon thread; returns the server or None if the port is unavailable"""
+    try:
+        server = create_server(host, port, registry)
+    except OSError as e:
+        print(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch and print the metrics of a running recognition script")
+    parser.add_argument('--url', default=f"http://{HOST}:{PORT}/metrics")
+    parser.add_argument('--filter', help="Only show metrics whose name contains this text")
+    args = parser.parse_args()
+
+    from urllib.request import urlopen
+    from urllib.error import URLError
+    try:
+        with urlopen(args.url, timeout=5) as response:
+            text = response.read().decode('utf-8')
+    except URLError as e:
+        print(f"Could not read {args.url}: {e}")
+        sys.exit(1)
+    for line in text.splitlines():
+        if not line.startswith('#') and (not args.filter or args.filter in line):
+            print(line)
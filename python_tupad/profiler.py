@@ -0,0 +1,261 @@
+import io
+import os
+import sys
+import time
+import pstats
+import signal
+import socket
+import cProfile
+import argparse
+import threading
+import tracemalloc
+import socketserver
+from collections import Counter
+from datetime import datetime
+
+# Where profile dumps are written
+PROFILES_DIR = 'profiles'
+
+# Defaults for the local control socket
+HOST = '127.0.0.1'
+PORT = 9109
+
+# Main loop iterations covered by one profile, unless the request says otherwise
+DEFAULT_ITERATIONS = 200
+
+# Sampling profiler interval in seconds
+SAMPLE_INTERVAL = 0.005
+
+MODES = ('cprofile', 'sample', 'tracemalloc')
+
+class LoopProfiler:
+    """
+    Profile a number of iterations of a running loop on request.
+
+    Requests may come from any thread (key handler, signal handler, control
+    socket); the loop calls tick() once per iteration and the profile is
+    started and stopped there, on the loop's own thread, so cProfile sees
+    the loop itself. Results are written to PROFILES_DIR when done.
+    """
+
+    def __init__(self, profiles_dir=PROFILES_DIR):
+        self.profiles_dir = profiles_dir
+        # Reentrant: a signal handler runs on the loop's thread and may interrupt tick() inside the lock
+        self.lock = threading.RLock()
+        self.pending = None
+        self.active = None
+        self.remaining = 0
+        self.iterations = 0
+        self.started = None
+        self.profile = None
+        self.sampler = None
+        self.baseline_snapshot = None
+        self.started_tracing = False
+        self.last_output = None
+
+    def request(self, mode='cprofile', iterations=DEFAULT_ITERATIONS):
+        """Queue a profile of the next iterations; returns a status message"""
+        if mode not in MODES:
+            return f"Unknown profile mode {mode!r}, use one of {', '.join(MODES)}"
+        with self.lock:
+            if self.active or self.pending:
+                return f"A {self.active or self.pending[0]} profile is already in progress"
+            self.pending = (mode, max(1, int(iterations)))
+        return f"{mode} profile of {iterations} iterations requested"
+
+    def status(self):
+        with self.lock:
+            if self.active:
+                return f"{self.active} profile running, {self.remaining} iterations left"
+            if self.pending:
+                return f"{self.pending[0]} profile pending"
+        return f"Idle; last profile: {self.last_output or 'none'}"
+
+    def tick(self):
+        """Call once per loop iteration"""
+        if self.active:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self._stop()
+        if self.pending and not self.active:
+            with self.lock:
+                mode, iterations = self.pending
+                self.pending = None
+            self._start(mode, iterations)
+
+    def finish(self):
+        """Write out a profile still running when the loop ends"""
+        if self.active:
+            self._stop()
+
+    def _start(self, mode, iterations):
+        self.active = mode
+        self.remaining = iterations
+        self.iterations = iterations
+        self.started = time.perf_counter()
+        print(f"Profiling {iterations} loop iterations ({mode})...")
+        if mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif mode == 'sample':
+            self.sampler = StackSampler(threading.get_ident())
+            self.sampler.start()
+        elif mode == 'tracemalloc':
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start(25)
+            self.baseline_snapshot = tracemalloc.take_snapshot()
+
+    def _stop(self):
+        mode = self.active
+        elapsed = time.perf_counter() - self.started
+        os.makedirs(self.profiles_dir, exist_ok=True)
+        base = os.path.join(self.profiles_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{mode}_{self.iterations}")
+        header = (f"{mode} profile of {self.iterations} iterations, {elapsed:.1f}s wall time, "
+                  f"ended {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        try:
+            if mode == 'cprofile':
+                self.profile.disable()
+                self.profile.dump_stats(base + '.prof')
+                report = io.StringIO()
+                pstats.Stats(self.profile, stream=report).sort_stats('cumulative').print_stats(40)
+                self._write(base + '.txt', header + report.getvalue())
+                self.profile = None
+            elif mode == 'sample':
+                stacks = self.sampler.stop()
+                self._write(base + '.folded', ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+                self._write(base + '.txt', header + sample_report(stacks, self.sampler.samples))
+                self.sampler = None
+            elif mode == 'tracemalloc':
+                snapshot = tracemalloc.take_snapshot()
+                snapshot.dump(base + '.snapshot')
+                current, peak = tracemalloc.get_traced_memory()
+                lines = [f"Traced memory: {current / 1024:.0f} KiB now, {peak / 1024:.0f} KiB peak\n",
+                         "\nLargest allocations:\n"]
+                lines += [f"{stat}\n" for stat in snapshot.statistics('lineno')[:25]]
+                lines.append("\nGrowth during the profile:\n")
+                lines += [f"{stat}\n" for stat in snapshot.compare_to(self.baseline_snapshot, 'lineno')[:25]]
+                self._write(base + '.txt', header + ''.join(lines))
+                self.baseline_snapshot = None
+                if self.started_tracing:
+                    tracemalloc.stop()
+            self.last_output = base + '.txt'
+            print(f"Profile written to {self.last_output}")
+        except OSError as e:
+            print(f"Could not write profile: {e}")
+        finally:
+            self.active = None
+
+    def _write(self, file_path, text):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+class StackSampler(threading.Thread):
+    """Periodically record the call stack of one thread as a folded 'a;b;c' string"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.stacks
+
+def sample_report(stacks, samples):
+    """Top functions by share of samples where they were running (self) or on the stack (total)"""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for name in set(frames):
+            total[name] += count
+    lines = [f"{samples} samples\n\n{'self %':>7} {'total %':>8}  function\n"]
+    for name, count in own.most_common(30):
+        lines.append(f"{count / samples * 100:>7.1f} {total[name] / samples * 100:>8.1f}  {name}\n")
+    return ''.join(lines) if samples else "No samples collected\n"
+
+def install_signal_handlers(profiler, iterations=DEFAULT_ITERATIONS):
+    """SIGUSR1 requests a cProfile run and SIGUSR2 a tracemalloc run (not available on Windows)"""
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.request('cprofile', iterations))
+    signal.signal(signal.SIGUSR2, lambda signum, frame: profiler.request('tracemalloc', iterations))
+    return True
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """One command per line: '<mode> [iterations]' or 'status'"""
+    profiler = None
+
+    def handle(self):
+        for line in self.rfile:
+            words = line.decode('utf-8', 'replace').split()
+            if not words:
+                continue
+            if words[0] == 'status':
+                reply = self.profiler.status()
+            else:
+                try:
+                    iterations = int(words[1]) if len(words) > 1 else DEFAULT_ITERATIONS
+                    reply = self.profiler.request(words[0], iterations)
+                except ValueError:
+                    reply = f"Invalid iteration count: {words[1]}"
+            self.wfile.write((reply + '\n').encode('utf-8'))
+
+def start_control_server(profiler, host=HOST, port=PORT):
+    """Accept profiling commands on a local TCP socket from a daemon thread"""
+    handler = type('Handler', (ControlHandler,), {'profiler': profiler})
+    try:
+        server = socketserver.ThreadingTCPServer((host, port), handler)
+    except OSError as e:
+        print(f"Profiling control socket not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Profiling control socket listening on {host}:{server.server_address[1]}")
+    return server
+
+def send_command(command, host=HOST, port=PORT):
+    with socket.create_connection((host, port), timeout=5) as conn:
+        conn.sendall((command + '\n').encode('utf-8'))
+        conn.shutdown(socket.SHUT_WR)
+        return conn.makefile('r', encoding='utf-8').read().strip()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the running recognition script, or show a saved profile")
+    parser.add_argument('command', choices=MODES + ('status', 'show'))
+    parser.add_argument('argument', nargs='?', help="Iterations to profile, or the .prof file to show")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--sort', default='cumulative', help="pstats sort key for show")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'show':
+            if not args.argument:
+                parser.error("show needs a .prof file")
+            pstats.Stats(args.argument).sort_stats(args.sort).print_stats(40)
+        elif args.command == 'status':
+            print(send_command('status', args.host, args.port))
+        else:
+            print(send_command(f"{args.command} {args.argument or DEFAULT_ITERATIONS}", args.host, args.port))
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,179 @@
+import os
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import face_recognition
+
+# Frames are shrunk to this scale before face detection
+SCALE = 0.25
+
+# Maximum face distance accepted as a match (stricter than face_recognition's 0.6 default)
+MATCH_THRESHOLD = 0.4
+
+# Reference images needing encoding before a process pool is used (dlib is not thread-safe)
+PARALLEL_ENCODE_MIN = 4
+
+def decode_jpeg(content):
+    """Decode JPEG bytes from the camera; returns None for a corrupt frame"""
+    img_arr = np.frombuffer(content, dtype=np.uint8)
+    return cv2.imdecode(img_arr, -1)
+
+def flip_frame(img):
+    """The camera is mounted upside down"""
+    return cv2.flip(img, -1)  # -1 means flip both horizontally and vertically
+
+def shrink_frame(img, scale=SCALE):
+    return cv2.resize(img, (0, 0), None, scale, scale)
+
+def to_rgb(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def locate_faces(rgb):
+    """Standard HOG-based model"""
+    return face_recognition.face_locations(rgb)
+
+def encode_faces(rgb, locations):
+    return face_recognition.face_encodings(rgb, locations)
+
+def match_face(known_encodings, encoding, threshold=MATCH_THRESHOLD):
+    """Return (index of the closest known face or None, its distance)"""
+    if len(known_encodings) == 0:
+        return None, None
+    distances = face_recognition.face_distance(known_encodings, encoding)
+    index = int(np.argmin(distances))
+    distance = float(distances[index])
+    return (index if distance < threshold else None), distance
+
+def scale_location(location, scale=SCALE):
+    """Map a face location found on the shrunk frame back to the full frame"""
+    factor = int(round(1 / scale))
+    top, right, bottom, left = location
+    return top * factor, right * factor, bottom * factor, left * factor
+
+class StageTimer:
+    """Collects wall-clock durations per named stage"""
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def summary(self):
+        """{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}"""
+        result = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            result[name] = {
+                'count': len(ordered),
+                'mean_ms': sum(ordered) / len(ordered) * 1000,
+                'p50_ms': percentile(ordered, 50) * 1000,
+                'p95_ms': percentile(ordered, 95) * 1000,
+                'p99_ms': percentile(ordered, 99) * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+        return result
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def process_frame(content, known_encodings, scale=SCALE, threshold=MATCH_THRESHOLD, timer=None):
+    """
+    Run one camera frame through the recognition stages.
+
+    Returns (img, results) where img is the upright full-size frame (None if
+    the JPEG could not be decoded) and results holds one
+    (location on img, index of matched known face or None, distance) per face.
+    Each stage is timed when a StageTimer is passed.
+    """
+    timer = timer or StageTimer()
+    with timer.stage('decode'):
+        img = decode_jpeg(content)
+    if img is None:
+        return None, []
+    with timer.stage('flip'):
+        img = flip_frame(img)
+    with timer.stage('resize'):
+        small = shrink_frame(img, scale)
+    with timer.stage('color'):
+        rgb = to_rgb(small)
+    with timer.stage('face_locations'):
+        locations = locate_faces(rgb)
+    with timer.stage('face_encodings'):
+        encodings = encode_faces(rgb, locations)
+    with timer.stage('match'):
+        results = []
+        for location, encoding in zip(locations, encodings):
+            index, distance = match_face(known_encodings, encoding, threshold)
+            results.append((scale_location(location, scale), index, distance))
+    return img, results
+
+def encode_reference(file_path):
+    """Encoding of the first face in a reference image file, or None"""
+    img = cv2.imread(file_path)
+    if img is None:
+        return None
+    found = encode_faces(to_rgb(img), None)
+    return found[0] if found else None
+
+def _cache_key(file_path):
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def load_encoding_cache(cache_path):
+    """{file key: encoding} saved by save_encoding_cache; empty if missing or unreadable"""
+    try:
+        with np.load(cache_path) as data:
+            return dict(zip(data['keys'].tolist(), data['encodings']))
+    except (OSError, KeyError, ValueError):
+        return {}
+
+def save_encoding_cache(cache_path, cache):
+    keys = sorted(cache)
+    encodings = np.array([cache[key] for key in keys]) if keys else np.zeros((0, 128))
+    with open(cache_path, 'wb') as f:
+        np.savez(f, keys=np.array(keys, dtype=str), encodings=encodings)
+
+def encode_reference_images(file_paths, cache_path=None, workers=None):
+    """
+    Encode reference images, reusing encodings cached by path, size and mtime.
+
+    Returns one encoding (or None when no face was found) per path. Images
+    not in the cache are encoded in a process pool when there are several.
+    """
+    cache = load_encoding_cache(cache_path) if cache_path else {}
+    keys = [_cache_key(file_path) for file_path in file_paths]
+    missing = [(key, file_path) for key, file_path in zip(keys, file_paths) if key not in cache]
+
+    if missing:
+        paths = [file_path for _, file_path in missing]
+        if len(missing) >= PARALLEL_ENCODE_MIN and (workers or os.cpu_count() or 1) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(encode_reference, paths))
+        else:
+            results = [encode_reference(file_path) for file_path in paths]
+        for (key, _), encoding in zip(missing, results):
+            if encoding is not None:
+                cache[key] = encoding
+        if cache_path:
+            try:
+                save_encoding_cache(cache_path, {key: cache[key] for key in keys if key in cache})
+            except OSError as e:
+                print(f"Could not save encoding cache: {e}")
+
+    return [cache.get(key) for key in keys]
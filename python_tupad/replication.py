@@ -0,0 +1,407 @@
+import sqlite3
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from datetime import datetime
+
+from db_utils import ensure_change_log
+
+# Watermark consumer name used by the sync worker in export_watermarks
+REPLICATION_CONSUMER = 'replication'
+
+# Maximum number of change_log entries shipped in one delta file
+BATCH_SIZE = 500
+
+# Attendance statuses that count as the student actually showing up
+ATTENDED_STATUSES = ('present', 'late')
+
+def create_attendance_schema(conn):
+    """Create the students and attendance tables used by every node and the collector"""
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS students (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE,
+        image_path TEXT,
+        status TEXT DEFAULT 'active',
+        absent_count INTEGER DEFAULT 0,
+        consecutive_absences INTEGER DEFAULT 0,
+        last_updated TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY,
+        student_name TEXT,
+        date TEXT,
+        time TEXT,
+        status TEXT,
+        method TEXT DEFAULT 'face',
+        UNIQUE(student_name, date)
+    )
+    ''')
+    conn.commit()
+
+def init_central_database(central_db):
+    """Create the central database with the replication bookkeeping tables"""
+    conn = sqlite3.connect(central_db, timeout=20)
+    create_attendance_schema(conn)
+    cursor = conn.cursor()
+
+    # Remember which node contributed each row so deletes only undo that node's marks
+    cursor.execute("PRAGMA table_info(attendance)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'source_node' not in columns:
+        cursor.execute('ALTER TABLE attendance ADD COLUMN source_node TEXT')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS replication_nodes (
+        node_id TEXT PRIMARY KEY,
+        last_seq INTEGER NOT NULL DEFAULT -1,
+        last_applied TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS replication_conflicts (
+        id INTEGER PRIMARY KEY,
+        node_id TEXT,
+        seq INTEGER,
+        student_name TEXT,
+        date TEXT,
+        kept TEXT,
+        rejected TEXT,
+        detected_at TEXT
+    )
+    ''')
+    conn.commit()
+    return conn
+
+def _read_outbox(cursor, last_seq, batch_size):
+    """Return the next batch of change_log entries after last_seq"""
+    cursor.execute("""
+        SELECT seq, table_name, op, payload, changed_at
+        FROM change_log
+        WHERE seq > ? AND table_name IN ('attendance', 'students')
+        ORDER BY seq
+        LIMIT ?
+    """, (last_seq, batch_size))
+    return [
+        {'seq': seq, 'table': table, 'op': op, 'row': json.loads(payload), 'changed_at': changed_at}
+        for seq, table, op, payload, changed_at in cursor.fetchall()
+    ]
+
+def _read_snapshot(cursor):
+    """Return the node's current students and attendance as seq 0 changes"""
+    changes = []
+    cursor.execute("SELECT name, status, last_updated FROM students")
+    for name, status, last_updated in cursor.fetchall():
+        changes.append({'seq': 0, 'table': 'students', 'op': 'snapshot', 'changed_at': last_updated,
+                        'row': {'name': name, 'status': status, 'last_updated': last_updated}})
+    cursor.execute("SELECT id, student_name, date, time, status, method FROM attendance")
+    for row_id, student_name, date, time_str, status, method in cursor.fetchall():
+        changes.append({'seq': 0, 'table': 'attendance', 'op': 'snapshot', 'changed_at': None,
+                        'row': {'id': row_id, 'student_name': student_name, 'date': date,
+                                'time': time_str, 'status': status, 'method': method}})
+    return changes
+
+def _write_delta(drop_dir, batch):
+    """Write a compressed delta file atomically and return its path"""
+    os.makedirs(drop_dir, exist_ok=True)
+    filename = f"{batch['node_id']}-{batch['last_seq']:012d}.json.gz"
+    target = os.path.join(drop_dir, filename)
+    tmp_file = os.path.join(drop_dir, f".{filename}.tmp")
+    with gzip.open(tmp_file, 'wb', compresslevel=6) as f:
+        f.write(json.dumps(batch, separators=(',', ':')).encode('utf-8'))
+    os.replace(tmp_file, target)
+    return target
+
+def ship_deltas(node_db, node_id, drop_dir, batch_size=BATCH_SIZE):
+    """
+    Ship all unsent changes from a node database to the collector's drop directory.
+
+    The node's change_log (see db_utils.ensure_change_log) is the append-only
+    outbox; the sequence number of the last shipped entry is kept in
+    export_watermarks. A batch is written before the watermark moves, so a
+    crash can only cause a batch to be sent twice, which the collector ignores.
+    Returns the number of changes shipped.
+    """
+    conn = sqlite3.connect(node_db, timeout=20)
+    shipped = 0
+    try:
+        ensure_change_log(conn)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT last_seq FROM export_watermarks WHERE consumer = ?", (REPLICATION_CONSUMER,))
+        watermark = cursor.fetchone()
+
+        while True:
+            if watermark is None:
+                # First run: ship everything that existed before the triggers were installed
+                cursor.execute("BEGIN")
+                cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+                high_water = cursor.fetchone()[0]
+                changes = _read_snapshot(cursor)
+                conn.commit()
+                last_seq = high_water
+            else:
+                changes = _read_outbox(cursor, watermark[0], batch_size)
+                if not changes:
+                    break
+                last_seq = changes[-1]['seq']
+
+            # A batch covers every seq from first_seq to last_seq, even those change_log no longer holds,
+            # and the snapshot is sent even when empty, so the collector can tell when a batch is missing
+            _write_delta(drop_dir, {
+                'node_id': node_id,
+                'first_seq': watermark[0] + 1 if watermark else 0,
+                'last_seq': last_seq,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'changes': changes,
+            })
+            shipped += len(changes)
+
+            cursor.execute("""
+                INSERT INTO export_watermarks (consumer, last_seq, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(consumer) DO UPDATE SET last_seq = excluded.last_seq, updated_at = excluded.updated_at
+            """, (REPLICATION_CONSUMER, last_seq, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+            watermark = (last_seq,)
+
+        return shipped
+    finally:
+        conn.close()
+
+def _attendance_rank(status, time_str):
+    """Sort key for competing marks: attended beats absent, then the earliest time wins"""
+    attended = (status or '').lower() in ATTENDED_STATUSES
+    return (0 if attended else 1, time_str or '99:99:99')
+
+class Collector:
+    """
+    Applies node deltas to the central database.
+
+    Batches are applied idempotently: every node's highest applied sequence
+    number is stored in replication_nodes and changes at or below it are
+    skipped. A batch is only applied right after the one before it, so one
+    that arrives early waits in the drop directory. Attendance follows the
+    UNIQUE(student_name, date) rule; when two nodes mark the same student on
+    the same day the attended mark with the earliest time is kept and the
+    other one is recorded in replication_conflicts.
+    """
+
+    def __init__(self, central_db):
+        self.conn = init_central_database(central_db)
+        self.applied = 0
+        self.skipped = 0
+        self.conflicts = 0
+        self.deferred = 0
+
+    def close(self):
+        self.conn.close()
+
+    def apply_batch(self, batch):
+        """
+        Apply one decoded delta batch in a single transaction and return the
+        number of changes applied, or None when it is deferred because the
+        batch before it is missing.
+        """
+        cursor = self.conn.cursor()
+        node_id = batch['node_id']
+
+        cursor.execute("SELECT last_seq FROM replication_nodes WHERE node_id = ?", (node_id,))
+        result = cursor.fetchone()
+        node_last_seq = result[0] if result else -1
+
+        if batch['last_seq'] <= node_last_seq:
+            self.skipped += len(batch['changes'])
+            return 0
+        if batch['first_seq'] > node_last_seq + 1:
+            # An earlier batch from this node has not arrived yet
+            return None
+
+        applied = 0
+        try:
+            for change in batch['changes']:
+                # Snapshot entries carry seq 0, so they are only applied for a new node
+                if change['seq'] <= node_last_seq:
+                    self.skipped += 1
+                    continue
+                if change['table'] == 'attendance':
+                    self._apply_attendance(cursor, node_id, change)
+                else:
+                    self._apply_student(cursor, change)
+                applied += 1
+
+            cursor.execute("""
+                INSERT INTO replication_nodes (node_id, last_seq, last_applied)
+                VALUES (?, ?, ?)
+                ON CONFLICT(node_id) DO UPDATE SET last_seq = excluded.last_seq, last_applied = excluded.last_applied
+            """, (node_id, batch['last_seq'], datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+        self.applied += applied
+        return applied
+
+    def _apply_attendance(self, cursor, node_id, change):
+        row = change['row']
+
+        if change['op'] == 'delete':
+            cursor.execute(
+                "DELETE FROM attendance WHERE student_name = ? AND date = ? AND source_node = ?",
+                (row['student_name'], row['date'], node_id)
+            )
+            return
+
+        cursor.execute(
+            "SELECT time, status, source_node FROM attendance WHERE student_name = ? AND date = ?",
+            (row['student_name'], row['date'])
+        )
+        existing = cursor.fetchone()
+
+        if existing is None:
+            cursor.execute(
+                "INSERT INTO attendance (student_name, date, time, status, method, source_node) VALUES (?, ?, ?, ?, ?, ?)",
+                (row['student_name'], row['date'], row['time'], row['status'], row['method'], node_id)
+            )
+            return
+
+        existing_time, existing_status, existing_node = existing
+        incoming_wins = existing_node == node_id or (
+            _attendance_rank(row['status'], row['time']) < _attendance_rank(existing_status, existing_time)
+        )
+
+        if existing_node != node_id and (existing_status, existing_time) != (row['status'], row['time']):
+            kept, rejected = (row, existing) if incoming_wins else (existing, row)
+            cursor.execute(
+                "INSERT INTO replication_conflicts (node_id, seq, student_name, date, kept, rejected, detected_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (node_id, change['seq'], row['student_name'], row['date'],
+                 json.dumps(kept), json.dumps(rejected), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            self.conflicts += 1
+
+        if incoming_wins:
+            cursor.execute(
+                "UPDATE attendance SET time = ?, status = ?, method = ?, source_node = ? WHERE student_name = ? AND date = ?",
+                (row['time'], row['status'], row['method'], node_id, row['student_name'], row['date'])
+            )
+
+    def _apply_student(self, cursor, change):
+        row = change['row']
+        cursor.execute(
+            "INSERT OR IGNORE INTO students (name, status, last_updated) VALUES (?, ?, ?)",
+            (row['name'], row['status'], row['last_updated'])
+        )
+        if cursor.rowcount == 0:
+            # Last writer wins for status changes, ordered by the node's last_updated
+            cursor.execute("""
+                UPDATE students SET status = ?, last_updated = ?
+                WHERE name = ? AND (last_updated IS NULL OR last_updated <= ?)
+            """, (row['status'], row['last_updated'], row['name'], row['last_updated'] or ''))
+
+    def apply_directory(self, drop_dir, keep_files=False):
+        """Apply every delta file in the drop directory in per-node sequence order"""
+        if not os.path.isdir(drop_dir):
+            return 0
+
+        batches = []
+        for filename in os.listdir(drop_dir):
+            if filename.endswith('.json.gz'):
+                with gzip.open(os.path.join(drop_dir, filename), 'rb') as f:
+                    batch = json.loads(f.read().decode('utf-8'))
+                batches.append((batch['node_id'], batch['first_seq'], batch['last_seq'], filename, batch))
+
+        applied = 0
+        self.deferred = 0
+        for _, _, _, filename, batch in sorted(batches, key=lambda b: b[:4]):
+            filepath = os.path.join(drop_dir, filename)
+            count = self.apply_batch(batch)
+            if count is None:
+                # Kept for a later pass, once the missing batch has arrived
+                self.deferred += 1
+                continue
+            applied += count
+
+            if keep_files:
+                applied_dir = os.path.join(drop_dir, 'applied')
+                os.makedirs(applied_dir, exist_ok=True)
+                os.replace(filepath, os.path.join(applied_dir, filename))
+            else:
+                os.remove(filepath)
+        return applied
+
+def run_sync_worker(node_db, node_id, drop_dir, interval):
+    """Ship deltas from a node every interval seconds until interrupted"""
+    print(f"Sync worker for node {node_id} shipping {node_db} to {drop_dir} every {interval}s")
+    while True:
+        try:
+            shipped = ship_deltas(node_db, node_id, drop_dir)
+            if shipped:
+                print(f"Shipped {shipped} changes from {node_id}")
+        except sqlite3.Error as e:
+            print(f"Database error while shipping deltas: {e}")
+        time.sleep(interval)
+
+def run_collector(central_db, drop_dir, interval, keep_files=False):
+    """Apply incoming deltas every interval seconds until interrupted"""
+    print(f"Collector applying deltas from {drop_dir} to {central_db} every {interval}s")
+    collector = Collector(central_db)
+    try:
+        while True:
+            try:
+                applied = collector.apply_directory(drop_dir, keep_files)
+                if applied:
+                    print(f"Applied {applied} changes ({collector.conflicts} conflicts so far)")
+                if collector.deferred:
+                    print(f"{collector.deferred} delta files wait for an earlier batch")
+            except (sqlite3.Error, OSError, ValueError) as e:
+                print(f"Error applying deltas: {e}")
+            time.sleep(interval)
+    finally:
+        collector.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replicate classroom attendance databases into a central database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ship_parser = subparsers.add_parser('ship', help="Ship unsent changes from this node")
+    ship_parser.add_argument('node_id', help="Unique name of this classroom node")
+    ship_parser.add_argument('drop_dir', help="Directory the collector reads deltas from")
+    ship_parser.add_argument('--db', default='attendance.db', help="Node database file")
+    ship_parser.add_argument('--interval', type=float, help="Keep running and ship every N seconds")
+
+    collect_parser = subparsers.add_parser('collect', help="Apply shipped deltas to the central database")
+    collect_parser.add_argument('central_db', help="Central database file")
+    collect_parser.add_argument('drop_dir', help="Directory containing delta files")
+    collect_parser.add_argument('--keep', action='store_true', help="Move applied deltas to drop_dir/applied")
+    collect_parser.add_argument('--interval', type=float, help="Keep running and collect every N seconds")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'ship':
+            if args.interval:
+                run_sync_worker(args.db, args.node_id, args.drop_dir, args.interval)
+            else:
+                shipped = ship_deltas(args.db, args.node_id, args.drop_dir)
+                print(f"Shipped {shipped} changes from {args.node_id}")
+        elif args.command == 'collect':
+            if args.interval:
+                run_collector(args.central_db, args.drop_dir, args.interval, args.keep)
+            else:
+                collector = Collector(args.central_db)
+                try:
+                    applied = collector.apply_directory(args.drop_dir, args.keep)
+                    print(f"Applied {applied} changes, skipped {collector.skipped} duplicates, "
+                          f"{collector.conflicts} conflicts, {collector.deferred} delta files deferred")
+                finally:
+                    collector.close()
+    except KeyboardInterrupt:
+        print("Stopped")
+        sys.exit(0)
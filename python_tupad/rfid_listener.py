@@ -0,0 +1,325 @@
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from attendance_db import card_uid_key
+from metrics import RFID_TAPS
+from structured_logging import get_logger
+
+log = get_logger('rfid')
+
+# Defaults for the endpoint that accepts pushed scan events from local tools or a reader bridge;
+# the firmware's own taps are polled from GET /rfid/taps
+HOST = '127.0.0.1'
+PORT = 9110
+
+# Taps waiting for the worker; more are dropped rather than queued
+QUEUE_SIZE = 1000
+
+# A card held on the reader is read again and again; repeats within this many seconds are one tap
+REPEAT_WINDOW = 3.0
+
+# The firmware holds GET /rfid/scan open for up to 5 seconds while it waits for a card
+SCAN_TIMEOUT = 10
+
+# Seconds between GET /rfid/taps polls; the firmware answers at once with the cards it read
+TAP_INTERVAL = 0.3
+REQUEST_TIMEOUT = 5
+
+# Taps the device read this many seconds before the first poll (e.g. before the script started) are ignored
+MAX_TAP_AGE = 10
+
+# Seconds before asking firmware without /rfid/taps again, in case it was updated
+TAP_RECHECK = 60
+
+# Seconds a claimed tap (registering a card with 'n' or 'k') is waited for
+CLAIM_TIMEOUT = 10
+
+# Seconds to wait before polling again after the device could not be reached
+RETRY_DELAY = 2.0
+
+class RfidListener:
+    """
+    Collect RFID taps in the background and hand them to a handler.
+
+    The firmware reads cards on its own and keeps the last few for GET
+    /rfid/taps, which start(poll=True) polls from a thread; the request
+    returns at once, so the camera keeps serving frames. Firmware without
+    that endpoint is asked for one card at a time with GET /rfid/scan
+    (scan_once), which blocks the device for up to 5 seconds. Taps can also
+    be pushed to the HTTP endpoint by another program. They all go through
+    one bounded queue, and a worker thread calls handler(uid, name) for
+    each, so database writes never hold up the sources or the recognition
+    loop. claim() hands the next tap to a callback instead, to register a
+    card.
+    """
+
+    def __init__(self, handler, address=None, repeat_window=REPEAT_WINDOW, queue_size=QUEUE_SIZE):
+        self.handler = handler
+        self.repeat_window = repeat_window
+        self.queue = queue.Queue(queue_size)
+        self.lock = threading.Lock()
+        self.recent = {}
+        self.session = requests.Session()
+        self.scanning = False
+        self.running = False
+        self.worker = None
+        self.poller = None
+        self.claimed = None
+        self.handled = 0
+        self.set_address(address)
+
+    def set_address(self, address):
+        self.scan_url = f"http://{address}/rfid/scan" if address else None
+        self.taps_url = f"http://{address}/rfid/taps" if address else None
+        self.tap_cursor = None
+        self.taps_supported = None
+
+    def start(self, poll=False):
+        if self.worker is None:
+            self.running = True
+            self.worker = threading.Thread(target=self._work, name='rfid-worker', daemon=True)
+            self.worker.start()
+        if poll and self.poller is None:
+            self.poller = threading.Thread(target=self._poll, name='rfid-poll', daemon=True)
+            self.poller.start()
+        return self
+
+    def submit(self, uid, name=None, source='push'):
+        """Queue one tap; False if it repeats the last tap of that card or the queue is full"""
+        uid = card_uid_key(uid)
+        now = time.monotonic()
+        with self.lock:
+            last = self.recent.get(uid)
+            # A card put back on the reader to register it is not a repeat
+            if last is not None and now - last < self.repeat_window and self.claimed is None:
+                RFID_TAPS.inc(source=source, result='repeat')
+                return False
+            self.recent[uid] = now
+            if len(self.recent) > 4096:
+                self.recent = {k: t for k, t in self.recent.items() if now - t < self.repeat_window}
+        try:
+            self.queue.put_nowait((uid, name, source))
+        except queue.Full:
+            RFID_TAPS.inc(source=source, result='queue_full')
+            log.warning("RFID queue full, tap of %s dropped", uid)
+            return False
+        RFID_TAPS.inc(source=source, result='queued')
+        return True
+
+    def scan_once(self):
+        """Wait for one card on a background thread; False if a scan is running or taps are polled"""
+        with self.lock:
+            if self.scanning or self.taps_supported or not self.scan_url:
+                return False
+            self.scanning = True
+        threading.Thread(target=self._scan_once, name='rfid-scan', daemon=True).start()
+        return True
+
+    def claim(self, callback, timeout=CLAIM_TIMEOUT):
+        """
+        Hand the next tap to callback(uid, name) on the worker thread instead
+        of the handler, or call callback(None, None) if no card comes within
+        timeout seconds. Without polled taps a scan is started for it. False
+        if another claim is waiting.
+        """
+        with self.lock:
+            if self.claimed is not None:
+                return False
+            self.claimed = (callback, time.monotonic() + timeout)
+        if not self.taps_supported:
+            self.scan_once()
+        return True
+
+    def _take_claim(self, expired_only=False):
+        """The waiting claim's callback, removed; with expired_only only once its time is up"""
+        with self.lock:
+            if self.claimed is None or (expired_only and time.monotonic() < self.claimed[1]):
+                return None
+            callback, deadline = self.claimed
+            self.claimed = None
+        if time.monotonic() >= deadline:
+            callback(None, None)
+            return None
+        return callback
+
+    def _scan_once(self):
+        try:
+            self._scan(requests)
+        finally:
+            with self.lock:
+                self.scanning = False
+
+    def _scan(self, session):
+        """One long-poll of /rfid/scan; True if it completed, whether or not a card was found"""
+        try:
+            response = session.get(self.scan_url, timeout=SCAN_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            log.warning("RFID scan request failed: %s", e)
+            return False
+        if response.status_code != 200:
+            log.warning("RFID scan failed: HTTP %s", response.status_code)
+            return False
+        try:
+            data = response.json()
+        except ValueError:
+            log.warning("RFID scan returned invalid JSON")
+            return False
+        if data.get('uid'):
+            self.submit(data['uid'], data.get('name'), source='scan')
+        return True
+
+    def _poll(self):
+        while self.running:
+            if self.taps_url and self._poll_taps():
+                time.sleep(TAP_INTERVAL)
+            else:
+                time.sleep(TAP_RECHECK if self.taps_supported is False else RETRY_DELAY)
+
+    def _poll_taps(self):
+        """One GET /rfid/taps; True if the device answered it"""
+        url, cursor = self.taps_url, self.tap_cursor
+        try:
+            response = self.session.get(url, params={} if cursor is None else {'after': cursor},
+                                        timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            log.debug("RFID tap poll failed: %s", e)
+            return False
+        if response.status_code == 404:
+            if self.taps_supported is not False:
+                log.info("ESP32-CAM firmware has no /rfid/taps; cards are read with 'f'")
+            self.taps_supported = False
+            return False
+        if response.status_code != 200:
+            log.warning("RFID tap poll failed: HTTP %s", response.status_code)
+            return False
+        try:
+            data = response.json()
+            last = int(data['last'])
+            taps = [(int(tap['seq']), tap['uid'], tap.get('age_ms', 0)) for tap in data.get('taps') or []]
+        except (ValueError, TypeError, KeyError, AttributeError):
+            log.warning("RFID tap poll returned invalid JSON")
+            return False
+        if url != self.taps_url:
+            # The device changed while the request was out
+            return True
+
+        if self.taps_supported is not True:
+            log.info("Reading RFID taps in the background from %s", url)
+            self.taps_supported = True
+        # Only the taps since the last poll are new; after a restart of either side, only recent ones count
+        continuing = cursor is not None and last >= cursor
+        if continuing and taps and taps[0][0] > cursor + 1:
+            log.warning("%d RFID taps were overwritten on the device before they were polled",
+                        taps[0][0] - cursor - 1)
+        for seq, uid, age_ms in taps:
+            if continuing or age_ms <= MAX_TAP_AGE * 1000:
+                self.submit(uid, source='poll')
+        self.tap_cursor = last
+        return True
+
+    def _work(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=1)
+            except queue.Empty:
+                self._take_claim(expired_only=True)
+                continue
+            if item is None:
+                break
+            uid, name, source = item
+            try:
+                claim = self._take_claim()
+                if claim:
+                    claim(uid, name)
+                else:
+                    self.handler(uid, name)
+                    self.handled += 1
+            except Exception as e:
+                log.error("Error handling RFID tap %s: %s", uid, e)
+            finally:
+                self.queue.task_done()
+
+    def stop(self, timeout=5.0):
+        """Handle the taps already queued, then end the worker"""
+        self.running = False
+        if self.worker is not None:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self.worker.join(timeout)
+            self.worker = None
+        if self.handled:
+            print(f"RFID taps handled: {self.handled}")
+
+class RfidEventHandler(BaseHTTPRequestHandler):
+    """POST /rfid/event with {"uid": ..., "name": ...} or {"events": [{"uid": ...}, ...]}"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    listener = None
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0] != '/rfid/event':
+            return self.reply(404, {'error': "Not found"})
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b'null')
+            events = data['events'] if 'events' in data else [data]
+            taps = [(event['uid'], event.get('name')) for event in events]
+            for uid, _ in taps:
+                card_uid_key(uid, strict=True)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return self.reply(400, {'error': "Expected {\"uid\": ...} or {\"events\": [...]}"})
+        accepted = sum(self.listener.submit(uid, name, source='push') for uid, name in taps)
+        self.reply(200, {'accepted': accepted, 'received': len(taps)})
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def create_server(listener, host=HOST, port=PORT):
+    """Build the /rfid/event HTTP server; call serve_forever() on the result"""
+    handler = type('Handler', (RfidEventHandler,), {'listener': listener})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_push_server(listener, host=HOST, port=PORT):
+    """Accept pushed RFID events from a daemon thread; returns the server or None if the port is unavailable"""
+    try:
+        server = create_server(listener, host, port)
+    except OSError as e:
+        print(f"RFID event endpoint not started on {host}:{port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"RFID events accepted at http://{host}:{server.server_address[1]}/rfid/event")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Push RFID taps to a running recognition script")
+    parser.add_argument('uids', nargs='+', help="Card UIDs such as DE:AD:BE:EF")
+    parser.add_argument('--url', default=f"http://{HOST}:{PORT}/rfid/event")
+    parser.add_argument('--repeat', type=int, default=1, help="Send the UIDs this many times")
+    args = parser.parse_args()
+
+    events = [{'uid': uid} for _ in range(args.repeat) for uid in args.uids]
+    try:
+        response = requests.post(args.url, json={'events': events}, timeout=5)
+    except requests.exceptions.RequestException as e:
+        print(f"Could not reach {args.url}: {e}")
+        sys.exit(1)
+    print(response.text)
@@ -0,0 +1,358 @@
+import sys
+import sqlite3
+import argparse
+import threading
+
+import requests
+
+import attendance_db
+from attendance_db import card_uid_key, rfid_directory, update_rfid_cards
+from metrics import RFID_SYNC_CHANGES
+from structured_logging import get_logger
+
+log = get_logger('rfid_sync')
+
+# Seconds between background synchronisations
+SYNC_INTERVAL = 300
+
+# Card changes per POST /rfid batch; the firmware reads at most 1 KB of JSON per request, and 8
+# changes with 31-character names stay below it. Firmware whose JSON document is too small for a
+# batch answers "Invalid JSON format", and the batch size is halved
+BATCH_SIZE = 8
+
+# Seconds to wait for the ESP32-CAM to answer
+REQUEST_TIMEOUT = 5
+
+# Card slots on firmware whose /rfid/list does not report a capacity (MAX_CARDS)
+DEFAULT_CAPACITY = 10
+
+# The firmware keeps names up to this many characters
+DEVICE_NAME_LENGTH = 31
+
+def ensure_sync_state(cursor):
+    """Create the table of cards the device and the database agreed on at the last sync"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS rfid_sync_state (
+        device TEXT NOT NULL,
+        card_uid TEXT NOT NULL,
+        student_name TEXT NOT NULL,
+        PRIMARY KEY (device, card_uid)
+    )
+    ''')
+
+def uid_bytes(card_key):
+    """'de-ad-be-ef' -> [222, 173, 190, 239], as the firmware expects"""
+    return [int(part, 16) for part in card_key.split('-')]
+
+def device_name(student_name):
+    return student_name[:DEVICE_NAME_LENGTH]
+
+def plan_changes(base, device, host, students, capacity):
+    """
+    Three-way diff of the card lists; every argument maps card UID keys to names.
+
+    base holds what both sides agreed on at the last sync, so a card missing
+    on one side was either removed there (it is in base) or added on the
+    other side (it is not). When both sides changed a card the database
+    wins. students maps device-only names to their status in the database.
+    Returns {'push': [(action, key, name)], 'link': [(name, key)],
+    'unlink': [key], 'skipped': [(key, reason)]}.
+    """
+    plan = {'push': [], 'link': [], 'unlink': [], 'skipped': []}
+    adds = []
+    for key in sorted(set(device) | set(host)):
+        on_device = device.get(key)
+        in_host = device_name(host[key]) if key in host else None
+        agreed = base.get(key)
+        if on_device == in_host:
+            continue
+        if in_host is None:
+            if agreed is not None and agreed == on_device:
+                plan['push'].append(('remove', key, on_device))
+            elif students.get(on_device) == 'active':
+                plan['link'].append((on_device, key))
+            elif on_device in students:
+                # Student was dropped or deactivated, so the card should not work offline either
+                plan['push'].append(('remove', key, on_device))
+            else:
+                plan['skipped'].append((key, f"no student named {on_device}"))
+        elif on_device is None:
+            if agreed is not None and agreed == in_host:
+                plan['unlink'].append(key)
+            else:
+                adds.append((key, host[key]))
+        else:
+            plan['push'].append(('remove', key, on_device))
+            adds.append((key, host[key]))
+
+    # Removals free slots before the additions that need them
+    free = capacity - len(device) + sum(1 for action, _, _ in plan['push'] if action == 'remove')
+    for key, name in sorted(adds, key=lambda item: item[1]):
+        if free > 0:
+            plan['push'].append(('add', key, name))
+            free -= 1
+        else:
+            plan['skipped'].append((key, "device card list is full"))
+    return plan
+
+class RfidSync:
+    """
+    Keep the ESP32-CAM's own card list and the rfid_cards table in step.
+
+    One sync lists the device's cards (GET /rfid/list), reads the database
+    cards from the in-memory RFID directory, and applies only the
+    differences: database-side changes go to the device in batches of
+    BATCH_SIZE through POST /rfid {"action": "batch"} (one request per
+    change on older firmware), and device-side changes are written to the
+    database in one transaction. Cards of active students end up on the
+    device, so it can still recognise taps while the host is down.
+    """
+
+    def __init__(self, address, timeout=REQUEST_TIMEOUT, batch_size=BATCH_SIZE):
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.requests = 0
+        self.set_address(address)
+
+    def set_address(self, address):
+        self.address = address
+        self.base_url = f"http://{address}"
+        self.batched = None
+
+    def start(self, interval=SYNC_INTERVAL):
+        """Sync now and then every interval seconds, or sooner after request()"""
+        if self.thread is None:
+            self.running = True
+            self.wake.set()
+            self.thread = threading.Thread(target=self._run, args=(interval,), name='rfid-sync', daemon=True)
+            self.thread.start()
+        return self
+
+    def request(self):
+        """Ask the background thread to sync soon, e.g. after a card was registered"""
+        self.wake.set()
+
+    def _run(self, interval):
+        while self.running:
+            self.wake.wait(interval)
+            self.wake.clear()
+            if not self.running:
+                break
+            try:
+                summary = self.sync()
+                if summary and any(summary[k] for k in ('added', 'removed', 'linked', 'unlinked', 'failed')):
+                    log.info("RFID sync with %s: %s", self.address, format_summary(summary))
+            except Exception as e:
+                log.error("RFID sync failed: %s", e)
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def sync(self, dry_run=False):
+        """Reconcile both card lists once; returns a summary dict, or None if the device was unreachable"""
+        with self.lock:
+            self.requests = 0
+            listed = self.fetch_device_cards()
+            if listed is None:
+                return None
+            device, capacity = listed
+            host = self.host_cards()
+            base, students = self.load_state(set(device.values()) - {device_name(n) for n in host.values()})
+            if base and not device:
+                # An empty list after earlier syncs means the device was reset, not that every card was removed
+                log.warning("ESP32-CAM %s has no RFID cards; sending all of them again", self.address)
+                base = {}
+            plan = plan_changes(base, device, host, students, capacity)
+            summary = {'added': 0, 'removed': 0, 'linked': 0, 'unlinked': 0,
+                       'skipped': len(plan['skipped']), 'failed': 0}
+            if dry_run:
+                summary['plan'] = plan
+                summary['requests'] = self.requests
+                return summary
+            for key, reason in plan['skipped']:
+                log.info("RFID card %s not synced: %s", key, reason, extra={'key': ('rfid_sync_skip', key)})
+            RFID_SYNC_CHANGES.inc(len(plan['skipped']), direction='none', result='skipped')
+
+            if plan['link'] or plan['unlink']:
+                linked, unlinked = update_rfid_cards(plan['link'], plan['unlink'])
+                summary['linked'], summary['unlinked'] = len(linked), unlinked
+                summary['failed'] += len(plan['link']) - len(linked)
+                RFID_SYNC_CHANGES.inc(len(linked), direction='pull', result='link')
+                RFID_SYNC_CHANGES.inc(unlinked, direction='pull', result='unlink')
+
+            results = self.push(plan['push'])
+            for (action, key, name), ok in zip(plan['push'], results):
+                if ok:
+                    summary['added' if action == 'add' else 'removed'] += 1
+                    if action == 'add':
+                        device[key] = device_name(name)
+                    else:
+                        device.pop(key, None)
+                else:
+                    summary['failed'] += 1
+                RFID_SYNC_CHANGES.inc(direction='push', result=action if ok else 'failed')
+
+            host = self.host_cards()
+            agreed = {key: name for key, name in device.items()
+                      if key in host and device_name(host[key]) == name}
+            if agreed != base:
+                self.save_state(agreed)
+            summary['requests'] = self.requests
+            return summary
+
+    def fetch_device_cards(self):
+        """({card UID key: name}, capacity) from GET /rfid/list, or None if it failed"""
+        try:
+            self.requests += 1
+            response = self.session.get(f"{self.base_url}/rfid/list", timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            log.warning("Could not list RFID cards on %s: %s", self.address, e)
+            return None
+        if response.status_code != 200:
+            log.warning("Listing RFID cards failed: HTTP %s", response.status_code)
+            return None
+        try:
+            data = response.json()
+            cards = {card_uid_key(card['uid']): card.get('name', '') for card in data.get('cards', [])}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            log.warning("RFID card list from %s is not valid JSON", self.address)
+            return None
+        return cards, int(data.get('capacity') or DEFAULT_CAPACITY)
+
+    @staticmethod
+    def host_cards():
+        """Cards of active students the firmware can hold (4-byte UIDs), from the in-memory directory"""
+        return {key: name for key, (name, status) in rfid_directory().snapshot().items()
+                if status in ('active', None) and len(key.split('-')) == 4}
+
+    def load_state(self, device_only_names):
+        """(cards agreed at the last sync, {name: status} for names only the device has)"""
+        conn = None
+        try:
+            conn = sqlite3.connect(attendance_db.db_file, timeout=20)
+            cursor = conn.cursor()
+            ensure_sync_state(cursor)
+            conn.commit()
+            cursor.execute("SELECT card_uid, student_name FROM rfid_sync_state WHERE device=?", (self.address,))
+            base = dict(cursor.fetchall())
+            students = {}
+            names = sorted(device_only_names)
+            if names:
+                cursor.execute(f"SELECT name, status FROM students WHERE name IN ({','.join('?' * len(names))})",
+                               names)
+                students = dict(cursor.fetchall())
+            return base, students
+        except sqlite3.Error as e:
+            print(f"Database error reading RFID sync state: {e}")
+            return {}, {}
+        finally:
+            if conn:
+                conn.close()
+
+    def save_state(self, agreed):
+        conn = None
+        try:
+            conn = sqlite3.connect(attendance_db.db_file, timeout=20)
+            cursor = conn.cursor()
+            ensure_sync_state(cursor)
+            cursor.execute("DELETE FROM rfid_sync_state WHERE device=?", (self.address,))
+            cursor.executemany("INSERT INTO rfid_sync_state (device, card_uid, student_name) VALUES (?, ?, ?)",
+                               [(self.address, key, name) for key, name in agreed.items()])
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error saving RFID sync state: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    def push(self, changes):
+        """Send (action, key, name) changes to the device; one success flag per change"""
+        results = []
+        while len(results) < len(changes):
+            chunk = changes[len(results):len(results) + self.batch_size]
+            batch = self.push_batch(chunk) if self.batched is not False else None
+            if batch is None:
+                batch = [self.push_one(*change) for change in chunk]
+            results.extend(batch)
+        return results
+
+    def push_batch(self, changes):
+        """One POST /rfid batch; None if the firmware cannot take it and the caller should send one by one"""
+        body = {'action': 'batch', 'changes': [
+            {'action': action, 'uid': uid_bytes(key), **({'name': device_name(name)} if action == 'add' else {})}
+            for action, key, name in changes
+        ]}
+        try:
+            self.requests += 1
+            response = self.session.post(f"{self.base_url}/rfid", json=body, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            log.warning("RFID batch to %s failed: %s", self.address, e)
+            return [False] * len(changes)
+        if response.status_code == 400 and 'Unknown action' in response.text:
+            log.info("ESP32-CAM %s has no batch RFID action; sending cards one by one", self.address)
+            self.batched = False
+            return None
+        if response.status_code == 400 and 'Invalid JSON' in response.text and len(changes) > 1:
+            self.batch_size = max(1, len(changes) // 2)
+            log.info("ESP32-CAM %s cannot parse %d changes at once; sending %d per batch",
+                     self.address, len(changes), self.batch_size)
+            return None
+        if response.status_code != 200:
+            log.warning("RFID batch failed: HTTP %s %s", response.status_code, response.text[:80])
+            return [False] * len(changes)
+        self.batched = True
+        try:
+            results = response.json()['results']
+            return [bool(result.get('ok')) for result in results] + [False] * (len(changes) - len(results))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return [False] * len(changes)
+
+    def push_one(self, action, key, name):
+        body = {'action': action, 'uid': uid_bytes(key)}
+        if action == 'add':
+            body['name'] = device_name(name)
+        try:
+            self.requests += 1
+            response = self.session.post(f"{self.base_url}/rfid", json=body, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            log.warning("RFID %s of %s failed: %s", action, key, e)
+            return False
+        return response.status_code == 200
+
+def format_summary(summary):
+    return (f"{summary['added']} added and {summary['removed']} removed on the device, "
+            f"{summary['linked']} linked and {summary['unlinked']} unlinked in the database, "
+            f"{summary['skipped']} skipped, {summary['failed']} failed ({summary['requests']} requests)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synchronise the ESP32-CAM's RFID cards with the attendance database")
+    parser.add_argument('address', help="ESP32-CAM address, e.g. 192.168.0.156 or 127.0.0.1:8081")
+    parser.add_argument('--db', default=attendance_db.db_file, help="Attendance database file")
+    parser.add_argument('--dry-run', action='store_true', help="Only show the changes")
+    args = parser.parse_args()
+
+    attendance_db.db_file = args.db
+    result = RfidSync(args.address).sync(dry_run=args.dry_run)
+    if result is None:
+        print(f"Could not read the RFID cards of {args.address}")
+        sys.exit(1)
+    if args.dry_run:
+        plan = result['plan']
+        for action, key, name in plan['push']:
+            print(f"device:   {action:<7}{key}  {name}")
+        for name, key in plan['link']:
+            print(f"database: link   {key}  {name}")
+        for key in plan['unlink']:
+            print(f"database: unlink {key}")
+        for key, reason in plan['skipped']:
+            print(f"skipped:         {key}  {reason}")
+    print(format_summary(result))
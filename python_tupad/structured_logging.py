@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# Environment overrides: LOG_LEVEL=DEBUG, LOG_FILE=kiosk.jsonl
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FILE = os.environ.get('LOG_FILE')
+
+# A message (by its format string) is emitted at most once per window; repeats are counted
+RATE_WINDOW = 10.0
+
+# Records waiting for the writer thread; beyond this they are dropped rather than block the caller
+QUEUE_SIZE = 10000
+
+CONSOLE_FORMAT = '%(asctime)s %(levelname)-7s %(message)s'
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drop repeats of a message within RATE_WINDOW seconds.
+
+    Records are keyed on logger, level and the unformatted message (so
+    "Found %d faces" with any count is one message) unless a 'key' is given
+    in extra. The next record let through reports how many were dropped.
+    """
+
+    def __init__(self, window=RATE_WINDOW):
+        super().__init__()
+        self.window = window
+        self.lock = threading.Lock()
+        self.seen = {}
+
+    def filter(self, record):
+        if self.window <= 0:
+            return True
+        key = getattr(record, 'key', None) or (record.name, record.levelno, record.msg)
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is not None and record.created - entry[0] < self.window:
+                entry[1] += 1
+                return False
+            record.suppressed = entry[1] if entry else 0
+            self.seen[key] = [record.created, 0]
+            if len(self.seen) > 4096:
+                # Forget keys that have been quiet for a whole window
+                self.seen = {k: v for k, v in self.seen.items() if record.created - v[0] < self.window}
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        if getattr(record, 'suppressed', 0):
+            record.msg = f"{record.msg} ({record.suppressed} similar messages suppressed)"
+        return record
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra fields"""
+    STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name in self.STANDARD or name == 'key' or (name == 'suppressed' and not value):
+                continue
+            entry[name] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+_listener = None
+_handler = None
+
+def setup_logging(level=LOG_LEVEL, log_file=LOG_FILE, window=RATE_WINDOW, console=True):
+    """
+    Route the 'tupad' loggers through a queue to a background writer thread.
+
+    Callers only pay for filtering and enqueueing; console and file output
+    happen on the listener thread. Safe to call more than once.
+    """
+    global _listener, _handler
+    root = logging.getLogger('tupad')
+    if _listener is not None:
+        return root
+
+    handlers = []
+    if console:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(logging.Formatter(CONSOLE_FORMAT, '%H:%M:%S'))
+        handlers.append(stream)
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(RateLimitFilter(window))
+    root.addHandler(_handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _handler is not None and _handler.dropped:
+            print(f"{_handler.dropped} log records dropped (queue full)")
+
+def get_logger(name):
+    return logging.getLogger(f'tupad.{name}')